@@ -1,15 +1,24 @@
 import argparse
-import asyncio
+import gzip
+import hashlib
 import json
 import logging
+import os
+import sys
+import threading
 import time
+import zlib
 from dataclasses import dataclass
-from typing import Optional, List, Dict, Any
+from pathlib import Path
+from typing import Any, Dict, List, Optional
 
-import openai
 import pandas as pd
 
-from utils import AsyncLoopWrapper, init_logger
+# The shared lmbench client package lives in 3-workloads/
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+from lmbench import (AsyncLoopWrapper, ChatHistory, PromptGenerator, QuantileSketch, RequestExecutor,
+                     RequestMetrics, Response, SessionScheduler, StreamingMetrics, add_client_arguments,
+                     create_executor, init_logger, print_window_summary, process_summary)
 
 logger = init_logger(__name__, logging.INFO)
 
@@ -36,6 +45,8 @@ class WorkloadConfig:
     num_agents: int
     whole_history: bool
     trace_file: Optional[str] = None
+    # Send each round to all agents at once and join their responses
+    fanout: bool = False
 
 
 @dataclass
@@ -62,6 +73,11 @@ class UserConfig:
     whole_history: bool
     trace: Any
 
+    # Model served to each agent
+    models: List[str]
+
+    fanout: bool
+
     @staticmethod
     def new_user_config(user_id: int, workload_config: WorkloadConfig, trace) -> "UserConfig":
         return UserConfig(
@@ -74,237 +90,150 @@ class UserConfig:
             num_agents=workload_config.num_agents,
             whole_history=workload_config.whole_history,
             trace=trace,
+            models=workload_config.model,
+            fanout=workload_config.fanout,
         )
 
 
-class ChatHistory:
+class AgentChatHistory(ChatHistory):
+    """
+    Chat history whose responses are attributed to the agent that produced them.
 
-    def __init__(
-        self,
-    ):
-        self.history = []
+    Keeps a running hash of the rendered history so each request can be
+    identified by prompt_hash() without storing or re-hashing its messages.
+    """
+
+    def __init__(self):
+        super().__init__()
+        self._hash = hashlib.blake2b(digest_size=8)
+
+    def append(self, message: Dict[str, str]):
+        super().append(message)
+        self._hash.update(self.segments[-1].encode())
+
+    def clear(self):
+        super().clear()
+        self._hash = hashlib.blake2b(digest_size=8)
+
+    def prompt_hash(self) -> str:
+        return self._hash.hexdigest()
+
+    def fork(self) -> "AgentChatHistory":
+        """Copy of the history that can grow separately (messages are shared, not copied)."""
+        history = AgentChatHistory()
+        history.history = list(self.history)
+        history.segments = list(self.segments)
+        history._hash = self._hash.copy()
+        return history
 
     def on_user_query(self, query: str):
         if len(self.history) == 0:
-            self.history.append({"role": "user", "content": query})
+            self.append({"role": "user", "content": query})
         else:
             assert self.history[-1]["role"] == "assistant", "Expect system response"
-            self.history.append({"role": "user", "name": "user", "content": query})
+            self.append({"role": "user", "name": "user", "content": query})
 
     def on_system_response_whole(self, response: str, agentID: int):
         assert len(self.history) > 0, "Expect user query"
-        self.history.append({"role": "assistant", "name": "agent"+f"{agentID}", "content": response})
+        self.append({"role": "assistant", "name": "agent"+f"{agentID}", "content": response})
 
     def on_system_response_part(self, response: str, agentID: int):
-        self.history = []
-        self.history.append({"role": "assistant", "name": "agent"+f"{agentID}", "content": response})
+        self.clear()
+        self.append({"role": "assistant", "name": "agent"+f"{agentID}", "content": response})
 
-    def get_messages_for_openai(self):
-        return self.history
 
-    def __len__(self):
-        return len(self.history)
+class TranscriptWriter:
+    """
+    Writes the full input messages and output of a sampled subset of users to
+    a gzip-compressed JSON lines file. The summary csv only carries a prompt
+    hash and the token counts of every request, so memory and csv size stay
+    flat however long the histories grow.
+    """
 
+    def __init__(self, path: str, sample_rate: float):
+        if not 0 < sample_rate <= 1:
+            raise ValueError(f"Transcript sample rate must be within (0, 1], got {sample_rate}")
+        self.path = path
+        self.sample_rate = sample_rate
+        self._file = gzip.open(path, "wt", encoding="utf-8")
 
-@dataclass
-class Response:
-    body: str
-    ttft: float
-    generation_time: float
-    prompt_tokens: int
-    generation_tokens: int
-    launch_time: float
-    finish_time: float
-    agentID: int
-
-
-class RequestExecutor:
-
-    def __init__(self, base_url: str, model: List[str]):
-        # For vLLM server, we don't need an API key, but the client requires one
-        # Ensure base_url ends with /v1 for vLLM
-        if not base_url.endswith('/v1'):
-            base_url = base_url.rstrip('/') + '/v1'
-        self.client = openai.AsyncOpenAI(
-            api_key="vllm_xxxxxxxxxxxxx",  # Dummy API key for vLLM server
-            base_url=base_url
-        )
-        self.model = model
-        logging.info(f"Initialized OpenAI client with base_url={base_url} and model={model}")
-        self.loop = AsyncLoopWrapper.GetOrStartLoop()
-        self.request_history = []
-
-    async def _async_launch_request(self, messages: List[Dict[str, str]],  max_tokens: int,
-                                    agentID: int, extra_headers: Optional[Dict[str, str]] = None):
-        model = self.model[agentID]
-        try:
-            logging.info(f"Sending request to model {model} with messages: {messages}")
-
-            # Initialize response tracking variables
-            words = ""
-            tokens_out = 0
-            tokens_prefill = 0
-            start_time = time.time()
-            first_token_time = None
-
-            # Convert chat messages to a single prompt string
-            prompt = ""
-            for msg in messages:
-                role = msg["role"]
-                content = msg["content"]
-                name = msg.get("name", "")
-                if role == "system":
-                    prompt += f"System: {content}\n"
-                elif role == "user":
-                    if name:
-                        prompt += f"User ({name}): {content}\n"
-                    else:
-                        prompt += f"User: {content}\n"
-                elif role == "assistant":
-                    if name:
-                        prompt += f"Assistant ({name}): {content}\n"
-                    else:
-                        prompt += f"Assistant: {content}\n"
-            prompt += "Assistant: "
-
-            try:
-                # Make the request
-                response = await self.client.completions.create(
-                    prompt=prompt,
-                    model=model,
-                    stream=True,
-                    max_tokens=max_tokens,
-                    temperature=0.0,
-                    stream_options={"include_usage": True},
-                    extra_headers=extra_headers,
-                )
+    def sampled(self, user_id: int) -> bool:
+        """Whether the transcript of user_id is written (the same users in every run)."""
+        return zlib.crc32(str(user_id).encode()) / 2**32 < self.sample_rate
 
-                # Process the streaming response
-                async for chunk in response:
-                    if not chunk.choices:
-                        continue
+    def write(self, record: Dict[str, Any]):
+        self._file.write(json.dumps(record, ensure_ascii=False) + "\n")
 
-                    # Handle content
-                    if chunk.choices[0].text is not None:
-                        if first_token_time is None and chunk.choices[0].text != "":
-                            first_token_time = time.time()
-                        words += chunk.choices[0].text
-
-                # Handle token counts if available
-                if hasattr(chunk, 'usage') and chunk.usage is not None:
-                    tokens_out = chunk.usage.completion_tokens
-                    tokens_prefill = chunk.usage.prompt_tokens
-
-                # If we didn't get token counts from streaming, try to get them from the final response
-                if tokens_out == 0 or tokens_prefill == 0:
-                    print("No token counts from streaming, getting final response")
-                    print(f"{tokens_out}, {tokens_prefill}")
-                    try:
-                        final_response = await self.client.completions.create(
-                            prompt=prompt,
-                            model=model,
-                            stream=False,
-                        )
-                        if hasattr(final_response, 'usage') and final_response.usage is not None:
-                            tokens_out = final_response.usage.completion_tokens
-                            tokens_prefill = final_response.usage.prompt_tokens
-                    except Exception as e:
-                        logging.warning(f"Failed to get token counts from final response: {e}")
-
-                # # Calculate timing metrics
-                ttft = first_token_time - start_time if first_token_time else 0
-                generation_time = time.time() - first_token_time if first_token_time else 0
-
-                return Response(
-                    body=words,
-                    ttft=ttft,
-                    generation_time=generation_time,
-                    prompt_tokens=tokens_prefill,
-                    generation_tokens=tokens_out,
-                    launch_time=start_time,
-                    finish_time=time.time(),
-                    agentID=agentID,
-                )
-            except openai.BadRequestError as e:
-                logging.warning(f"BadRequestError with model {model}: {e}")
-                return None
-            except Exception as e:
-                logging.error(f"Error during request to model {model}: {e}")
-                return None
-
-        except Exception as e:
-            logging.error(f"Error in _async_launch_request: {str(e)}")
-            logging.error(f"Request details - model: {model}, messages: {messages}")
-            return None
-
-    def launch_request(
-        self,
-        messages,
-        max_tokens: int,
-        finish_callback,
-        agentID: int,
-        extra_headers=None,
-    ):
-        """
-        finish_callback: Callable[[Response, int], None]
-        """
-        def safe_callback(future):
-            try:
-                result = future.result()
-                # The callback will handle the None case
-                finish_callback(result, agentID)
-            except Exception as e:
-                logger.error(f"Error in callback: {e}")
-
-        future = asyncio.run_coroutine_threadsafe(
-            self._async_launch_request(messages, max_tokens, agentID, extra_headers), self.loop
-        )
-        future.add_done_callback(safe_callback)
+    def close(self):
+        self._file.close()
+        logger.info(f"Transcripts of {self.sample_rate:.0%} of the users written to {self.path}")
 
 
 class UserSession:
 
-    def __init__(self, user_config: UserConfig):
+    def __init__(self, user_config: UserConfig, prompt_generator: PromptGenerator, stats: StreamingMetrics,
+                 transcripts: Optional[TranscriptWriter] = None):
         self.user_config = user_config
+        self.prompt_generator = prompt_generator
+        self.stats = stats
+        # Only set for the users whose transcripts are sampled
+        if transcripts is not None and not transcripts.sampled(user_config.user_id):
+            transcripts = None
+        self.transcripts = transcripts
         self.last_request_time = None
-        self.chat_history = ChatHistory()
+        self.chat_history = AgentChatHistory()
         self.question_id = 0
 
         self.has_unfinished_request = False
         self.last_unfinished_log = 0
 
-        self.prompt_lengths = []
-        self.generation_lengths = []
-        self.ttfts = []
-        self.generation_times = []
-        self.launch_times = []
-        self.finish_times = []
+        self.metrics = RequestMetrics()
 
         self.finished = False
 
         self.agentIDs = []
-        self.inputs = []
-        self.outputs = []
+        self.input_hashes = []
+        # FANOUT mode: round of every request and the round's critical path
+        self.round_ids = []
+        self.round_latencies = []
 
-        self.request_failed = False
+        # FANOUT mode: responses of the round in flight by agent, and the
+        # per-agent trace inputs that are merged into the history on the join
+        self.round_responses = {}
+        self.round_inputs = None
 
-    def _update_result(self, response: Response):
-        self.prompt_lengths.append(response.prompt_tokens)
-        self.generation_lengths.append(response.generation_tokens)
-        self.ttfts.append(response.ttft)
-        self.generation_times.append(response.generation_time)
-        self.launch_times.append(response.launch_time)
-        self.finish_times.append(response.finish_time)
-        self.agentIDs.append(response.agentID)
-        self.outputs.append(response.body)
+        self.request_failed = False
 
-        # Only record inputs for successful responses
-        self.inputs.append(self.chat_history.get_messages_for_openai().copy())
+        # Set by the manager; called when a request finishes so that a
+        # session waiting on it is rescheduled without polling
+        self.on_ready = None
+        self.schedule_token = 0
+        # Set by the manager; called with the critical path of every joined round
+        self.on_round_joined = None
+
+    def _update_result(self, response: Response, agentID: int, input_hash: str,
+                       messages: Optional[List[Dict[str, str]]], round_latency: Optional[float] = None):
+        self.metrics.record(response)
+        self.stats.record(response)
+        self.agentIDs.append(agentID)
+        self.input_hashes.append(input_hash)
+        if round_latency is not None:
+            self.round_ids.append(self.question_id)
+            self.round_latencies.append(round_latency)
+
+        if messages is not None:
+            self.transcripts.write({
+                "user_id": self.user_config.user_id,
+                "question_id": len(self.metrics),
+                "agentID": agentID,
+                "input_hash": input_hash,
+                "input": messages,
+                "output": response.body,
+            })
 
     def _build_system_prompt(self):
 
-        def gen_dummy_text(length):
-            return " ".join(["hi"] * length)
+        gen_dummy_text = self.prompt_generator.text
 
         dummy_text_sys = gen_dummy_text(self.user_config.system_prompt_len)
         dummy_text_user = f"user_{self.user_config.user_id} " + gen_dummy_text(self.user_config.user_info_len - 1)
@@ -338,23 +267,24 @@ class UserSession:
         logger.debug(
             f"User {self.user_config.user_id} issues request {self.question_id}"
         )
-        messages = self.chat_history.get_messages_for_openai()
+        # Inputs are only recorded in _update_result after the request succeeds;
+        # the messages are kept until then only for sampled transcripts
+        input_hash = self.chat_history.prompt_hash()
+        messages = list(self.chat_history.get_messages_for_openai()) if self.transcripts is not None else None
 
-        # We'll save the input messages in _update_result after the request succeeds
-        # This ensures inputs only get recorded for successful requests
-
-        request_executor.launch_request(
-            messages,
+        request_executor.launch_history(
+            self.chat_history,
             max_tokens,
-            self._on_request_finished,
-            agentID,
+            lambda response: self._on_request_finished(response, agentID, input_hash, messages),
             extra_headers={"x-user-id": str(self.user_config.user_id)},
+            model=self.user_config.models[agentID],
         )
         self.has_unfinished_request = True
         self.last_request_time = timestamp
 
-    def _on_request_finished(self, response: Optional[Response], agentID: int):
-        if response is None:
+    def _on_request_finished(self, response: Response, agentID: int, input_hash: str,
+                             messages: Optional[List[Dict[str, str]]]):
+        if response.error is not None:
             logger.warning(f"User {self.user_config.user_id} request failed (likely context length exceeded)")
             self.has_unfinished_request = False
             self.finished = True  # Mark session as finished when request fails
@@ -363,6 +293,8 @@ class UserSession:
             # Just add a flag to the session that it failed
             self.request_failed = True
 
+            if self.on_ready is not None:
+                self.on_ready(self)
             return
 
         if self.user_config.whole_history:
@@ -377,7 +309,95 @@ class UserSession:
             f"Prompt tokens: {response.prompt_tokens}, "
             f"generation tokens: {response.generation_tokens}"
         )
-        self._update_result(response)
+        self._update_result(response, agentID, input_hash, messages)
+        if self.on_ready is not None:
+            self.on_ready(self)
+
+    def _launch_new_round(self, timestamp: float, request_executor: RequestExecutor):
+        """FANOUT mode: send the next round to all agents at once over the shared history."""
+        num_agents = self.user_config.num_agents
+        if self.user_config.trace is None:
+            # One question that every agent answers, the prefix is fully shared
+            prompt = self._build_new_question()
+            if len(self.chat_history) == 0:
+                prompt = self._build_system_prompt() + prompt
+            self.chat_history.on_user_query(prompt)
+            histories = [self.chat_history] * num_agents
+            max_tokens = [self.user_config.answer_len] * num_agents
+            self.round_inputs = None
+        else:
+            # Every agent gets its own input on top of the shared history
+            self.question_id += 1
+            trace_round = self.user_config.trace[f"round{self.question_id}"]
+            self.round_inputs = [trace_round[f"{agentID}_input"] for agentID in range(num_agents)]
+            max_tokens = [trace_round[f"{agentID}_max_tokens"] for agentID in range(num_agents)]
+            histories = []
+            for agentID in range(num_agents):
+                history = self.chat_history.fork()
+                history.on_user_query(self.round_inputs[agentID])
+                histories.append(history)
+        logger.debug(
+            f"User {self.user_config.user_id} fans out round {self.question_id} to {num_agents} agents"
+        )
+
+        self.round_responses = {}
+        for agentID, history in enumerate(histories):
+            input_hash = history.prompt_hash()
+            messages = list(history.get_messages_for_openai()) if self.transcripts is not None else None
+            request_executor.launch_history(
+                history,
+                max_tokens[agentID],
+                lambda response, agentID=agentID, input_hash=input_hash, messages=messages:
+                    self._on_round_request_finished(response, agentID, input_hash, messages),
+                extra_headers={"x-user-id": str(self.user_config.user_id)},
+                model=self.user_config.models[agentID],
+            )
+        self.has_unfinished_request = True
+        self.last_request_time = timestamp
+
+    def _on_round_request_finished(self, response: Response, agentID: int, input_hash: str,
+                                   messages: Optional[List[Dict[str, str]]]):
+        if self.request_failed:
+            # Another agent of this round failed and ended the session
+            return
+        if response.error is not None:
+            logger.warning(f"User {self.user_config.user_id} request failed (likely context length exceeded)")
+            self.has_unfinished_request = False
+            self.finished = True
+            self.request_failed = True
+            if self.on_ready is not None:
+                self.on_ready(self)
+            return
+
+        self.round_responses[agentID] = (response, input_hash, messages)
+        if len(self.round_responses) < self.user_config.num_agents:
+            return
+        self._join_round()
+        self.has_unfinished_request = False
+        if self.on_ready is not None:
+            self.on_ready(self)
+
+    def _join_round(self):
+        """Merge the responses of all agents into the history, in agent order."""
+        results = [self.round_responses[agentID] for agentID in range(self.user_config.num_agents)]
+        # Critical path: from the first request entering the client to the last one finishing
+        round_latency = (max(response.finish_time for response, _, _ in results)
+                         - min(response.launch_time - response.queue_time for response, _, _ in results))
+
+        if not self.user_config.whole_history:
+            self.chat_history.clear()
+        for agentID, (response, input_hash, messages) in enumerate(results):
+            if self.round_inputs is not None and self.user_config.whole_history:
+                self.chat_history.on_user_query(self.round_inputs[agentID])
+            self.chat_history.append({"role": "assistant", "name": f"agent{agentID}", "content": response.body})
+            self._update_result(response, agentID, input_hash, messages, round_latency)
+        self.round_responses = {}
+
+        logger.debug(
+            f"User {self.user_config.user_id} joined round {self.question_id} in {round_latency:.3f}s"
+        )
+        if self.on_round_joined is not None:
+            self.on_round_joined(round_latency)
 
     def set_internal_state(self, offset: float, timestamp: float):
         """Tell the session is the 'offset' seconds after the start"""
@@ -397,23 +417,31 @@ class UserSession:
             f"last_request_time: {self.last_request_time}"
         )
 
-    def step(self, timestamp: float, request_executor: RequestExecutor):
+    def _num_rounds(self) -> int:
         if self.user_config.trace is not None:
-            num_rounds = len(self.user_config.trace)
-        else:
-            num_rounds = self.user_config.num_rounds
+            return len(self.user_config.trace)
+        return self.user_config.num_rounds
+
+    def next_step_time(self) -> float:
+        """Wall-clock time at which step() has work to do (0 means now)"""
+        if self.last_request_time is None or self.question_id >= self._num_rounds():
+            return 0
+        return self.last_request_time + self.user_config.gap_between_requests
+
+    def step(self, timestamp: float, request_executor: RequestExecutor):
         if (
-            self.question_id >= num_rounds
+            self.question_id >= self._num_rounds()
             and not self.has_unfinished_request
         ):
             self.finished = True
             return
 
+        launch = self._launch_new_round if self.user_config.fanout else self._launch_new_request
         if self.last_request_time is None:
-            self._launch_new_request(timestamp, request_executor)
+            launch(timestamp, request_executor)
             return
 
-        if timestamp - self.last_request_time > self.user_config.gap_between_requests:
+        if timestamp >= self.next_step_time():
             if self.has_unfinished_request:
                 if timestamp - self.last_unfinished_log > 10:
                     logger.warning(
@@ -423,31 +451,25 @@ class UserSession:
                     self.last_unfinished_log = timestamp
                 return
 
-            self._launch_new_request(timestamp, request_executor)
+            launch(timestamp, request_executor)
             return
 
     def summary(self) -> pd.DataFrame:
-        df = pd.DataFrame()
-        df["prompt_tokens"] = self.prompt_lengths
-        df["generation_tokens"] = self.generation_lengths
-        df["ttft"] = self.ttfts
-        df["generation_time"] = self.generation_times
-        df["user_id"] = self.user_config.user_id
-        df["question_id"] = range(1, len(self.prompt_lengths) + 1)
-        df["launch_time"] = self.launch_times
-        df["finish_time"] = self.finish_times
-        df["agentID"] = self.agentIDs
-        df["input"] = self.inputs
-        df["output"] = self.outputs
-        return df
+        columns = dict(agentID=self.agentIDs, input_hash=self.input_hashes)
+        if self.user_config.fanout:
+            columns.update(round_id=self.round_ids, round_latency=self.round_latencies)
+        return self.metrics.to_frame(user_id=self.user_config.user_id, **columns)
 
 
 class UserSessionManager:
 
     def __init__(
-        self, workload_config: WorkloadConfig
+        self, workload_config: WorkloadConfig, prompt_generator: PromptGenerator,
+        transcripts: Optional[TranscriptWriter] = None,
     ):
         self.workload_config = workload_config
+        self.prompt_generator = prompt_generator
+        self.transcripts = transcripts
         self.sessions = []
 
         gap_between_requests_per_user = workload_config.user_request_interval
@@ -462,6 +484,10 @@ class UserSessionManager:
         self.last_user_join = 0
         self.session_summaries = []
         self.start_time = None
+        # Aggregates of the requests that finished since the last periodic summary
+        self.stats = StreamingMetrics()
+        # FANOUT mode: critical path of the rounds joined since the last periodic summary
+        self.round_latency = QuantileSketch()
 
         self.traces = []
         if self.workload_config.trace_file is not None:
@@ -480,6 +506,11 @@ class UserSessionManager:
 
         self.continue_flag = True
 
+        self.executor = None
+        self.scheduler = None
+        self.log_interval = None
+        self.done = threading.Event()
+
     def _create_user_session(self):
         self.user_id += 1
         if len(self.traces) > 0:
@@ -490,7 +521,9 @@ class UserSessionManager:
             user_config = UserConfig.new_user_config(
                 self.user_id, self.workload_config, None
             )
-        user_session = UserSession(user_config)
+        user_session = UserSession(user_config, self.prompt_generator, self.stats, self.transcripts)
+        user_session.on_ready = self._on_session_ready
+        user_session.on_round_joined = self._on_round_joined
         self.sessions.append(user_session)
         return user_session, True
 
@@ -502,110 +535,100 @@ class UserSessionManager:
                 f"active users: {len(self.sessions) - len(sessions_to_remove)}"
             )
             for session in sessions_to_remove:
-                if not session.request_failed and len(session.prompt_lengths) > 0:
+                if not session.request_failed and len(session.metrics) > 0:
                     # Only add sessions with successful requests to the summary
                     self.session_summaries.append(session.summary())
                 else:
                     logger.info(f"Skipping failed session (user {session.user_config.user_id}) from summary")
         self.sessions = [s for s in self.sessions if not s.finished]
 
-    def step(self, timestamp: float, executor: RequestExecutor):
-        if self.start_time is None:
-            self.start_time = timestamp
-
-        if self.continue_flag:
-            if timestamp - self.last_user_join > self.gap_between_users:
-                new_session, self.continue_flag = self._create_user_session()
-                if new_session is not None:
-                    self.last_user_join = timestamp
-                    logger.info(
-                        f"Joined a new user {self.user_id}, "
-                        f"now active users: {len(self.sessions)}"
-                    )
-
-        for session in self.sessions:
-            session.step(timestamp, executor)
-
-        self._remove_finished_sessions()
+    def start(
+        self,
+        timestamp: float,
+        executor: RequestExecutor,
+        scheduler: SessionScheduler,
+        log_interval: Optional[float] = None,
+    ):
+        """
+        Hand the sessions over to the event-driven scheduler. From here on
+        all session state is driven from the scheduler's event loop, and
+        `done` is set once no user is left to join or run.
+        """
+        self.executor = executor
+        self.scheduler = scheduler
+        self.log_interval = log_interval
+        scheduler.call_at_threadsafe(timestamp, self._on_start)
+        scheduler.start()
+
+    def _on_start(self, timestamp: float):
+        self.start_time = timestamp
+        self.stats.start(timestamp)
+        self._join_user(timestamp)
+        if self.log_interval is not None:
+            self.scheduler.call_at(timestamp + self.log_interval, self._log_summary)
+
+    def _schedule_session(self, session: UserSession, due_time: float):
+        # Bumping the token lazily invalidates any older heap entry
+        session.schedule_token += 1
+        token = session.schedule_token
+        self.scheduler.call_at(
+            due_time, lambda ts: self._step_session(session, token, ts)
+        )
 
-        if not self.continue_flag and len(self.sessions) == 0:
-            return False
-        return True
+    def _step_session(self, session: UserSession, token: int, timestamp: float):
+        if token != session.schedule_token:
+            return
 
-    @staticmethod
-    def ProcessSummary(
-        df: pd.DataFrame,
-        start_time: Optional[float] = None,
-        end_time: Optional[float] = None,
-        pending_queries: int = 0
-    ):
-        if start_time and end_time:
-            launched_queries = len(
-                df.query(f"{start_time} <= launch_time <= {end_time}")
-            )
-            df = df.query(f"{start_time} <= finish_time <= {end_time}")
-        else:
-            launched_queries = len(df)
+        if not session.finished:
+            session.step(timestamp, self.executor)
 
-        logger.debug(
-            f"Launched queries: {launched_queries}, "
-            f"pending queries: {pending_queries}, "
-            f"finished queries: {len(df)}"
-        )
+        if session.finished:
+            self._remove_finished_sessions()
+            self._check_done()
+            return
 
-        if start_time is None:
-            start_time = df["launch_time"].min()
-        if end_time is None:
-            end_time = df["finish_time"].max()
-        total_time = end_time - start_time
-
-        total_requests = launched_queries + pending_queries
-        _qps = total_requests / total_time
-
-        total_finished_requests = len(df)
-        finished_qps = total_finished_requests / total_time
-
-        total_prompt_tokens = df["prompt_tokens"].sum()
-        total_generation_tokens = df["generation_tokens"].sum()
-        average_prefill_speed = total_prompt_tokens / total_time
-        average_generation_speed = total_generation_tokens / total_time
-        average_generation_speed_per_request = (
-            df["generation_tokens"] / df["generation_time"]
-        ).mean()
-        average_ttft = df["ttft"].mean()
-        logger.info("Calculating performance summary")
-        print("\n")
-        print("==================== Performance summary ======================")
-        print(
-            f"  \033[33mProcessing speed: "
-            f"\033[32m{finished_qps:.4f} reqs/s\033[0m\n"
-        )
+        if session.has_unfinished_request and timestamp >= session.next_step_time():
+            # Parked until the request finishes and _on_session_ready fires
+            return
 
-        print(f"  \033[33mRequests on-the-fly: {pending_queries}\033[0m\n")
+        self._schedule_session(session, session.next_step_time())
 
-        print(
-            "  \033[33mInput tokens per second: "
-            f"\033[32m{average_prefill_speed:.4f} tokens/s\033[0m\n"
-        )
+    def _on_session_ready(self, session: UserSession):
+        self._schedule_session(session, session.next_step_time())
 
-        print(
-            "  \033[33mOutput tokens per second: "
-            f"\033[32m{average_generation_speed:.4f} tokens/s\033[0m\n"
-        )
+    def _join_user(self, timestamp: float):
+        new_session, self.continue_flag = self._create_user_session()
+        if new_session is not None:
+            self.last_user_join = timestamp
+            logger.info(
+                f"Joined a new user {self.user_id}, "
+                f"now active users: {len(self.sessions)}"
+            )
+            self._schedule_session(new_session, timestamp)
 
-        print(
-            "  \033[33mAverage generation throughput (per request): "
-            f"\033[32m{average_generation_speed_per_request:.4f} "
-            "tokens/req/s\033[0m\n"
-        )
+        if self.continue_flag:
+            self.scheduler.call_at(timestamp + self.gap_between_users, self._join_user)
+        else:
+            self._check_done()
 
-        print(f"  \033[33mAverage TTFT: \033[32m{average_ttft:.4f}s\033[0m\n")
+    def _check_done(self):
+        if not self.continue_flag and len(self.sessions) == 0:
+            self.done.set()
 
-        print(f"Time range: {start_time} - {end_time} ({total_time:.2f}s)")
+    def _log_summary(self, timestamp: float):
+        self.scheduler.call_at(timestamp + self.log_interval, self._log_summary)
+        pending_queries = len([s for s in self.sessions if s.has_unfinished_request])
+        print_window_summary(self.stats.roll(timestamp), pending_queries)
+        if self.workload_config.fanout:
+            rounds, self.round_latency = self.round_latency, QuantileSketch()
+            if rounds.count > 0:
+                logger.info(
+                    f"Fan-out rounds joined: {rounds.count}, critical path "
+                    f"p50: {rounds.quantile(0.5) * 1000:.0f} ms, p99: {rounds.quantile(0.99) * 1000:.0f} ms"
+                )
 
-        print("===============================================================")
-        print("\n")
-        return df
+    def _on_round_joined(self, round_latency: float):
+        self.round_latency.add(round_latency)
 
     def summary(self, start_time: float, end_time: float) -> pd.DataFrame:
         if len(self.session_summaries) == 0 and len(self.sessions) == 0:
@@ -618,7 +641,7 @@ class UserSessionManager:
         start_time = max(self.start_time, start_time)
         end_time = min(end_time, df["finish_time"].max())
 
-        df = UserSessionManager.ProcessSummary(
+        df = process_summary(
             df, start_time, end_time, pending_queries
         )
         return df
@@ -693,6 +716,27 @@ def parse_arguments() -> WorkloadConfig:
         action="store_true",
         help="Include the whole history in the agentic workload"
     )
+    parser.add_argument(
+        "--transcript-sample-rate",
+        type=float,
+        default=0.0,
+        help="Fraction of users whose full input messages and outputs are written to "
+        "the transcript file; the summary csv only has prompt hashes and token counts (default: 0)",
+    )
+    parser.add_argument(
+        "--fanout",
+        action="store_true",
+        help="Send each round to all agents at once and merge their responses into the history "
+        "once all of them finished; --num-rounds counts fan-out rounds",
+    )
+    parser.add_argument(
+        "--transcript-output",
+        type=str,
+        default=None,
+        help="gzip-compressed JSON lines file for the sampled transcripts "
+        "(default: <output>.transcripts.jsonl.gz)",
+    )
+    add_client_arguments(parser)
     args = parser.parse_args()
     return args, parser
 
@@ -736,16 +780,16 @@ def main():
             args.num_rounds,
             args.time,)
 
-    step_interval = 0.1
-
     model = args.model
     if args.num_agents != len(args.model):
         assert len(args.model) == 1
         model = args.model * args.num_agents
     print(f"Using models: {model}")
 
-    executor = RequestExecutor(
-        base_url=args.base_url, model=model
+    # Each agent's model is chosen per request, the first one is the default
+    executor = create_executor(
+        args.client, base_url=args.base_url, model=model[0],
+        tokenizer=args.tokenizer, max_in_flight=args.max_in_flight, max_pending=args.max_pending,
     )
 
     workload_config = WorkloadConfig(
@@ -759,33 +803,33 @@ def main():
         num_agents=args.num_agents,
         whole_history=args.whole_history,
         trace_file=args.trace_file,
+        fanout=args.fanout,
     )
 
+    transcripts = None
+    if args.transcript_sample_rate > 0:
+        transcript_output = args.transcript_output or os.path.splitext(args.output)[0] + ".transcripts.jsonl.gz"
+        transcripts = TranscriptWriter(transcript_output, args.transcript_sample_rate)
+
+    # Agents share the system prompt, so size it with the default model's tokenizer
     manager = UserSessionManager(
-        workload_config
+        workload_config, PromptGenerator(args.tokenizer or model[0]), transcripts
     )
 
-    start_time = time.time()
-    last_summary_time = start_time
+    scheduler = SessionScheduler(AsyncLoopWrapper.GetOrStartLoop())
+    manager.start(time.time(), executor, scheduler, args.log_interval)
     try:
-        while True:
-            continue_flag = manager.step(time.time(), executor)
-            time.sleep(step_interval)
-
-            if time.time() - last_summary_time > args.log_interval:
-                manager.summary(last_summary_time, time.time())
-                last_summary_time = time.time()
-
-            if args.time is not None and time.time() - start_time > args.time:
-                break
-
-            if not continue_flag:
-                break
-
+        # Sessions run on the scheduler's loop, wait until they are all done
+        # or the time limit is reached
+        manager.done.wait(timeout=args.time)
     except KeyboardInterrupt:
         logger.info("Interrupted, waiting for the final result")
 
+    scheduler.stop()
+    executor.close()
     AsyncLoopWrapper.StopLoop()
+    if transcripts is not None:
+        transcripts.close()
 
     logger.info(f"Finished benchmarking, dumping summary to {args.output}")
     summary = manager.summary(0, time.time())
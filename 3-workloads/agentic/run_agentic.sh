@@ -5,9 +5,9 @@ SCRIPT_DIR="$( cd "$( dirname "${BASH_SOURCE[0]}" )" && pwd )"
 PROJECT_ROOT="$( cd "$SCRIPT_DIR/../../" && pwd )"
 cd "$SCRIPT_DIR"
 
-if [[ $# -lt 13 ]]; then
-    echo "Usage: $0 \"<model list>\" <base url> <save file key> <num_users_warmup> <num_agents> <num_rounds> <system_prompt> <chat_history> <answer_len> <name> <serving_index> <spec_file_path> <lmbench_session_id> [new_user_intervals...]"
-    echo "Example: $0 \"meta-llama/Llama-3.1-8B-Instruct\" http://localhost:8000 test 100 10 10 0 100 20 layerwise-benchmark 0 0-bench-specs/layerwise-spec.yaml lmbench-1234567890-abcd1234 1 2"
+if [[ $# -lt 15 ]]; then
+    echo "Usage: $0 \"<model list>\" <base url> <save file key> <num_users_warmup> <num_agents> <num_rounds> <system_prompt> <chat_history> <answer_len> <name> <serving_index> <spec_file_path> <lmbench_session_id> <transcript_sample_rate> <fanout> [new_user_intervals...]"
+    echo "Example: $0 \"meta-llama/Llama-3.1-8B-Instruct\" http://localhost:8000 test 100 10 10 0 100 20 layerwise-benchmark 0 0-bench-specs/layerwise-spec.yaml lmbench-1234567890-abcd1234 None False 1 2"
     exit 1
 fi
 
@@ -26,10 +26,12 @@ NAME=${10}
 SERVING_INDEX=${11}
 SPEC_FILE_PATH=${12}
 LMBENCH_SESSION_ID=${13}
+TRANSCRIPT_SAMPLE_RATE=${14}  # Fraction of users with full transcripts ("None" for none)
+FANOUT=${15}  # "True" to send each round to all agents at once
 
 # Optional QPS-like values (we'll use as new-user-intervals here)
-if [ $# -gt 13 ]; then
-    NEW_USER_INTERVALS=("${@:14}")
+if [ $# -gt 15 ]; then
+    NEW_USER_INTERVALS=("${@:16}")
 else
     NEW_USER_INTERVALS=(2)  # Default new user interval
 fi
@@ -102,6 +104,17 @@ run_benchmark() {
     # warmup with current init ID
     warmup
 
+    local transcript_args=()
+    if [[ -n "$TRANSCRIPT_SAMPLE_RATE" && "$TRANSCRIPT_SAMPLE_RATE" != "None" ]]; then
+        transcript_args=(--transcript-sample-rate "$TRANSCRIPT_SAMPLE_RATE"
+                         --transcript-output "../../4-latest-results/${KEY}_agentic_transcripts_${new_user_interval}.jsonl.gz")
+    fi
+
+    local fanout_args=()
+    if [[ "$FANOUT" == "True" || "$FANOUT" == "true" ]]; then
+        fanout_args=(--fanout)
+    fi
+
     # actual benchmark with same init ID
     echo "Running benchmark with new_user_interval=$new_user_interval..."
     python3 "${SCRIPT_DIR}/agentic-qa.py" \
@@ -115,7 +128,9 @@ run_benchmark() {
         --user-request-interval 1 \
         --new-user-interval "$new_user_interval" \
         --output "$output_file" \
-        --time 100
+        --time 100 \
+        "${transcript_args[@]}" \
+        "${fanout_args[@]}"
 
     sleep 10
 
@@ -145,6 +160,7 @@ for interval in "${NEW_USER_INTERVALS[@]}"; do
         CHAT_HISTORY="$CHAT_HISTORY" \
         ANSWER_LEN="$ANSWER_LEN" \
         NEW_USER_INTERVAL="$interval" \
+        FANOUT="$FANOUT" \
         SERVING_INDEX="$SERVING_INDEX" \
         SPEC_FILE_PATH="$SPEC_FILE_PATH" \
         LMBENCH_SESSION_ID="$LMBENCH_SESSION_ID" \
@@ -0,0 +1,52 @@
+"""
+Shared load-generation core for the LMBench workloads.
+
+Every workload script builds on the same event loop, scheduler, request
+executor, chat history and metrics collector, so performance work on the
+client only has to be done once.
+"""
+
+from .admission import AdmissionController
+from .arrival import ARRIVAL_TYPES, ArrivalProcess, add_arrival_arguments
+from .clients import EXECUTOR_CLASSES, add_client_arguments, create_executor
+from .executor import RequestExecutor, Response
+from .history import ChatHistory, render_completions_prompt, render_message
+from .logger import init_logger
+from .loop import AsyncLoopWrapper
+from .metrics import (LatencyWindow, RequestMetrics, StreamingMetrics, decode_itls, encode_itls, print_window_summary,
+                      process_summary)
+from .prompts import PromptGenerator
+from .raw_executor import RawRequestExecutor
+from .results import ResultWriter
+from .scheduler import SessionScheduler
+from .sketch import QuantileSketch, merge_sketches
+
+__all__ = [
+    "ARRIVAL_TYPES",
+    "AdmissionController",
+    "ArrivalProcess",
+    "AsyncLoopWrapper",
+    "ChatHistory",
+    "EXECUTOR_CLASSES",
+    "LatencyWindow",
+    "PromptGenerator",
+    "QuantileSketch",
+    "RawRequestExecutor",
+    "RequestExecutor",
+    "RequestMetrics",
+    "Response",
+    "ResultWriter",
+    "SessionScheduler",
+    "StreamingMetrics",
+    "add_arrival_arguments",
+    "add_client_arguments",
+    "create_executor",
+    "decode_itls",
+    "encode_itls",
+    "init_logger",
+    "merge_sketches",
+    "print_window_summary",
+    "process_summary",
+    "render_completions_prompt",
+    "render_message",
+]
@@ -0,0 +1,55 @@
+import asyncio
+from typing import Optional
+
+
+class AdmissionController:
+    """
+    Client-side cap on the number of requests in flight. Requests beyond the
+    cap wait in a FIFO of at most max_pending entries and are rejected once it
+    is full, so a client backlog shows up as queue time and rejections rather
+    than as server latency.
+
+    Both limits are optional; without max_in_flight every request is admitted
+    at once. Must only be used from the event loop thread.
+    """
+
+    def __init__(self, max_in_flight: Optional[int] = None, max_pending: Optional[int] = None):
+        if max_in_flight is not None and max_in_flight <= 0:
+            raise ValueError(f"max_in_flight must be positive, got {max_in_flight}")
+        if max_pending is not None and max_pending < 0:
+            raise ValueError(f"max_pending must not be negative, got {max_pending}")
+        self.max_in_flight = max_in_flight
+        self.max_pending = max_pending
+        self._slots = asyncio.Semaphore(max_in_flight) if max_in_flight is not None else None
+
+        self.pending = 0
+        self.queued = 0
+        self.rejected = 0
+        self.max_queue_time = 0.0
+
+    async def acquire(self) -> bool:
+        """Wait for a slot; False if the request was rejected because the queue is full."""
+        if self._slots is None:
+            return True
+        if self._slots.locked():
+            if self.max_pending is not None and self.pending >= self.max_pending:
+                self.rejected += 1
+                return False
+            self.queued += 1
+        self.pending += 1
+        try:
+            await self._slots.acquire()
+        finally:
+            self.pending -= 1
+        return True
+
+    def release(self):
+        if self._slots is not None:
+            self._slots.release()
+
+    def record_queue_time(self, queue_time: float):
+        self.max_queue_time = max(self.max_queue_time, queue_time)
+
+    def __str__(self):
+        return (f"max {self.max_in_flight} in flight, {self.queued} requests queued on the client "
+                f"(longest wait {self.max_queue_time:.3f}s), {self.rejected} rejected")
@@ -0,0 +1,232 @@
+import argparse
+import bisect
+import json
+import math
+from typing import Any, Dict, List, Optional, Sequence
+
+import numpy as np
+
+# Arrival process types accepted by the ARRIVAL spec key / --arrival
+ARRIVAL_TYPES = ("fixed", "poisson", "gamma", "step", "diurnal")
+
+# Inter-arrival gaps are drawn in batches of this many
+GAP_BATCH = 4096
+
+
+class ArrivalProcess:
+    """
+    Clock that turns the evenly spaced schedule of a session workload into an
+    arrival process with the same average QPS.
+
+    Session managers compute due times on an evenly spaced "schedule" timeline
+    (one request every 1 / qps seconds overall). This clock warps that timeline
+    onto wall-clock time in two layers:
+
+    - burstiness: the k-th evenly spaced slot is moved to the k-th arrival of a
+      renewal process with gamma inter-arrival gaps (burstiness 1 is Poisson,
+      lower is burstier), so the whole workload is bursty rather than every
+      user independently.
+    - rate profile: the rate follows a piecewise constant ("step") or
+      sinusoidal ("diurnal") multiple of the QPS.
+
+    Types:
+        fixed                       evenly spaced (the default, no warping)
+        poisson                     exponential gaps
+        gamma     burstiness        gamma gaps with shape burstiness
+        step      steps             [[start_second, qps_multiplier], ...]
+        diurnal   period, amplitude rate qps * (1 + amplitude * sin(2 pi t / period))
+
+    step and diurnal also accept burstiness to randomize the gaps around the
+    profile. seed makes the random gaps reproducible.
+    """
+
+    def __init__(
+        self,
+        qps: float,
+        type: str = "fixed",
+        burstiness: Optional[float] = None,
+        steps: Optional[Sequence[Sequence[float]]] = None,
+        period: Optional[float] = None,
+        amplitude: float = 0.5,
+        seed: int = 0,
+    ):
+        if type not in ARRIVAL_TYPES:
+            raise ValueError(f"Unsupported arrival type: {type} (expected one of {', '.join(ARRIVAL_TYPES)})")
+        if qps <= 0:
+            raise ValueError(f"Arrival process needs a positive QPS, got {qps}")
+        self.qps = qps
+        # Both timelines coincide at the start of the workload, see start()
+        self.start_time = 0.0
+        self.type = type
+
+        if type == "poisson":
+            burstiness = 1.0
+        elif type == "gamma" and burstiness is None:
+            burstiness = 1.0
+        elif type == "fixed":
+            burstiness = None
+        if burstiness is not None and burstiness <= 0:
+            raise ValueError(f"A positive burstiness is expected, got {burstiness}")
+        self.burstiness = burstiness
+
+        self._rng = np.random.default_rng(seed)
+        # Arrival offsets of the renewal process in units of 1 / qps, starting at 0
+        self._arrivals = np.zeros(1)
+
+        # Step profile: segment start offsets, multipliers and the cumulative
+        # intensity (in seconds at the base QPS) at every segment start
+        self._step_starts: List[float] = []
+        self._step_rates: List[float] = []
+        self._step_cumulative: List[float] = []
+        if type == "step":
+            self._init_steps(steps)
+
+        self.period = period
+        self.amplitude = amplitude
+        if type == "diurnal":
+            if period is None or period <= 0:
+                raise ValueError("Diurnal arrivals need a positive period in seconds")
+            if not 0 <= amplitude <= 1:
+                raise ValueError(f"Diurnal amplitude must be within [0, 1], got {amplitude}")
+
+    def _init_steps(self, steps: Optional[Sequence[Sequence[float]]]):
+        if not steps:
+            raise ValueError("Step arrivals need steps: [[start_second, qps_multiplier], ...]")
+        steps = sorted((float(start), float(rate)) for start, rate in steps)
+        if steps[0][0] > 0:
+            # Run at the configured QPS until the first step
+            steps.insert(0, (0.0, 1.0))
+        cumulative = 0.0
+        for i, (start, rate) in enumerate(steps):
+            if rate <= 0:
+                raise ValueError(f"Step QPS multipliers must be positive, got {rate}")
+            if i > 0:
+                prev_start, prev_rate = steps[i - 1]
+                cumulative += prev_rate * (start - prev_start)
+            self._step_starts.append(start)
+            self._step_rates.append(rate)
+            self._step_cumulative.append(cumulative)
+
+    @classmethod
+    def from_spec(cls, spec: Optional[Dict[str, Any]], qps: float) -> "ArrivalProcess":
+        """Build the clock from an ARRIVAL spec, e.g. {"type": "gamma", "burstiness": 0.5}."""
+        spec = dict(spec or {})
+        type = spec.pop("type", "fixed")
+        try:
+            return cls(qps, type=type, **spec)
+        except TypeError as e:
+            raise ValueError(f"Invalid ARRIVAL spec for type {type}: {e}") from e
+
+    def start(self, start_time: float):
+        """Anchor the schedule and wall-clock timelines at the workload start."""
+        self.start_time = start_time
+
+    # -- renewal layer: schedule offset <-> intensity offset (both in seconds)
+
+    def _extend_arrivals(self, index: float):
+        while len(self._arrivals) <= index + 1:
+            # Gamma gaps with mean 1 (in units of 1 / qps); shape 1 is exponential
+            gaps = self._rng.gamma(self.burstiness, 1.0 / self.burstiness, size=GAP_BATCH)
+            self._arrivals = np.concatenate([self._arrivals, self._arrivals[-1] + np.cumsum(gaps)])
+
+    def _burst(self, offset: float) -> float:
+        if self.burstiness is None or offset <= 0:
+            return offset
+        index = offset * self.qps
+        self._extend_arrivals(index)
+        i = int(index)
+        low, high = self._arrivals[i], self._arrivals[i + 1]
+        return float(low + (high - low) * (index - i)) / self.qps
+
+    def _unburst(self, offset: float) -> float:
+        if self.burstiness is None or offset <= 0:
+            return offset
+        target = offset * self.qps
+        while self._arrivals[-1] < target:
+            self._extend_arrivals(len(self._arrivals))
+        i = int(np.searchsorted(self._arrivals, target, side="right")) - 1
+        low, high = self._arrivals[i], self._arrivals[i + 1]
+        return (i + (target - low) / (high - low)) / self.qps
+
+    # -- profile layer: wall offset <-> intensity offset (both in seconds)
+
+    def _intensity(self, offset: float) -> float:
+        """Requests sent by offset, in seconds at the base QPS."""
+        if offset <= 0:
+            return offset
+        if self.type == "step":
+            i = bisect.bisect_right(self._step_starts, offset) - 1
+            return self._step_cumulative[i] + self._step_rates[i] * (offset - self._step_starts[i])
+        if self.type == "diurnal":
+            omega = 2 * math.pi / self.period
+            return offset + self.amplitude / omega * (1 - math.cos(omega * offset))
+        return offset
+
+    def _inverse_intensity(self, intensity: float) -> float:
+        if intensity <= 0:
+            return intensity
+        if self.type == "step":
+            i = bisect.bisect_right(self._step_cumulative, intensity) - 1
+            return self._step_starts[i] + (intensity - self._step_cumulative[i]) / self._step_rates[i]
+        if self.type == "diurnal":
+            # The sinusoid only ever adds up to 2 * amplitude / omega, so the
+            # offset lies within that distance below the intensity
+            omega = 2 * math.pi / self.period
+            low, high = max(intensity - 2 * self.amplitude / omega, 0.0), intensity
+            for _ in range(60):
+                mid = (low + high) / 2
+                if self._intensity(mid) < intensity:
+                    low = mid
+                else:
+                    high = mid
+            return (low + high) / 2
+        return intensity
+
+    def to_wall(self, schedule_time: float) -> float:
+        """Wall-clock time at which a request due at schedule_time is sent."""
+        offset = schedule_time - self.start_time
+        return self.start_time + self._inverse_intensity(self._burst(offset))
+
+    def to_schedule(self, wall_time: float) -> float:
+        """Position of wall_time on the evenly spaced schedule."""
+        offset = wall_time - self.start_time
+        return self.start_time + self._unburst(self._intensity(offset))
+
+    def __str__(self):
+        if self.type == "fixed":
+            return "fixed"
+        params = []
+        if self.type == "step":
+            params.append(f"steps={list(zip(self._step_starts, self._step_rates))}")
+        if self.type == "diurnal":
+            params.append(f"period={self.period}s, amplitude={self.amplitude}")
+        if self.burstiness is not None and self.type != "poisson":
+            params.append(f"burstiness={self.burstiness}")
+        return f"{self.type}({', '.join(params)})" if params else self.type
+
+
+def parse_arrival(value: str) -> Dict[str, Any]:
+    """argparse type of --arrival: an arrival type or a JSON ARRIVAL spec."""
+    if value in ARRIVAL_TYPES:
+        return {"type": value}
+    try:
+        spec = json.loads(value)
+    except json.JSONDecodeError:
+        raise argparse.ArgumentTypeError(
+            f"expected one of {', '.join(ARRIVAL_TYPES)} or a JSON object, got {value!r}"
+        )
+    if not isinstance(spec, dict) or spec.get("type", "fixed") not in ARRIVAL_TYPES:
+        raise argparse.ArgumentTypeError(f"invalid arrival spec {value!r}")
+    return spec
+
+
+def add_arrival_arguments(parser: argparse.ArgumentParser):
+    parser.add_argument(
+        "--arrival",
+        type=parse_arrival,
+        default={"type": "fixed"},
+        help="Arrival process of the requests: fixed, poisson, or a JSON spec such as "
+        '\'{"type": "gamma", "burstiness": 0.5}\', '
+        '\'{"type": "step", "steps": [[0, 0.5], [60, 2.0]]}\' or '
+        '\'{"type": "diurnal", "period": 300, "amplitude": 0.5}\' (default: fixed)',
+    )
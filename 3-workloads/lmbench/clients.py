@@ -0,0 +1,48 @@
+import argparse
+
+from .executor import RequestExecutor
+from .raw_executor import RawRequestExecutor
+
+# Request paths selectable with --client
+EXECUTOR_CLASSES = {
+    "openai": RequestExecutor,
+    "raw": RawRequestExecutor,
+}
+
+
+def add_client_arguments(parser: argparse.ArgumentParser):
+    parser.add_argument(
+        "--client",
+        type=str,
+        default="openai",
+        choices=sorted(EXECUTOR_CLASSES),
+        help="Request path: the openai SDK, or raw HTTP/SSE parsing only the "
+        "fields the benchmark needs (default: openai)",
+    )
+    parser.add_argument(
+        "--tokenizer",
+        type=str,
+        default=None,
+        help="Tokenizer used to size synthetic prompts to exact token counts and "
+        "to count tokens when the server does not report usage in the stream "
+        "(default: the model name)",
+    )
+    parser.add_argument(
+        "--max-in-flight",
+        type=int,
+        default=None,
+        help="Most requests in flight at once; further requests wait on the client "
+        "and their wait is reported as queue_time, separate from TTFT (default: no cap)",
+    )
+    parser.add_argument(
+        "--max-pending",
+        type=int,
+        default=None,
+        help="Most requests waiting for an in-flight slot; requests beyond it are "
+        "rejected (default: unbounded)",
+    )
+
+
+def create_executor(client: str, base_url: str, model: str, **kwargs) -> RequestExecutor:
+    """Build the request executor for the --client choice."""
+    return EXECUTOR_CLASSES[client](base_url=base_url, model=model, **kwargs)
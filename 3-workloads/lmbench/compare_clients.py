@@ -0,0 +1,100 @@
+"""
+Measure the client-side CPU cost of each request path.
+
+Sends the same batch of concurrent streaming requests through every --client
+choice and reports the process CPU time spent per streamed token, so the
+overhead of the openai SDK and the raw SSE path can be compared side by side.
+
+Usage (from 3-workloads/):
+    python -m lmbench.compare_clients --base-url http://localhost:8000 --model <model> \
+        [--num-requests 512] [--concurrency 256] [--max-tokens 256] [--prompt-len 256]
+"""
+
+import argparse
+import asyncio
+import logging
+import time
+from typing import Dict
+
+import pandas as pd
+
+from .clients import EXECUTOR_CLASSES, create_executor
+from .executor import RequestExecutor
+from .logger import init_logger
+from .loop import AsyncLoopWrapper
+
+logger = init_logger(__name__, logging.INFO)
+
+
+async def run_batch(executor: RequestExecutor, num_requests: int, concurrency: int,
+                    max_tokens: int, prompt_len: int):
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def one(i):
+        messages = [{"role": "user", "content": f"Request {i}: " + "hi " * prompt_len}]
+        async with semaphore:
+            return await executor._async_launch_request(messages, max_tokens)
+
+    return await asyncio.gather(*(one(i) for i in range(num_requests)))
+
+
+def measure(client: str, args) -> Dict[str, float]:
+    executor = create_executor(client, base_url=args.base_url, model=args.model, api_type=args.api_type)
+    loop = AsyncLoopWrapper.GetOrStartLoop()
+
+    # Warm up connections so that both paths start from an established pool
+    asyncio.run_coroutine_threadsafe(
+        run_batch(executor, args.concurrency, args.concurrency, 1, args.prompt_len), loop
+    ).result()
+
+    # process_time covers every thread, including the one running the event loop
+    cpu_start = time.process_time()
+    wall_start = time.perf_counter()
+    responses = asyncio.run_coroutine_threadsafe(
+        run_batch(executor, args.num_requests, args.concurrency, args.max_tokens, args.prompt_len), loop
+    ).result()
+    wall_time = time.perf_counter() - wall_start
+    cpu_time = time.process_time() - cpu_start
+    executor.close()
+
+    ok = [r for r in responses if r.error is None]
+    tokens = sum(r.generation_tokens for r in ok)
+    return {
+        "client": client,
+        "requests": len(ok),
+        "errors": len(responses) - len(ok),
+        "tokens": tokens,
+        "wall_time_s": wall_time,
+        "cpu_time_s": cpu_time,
+        "cpu_us_per_token": cpu_time / tokens * 1e6 if tokens else float("nan"),
+        "mean_ttft_s": sum(r.ttft for r in ok) / len(ok) if ok else float("nan"),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare the client CPU cost per token of the request paths.")
+    parser.add_argument("--base-url", type=str, required=True, help="Base URL of the serving engine endpoint")
+    parser.add_argument("--model", type=str, required=True, help="Model name")
+    parser.add_argument("--api-type", type=str, default="completions", choices=["completions", "chat"])
+    parser.add_argument("--clients", nargs="+", default=sorted(EXECUTOR_CLASSES), choices=sorted(EXECUTOR_CLASSES),
+                        help="Request paths to measure (default: all)")
+    parser.add_argument("--num-requests", type=int, default=512, help="Requests per client")
+    parser.add_argument("--concurrency", type=int, default=256, help="Concurrent streams")
+    parser.add_argument("--max-tokens", type=int, default=256, help="Tokens generated per request")
+    parser.add_argument("--prompt-len", type=int, default=256, help="Prompt length in words")
+    parser.add_argument("--output", type=str, default=None, help="Also write the comparison to this csv file")
+    args = parser.parse_args()
+
+    try:
+        rows = [measure(client, args) for client in args.clients]
+    finally:
+        AsyncLoopWrapper.StopLoop()
+
+    df = pd.DataFrame(rows).set_index("client")
+    print(df.to_string(float_format=lambda v: f"{v:.4f}"))
+    if args.output:
+        df.to_csv(args.output)
+
+
+if __name__ == "__main__":
+    main()
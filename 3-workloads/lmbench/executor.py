@@ -0,0 +1,261 @@
+import asyncio
+import logging
+import time
+from array import array
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, List, Optional, cast
+
+import openai
+
+from .admission import AdmissionController
+from .history import ChatHistory, render_completions_prompt
+from .logger import init_logger
+from .loop import AsyncLoopWrapper
+from .tokens import COUNT_FROM_USAGE, TokenCounter
+
+logger = init_logger(__name__, logging.INFO)
+
+
+@dataclass
+class Response:
+    body: str
+    ttft: float
+    generation_time: float
+    prompt_tokens: int
+    generation_tokens: int
+    launch_time: float
+    finish_time: float
+    # Seconds the request waited on the client for an in-flight slot before launch_time
+    queue_time: float = 0.0
+    # Gaps in seconds between consecutive streamed chunks after the first one
+    itls: array = field(default_factory=lambda: array('f'))
+    # Where prompt_tokens and generation_tokens came from, see lmbench.tokens
+    token_count_method: str = COUNT_FROM_USAGE
+    # Set when the request failed; the timing and token fields are then zero
+    error: Optional[str] = None
+
+
+class RequestExecutor:
+    """
+    Streams requests to an OpenAI-compatible endpoint from the AsyncLoopWrapper
+    loop and measures TTFT and generation time of each one.
+    """
+
+    def __init__(self, base_url: str, model: str, api_type: str = "completions",
+                 api_key: str = "vllm_xxxxxxxxxxxxx", tokenizer: Optional[str] = None,
+                 max_in_flight: Optional[int] = None, max_pending: Optional[int] = None):
+        # For vLLM server, we don't need an API key, but the client requires one
+        # Ensure base_url ends with /v1 for vLLM
+        if not base_url.endswith('/v1'):
+            base_url = base_url.rstrip('/') + '/v1'
+        self.client = openai.AsyncOpenAI(
+            api_key=api_key,
+            base_url=base_url
+        )
+        self.model = model
+        self.api_type = api_type  # "completions" or "chat"
+        # Only used when the server does not report usage in the stream
+        self.token_counter = TokenCounter(tokenizer)
+        self.admission = AdmissionController(max_in_flight, max_pending)
+        logger.info(f"Initialized OpenAI client with base_url={base_url}, model={model}, api_type={api_type}")
+        self.loop = AsyncLoopWrapper.GetOrStartLoop()
+
+    async def _stream_chat(self, model: str, messages: List[Dict[str, str]], max_tokens: int,
+                           extra_headers: Optional[Dict[str, str]]):
+        # Cast to proper message format for OpenAI client
+        chat_messages = cast(List[Any], messages)
+        response = await self.client.chat.completions.create(
+            model=model,
+            messages=chat_messages,
+            stream=True,
+            max_tokens=max_tokens,
+            temperature=0.0,
+            stream_options={"include_usage": True},
+            extra_headers=extra_headers,
+        )
+        async for chunk in response:
+            text = None
+            if chunk.choices and chunk.choices[0].delta:
+                text = chunk.choices[0].delta.content
+            yield text, getattr(chunk, "usage", None)
+
+    async def _stream_completions(self, model: str, prompt: str, max_tokens: int,
+                                  extra_headers: Optional[Dict[str, str]]):
+        response = await self.client.completions.create(
+            prompt=prompt,
+            model=model,
+            stream=True,
+            max_tokens=max_tokens,
+            temperature=0.0,
+            stream_options={"include_usage": True},
+            extra_headers=extra_headers,
+        )
+        async for chunk in response:
+            text = chunk.choices[0].text if chunk.choices else None
+            yield text, getattr(chunk, "usage", None)
+
+    async def _async_launch_request(self, messages: List[Dict[str, str]], max_tokens: int,
+                                    extra_headers: Optional[Dict[str, str]] = None,
+                                    model: Optional[str] = None, prompt: Optional[str] = None) -> Response:
+        model = model or self.model
+        enqueue_time = time.time()
+        if not await self.admission.acquire():
+            return Response(
+                body="",
+                ttft=0,
+                generation_time=0,
+                prompt_tokens=0,
+                generation_tokens=0,
+                launch_time=enqueue_time,
+                finish_time=enqueue_time,
+                error="rejected: client pending queue is full",
+            )
+        # TTFT starts once the request leaves the client queue
+        start_time = time.time()
+        queue_time = start_time - enqueue_time
+        self.admission.record_queue_time(queue_time)
+        released = False
+        try:
+            logger.debug(f"Sending request to model {model} with messages: {messages}")
+
+            # Initialize response tracking variables
+            words = ""
+            tokens_out = 0
+            tokens_prefill = 0
+            num_chunks = 0
+            first_token_time = None
+            last_chunk_time = 0.0
+            itls = array('f')
+            # Sessions may append to the history while the request is in flight
+            num_messages = len(messages)
+
+            if self.api_type == "chat":
+                prompt = None
+                stream = self._stream_chat(model, messages, max_tokens, extra_headers)
+            else:  # self.api_type == "completions"
+                if prompt is None:
+                    prompt = render_completions_prompt(messages)
+                stream = self._stream_completions(model, prompt, max_tokens, extra_headers)
+
+            # Process the streaming response
+            usage = None
+            async for text, chunk_usage in stream:
+                if chunk_usage is not None:
+                    usage = chunk_usage
+                if text:
+                    now = time.perf_counter()
+                    if first_token_time is None:
+                        first_token_time = time.time()
+                    else:
+                        itls.append(now - last_chunk_time)
+                    last_chunk_time = now
+                    words += text
+                    num_chunks += 1
+
+            finish_time = time.time()
+            # The server is done with the request, admit the next one
+            self.admission.release()
+            released = True
+
+            # Handle token counts if available
+            token_count_method = COUNT_FROM_USAGE
+            if usage is not None:
+                tokens_out = usage.completion_tokens
+                tokens_prefill = usage.prompt_tokens
+
+            # Without usage in the stream, count on the client instead of sending the request again
+            if usage is None or tokens_prefill == 0:
+                tokens_prefill, tokens_out, token_count_method = await self.token_counter.count(
+                    model, messages[:num_messages], prompt, words, num_chunks
+                )
+
+            # Calculate timing metrics
+            ttft = first_token_time - start_time if first_token_time else 0
+            generation_time = finish_time - first_token_time if first_token_time else 0
+
+            return Response(
+                body=words,
+                ttft=ttft,
+                generation_time=generation_time,
+                prompt_tokens=tokens_prefill,
+                generation_tokens=tokens_out,
+                launch_time=start_time,
+                finish_time=finish_time,
+                queue_time=queue_time,
+                itls=itls,
+                token_count_method=token_count_method,
+            )
+
+        except Exception as e:
+            logger.error(f"Error in _async_launch_request: {str(e)}")
+            logger.debug(f"Request details - model: {model}, messages: {messages}")
+            return Response(
+                body="",
+                ttft=0,
+                generation_time=0,
+                prompt_tokens=0,
+                generation_tokens=0,
+                launch_time=start_time,
+                finish_time=time.time(),
+                queue_time=queue_time,
+                error=str(e) or type(e).__name__,
+            )
+        finally:
+            if not released:
+                self.admission.release()
+
+    async def _close(self):
+        await self.client.close()
+        self.token_counter.close()
+
+    def close(self):
+        """
+        Close the HTTP connections once the in-flight requests have finished.
+        Call from the main thread before stopping the loop.
+        """
+        AsyncLoopWrapper.WaitLoop()
+        asyncio.run_coroutine_threadsafe(self._close(), self.loop).result()
+        if self.admission.max_in_flight is not None:
+            logger.info(f"Admission control: {self.admission}")
+
+    def launch_request(
+        self,
+        messages: List[Dict[str, str]],
+        max_tokens: int,
+        finish_callback: Callable[[Response], None],
+        extra_headers: Optional[Dict[str, str]] = None,
+        model: Optional[str] = None,
+        prompt: Optional[str] = None,
+    ):
+        """
+        Send messages without blocking. finish_callback runs on the loop thread
+        with the Response, whose error field is set if the request failed.
+        prompt is the already rendered completions prompt of messages, if any.
+        """
+        def safe_callback(future):
+            try:
+                finish_callback(future.result())
+            except Exception as e:
+                logger.error(f"Error in callback: {e}")
+
+        future = asyncio.run_coroutine_threadsafe(
+            self._async_launch_request(messages, max_tokens, extra_headers, model, prompt), self.loop
+        )
+        future.add_done_callback(safe_callback)
+
+    def launch_history(
+        self,
+        chat_history: ChatHistory,
+        max_tokens: int,
+        finish_callback: Callable[[Response], None],
+        extra_headers: Optional[Dict[str, str]] = None,
+        model: Optional[str] = None,
+    ):
+        """
+        Send the current state of chat_history without blocking, reusing its
+        incrementally rendered prompt in completions mode.
+        """
+        # Snapshot the messages, the history keeps growing while the request is in flight
+        messages = list(chat_history.get_messages_for_openai())
+        prompt = chat_history.render_prompt() if self.api_type == "completions" else None
+        self.launch_request(messages, max_tokens, finish_callback, extra_headers, model, prompt)
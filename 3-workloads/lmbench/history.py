@@ -0,0 +1,77 @@
+from typing import Dict, List
+
+# Completions prompts end by inviting the model to answer
+COMPLETIONS_PROMPT_SUFFIX = "Assistant: "
+
+
+def render_message(msg: Dict[str, str]) -> str:
+    """Render one chat message as a line of a completions prompt."""
+    role = msg["role"]
+    content = msg["content"]
+    name = msg.get("name", "")
+    if role == "system":
+        return f"System: {content}\n"
+    elif role == "user":
+        if name:
+            return f"User ({name}): {content}\n"
+        return f"User: {content}\n"
+    elif role == "assistant":
+        if name:
+            return f"Assistant ({name}): {content}\n"
+        return f"Assistant: {content}\n"
+    return ""
+
+
+def render_completions_prompt(messages: List[Dict[str, str]]) -> str:
+    """Flatten chat messages into a single prompt string for the completions API."""
+    return "".join([render_message(msg) for msg in messages]) + COMPLETIONS_PROMPT_SUFFIX
+
+
+class ChatHistory:
+    """
+    Conversation of one user session in OpenAI message format. Queries and
+    responses must alternate; workloads with other history semantics subclass it.
+
+    The completions prompt is rendered one message at a time as messages are
+    appended, so each round only renders its new text instead of the whole
+    conversation again.
+    """
+
+    def __init__(self):
+        self.history: List[Dict[str, str]] = []
+        # Rendered completions prompt line of every message in history
+        self.segments: List[str] = []
+
+    def append(self, message: Dict[str, str]):
+        self.history.append(message)
+        self.segments.append(render_message(message))
+
+    def clear(self):
+        self.history = []
+        self.segments = []
+
+    def on_user_query(self, query: str):
+        if len(self.history) == 0:
+            self.append({"role": "user", "content": query})
+        else:
+            assert self.history[-1]["role"] == "assistant", "Expect system response"
+            self.append({"role": "user", "content": query})
+
+    def on_system_response(self, response: str):
+        assert len(self.history) > 0, "Expect user query"
+        assert self.history[-1]["role"] == "user", "Expect user query"
+        self.append({"role": "assistant", "content": response})
+
+    def get_messages_for_openai(self) -> List[Dict[str, str]]:
+        return self.history
+
+    def render_prompt(self) -> str:
+        """The completions prompt of get_messages_for_openai(), joined once."""
+        # Join with the suffix in place so the prompt is copied only once
+        self.segments.append(COMPLETIONS_PROMPT_SUFFIX)
+        prompt = "".join(self.segments)
+        self.segments.pop()
+        return prompt
+
+    def __len__(self):
+        return len(self.history)
@@ -1,52 +1,9 @@
 import asyncio
-import logging
 import threading
-from logging import Logger
 from typing import Optional
 
+from .logger import init_logger
 
-def build_format(color):
-    reset = "\x1b[0m"
-    underline = "\x1b[3m"
-    return (
-        f"{color}[%(asctime)s] %(levelname)s:{reset} %(message)s "
-        + f"{underline}(%(filename)s:%(lineno)d:%(name)s){reset}"
-    )
-
-
-class CustomFormatter(logging.Formatter):
-
-    grey = "\x1b[1m"
-    green = "\x1b[32;20m"
-    yellow = "\x1b[33;20m"
-    red = "\x1b[31;20m"
-    bold_red = "\x1b[31;1m"
-    reset = "\x1b[0m"
-
-    FORMATS = {
-        logging.DEBUG: build_format(grey),
-        logging.INFO: build_format(green),
-        logging.WARNING: build_format(yellow),
-        logging.ERROR: build_format(red),
-        logging.CRITICAL: build_format(bold_red),
-    }
-
-    def format(self, record):
-        log_fmt = self.FORMATS.get(record.levelno)
-        formatter = logging.Formatter(log_fmt)
-        return formatter.format(record)
-
-
-def init_logger(name: str, log_level=logging.DEBUG) -> Logger:
-    logger = logging.getLogger(name)
-
-    ch = logging.StreamHandler()
-    ch.setLevel(log_level)
-    ch.setFormatter(CustomFormatter())
-    logger.addHandler(ch)
-    logger.setLevel(logging.DEBUG)
-
-    return logger
 
 # Note: although this event loop runs in a separate thread, Python's GIL effectively makes this single-threaded (as of 3.12)
 class AsyncLoopWrapper:
@@ -0,0 +1,332 @@
+import base64
+import logging
+import math
+from typing import Any, Dict, List, Optional, Sequence
+
+import numpy as np
+import pandas as pd
+
+from .executor import Response
+from .logger import init_logger
+from .sketch import QuantileSketch
+
+logger = init_logger(__name__, logging.INFO)
+
+
+def encode_itls(itls: Sequence[float]) -> str:
+    """Pack inter-chunk gaps (float32 seconds) into a compact csv-safe string."""
+    return base64.b64encode(np.asarray(itls, dtype='<f4').tobytes()).decode('ascii')
+
+
+def decode_itls(encoded) -> np.ndarray:
+    """Inverse of encode_itls; empty or missing values give an empty array."""
+    if not isinstance(encoded, str) or not encoded:
+        return np.empty(0, dtype=np.float32)
+    return np.frombuffer(base64.b64decode(encoded), dtype='<f4')
+
+
+class RequestMetrics:
+    """Per-request latency and token counts collected by one session or runner."""
+
+    def __init__(self):
+        self.prompt_lengths: List[int] = []
+        self.generation_lengths: List[int] = []
+        self.ttfts: List[float] = []
+        self.generation_times: List[float] = []
+        self.launch_times: List[float] = []
+        self.finish_times: List[float] = []
+        self.queue_times: List[float] = []
+        self.token_count_methods: List[str] = []
+        self.itls: List[str] = []
+
+    def record(self, response: Response):
+        self.prompt_lengths.append(response.prompt_tokens)
+        self.generation_lengths.append(response.generation_tokens)
+        self.ttfts.append(response.ttft)
+        self.generation_times.append(response.generation_time)
+        self.launch_times.append(response.launch_time)
+        self.finish_times.append(response.finish_time)
+        self.queue_times.append(response.queue_time)
+        self.token_count_methods.append(response.token_count_method)
+        self.itls.append(encode_itls(response.itls))
+
+    def __len__(self):
+        return len(self.prompt_lengths)
+
+    def to_frame(self, user_id: Optional[int] = None, **extra_columns: Any) -> pd.DataFrame:
+        """
+        Build the per-request summary frame. user_id adds the user_id and
+        question_id columns; extra_columns are appended in the given order.
+        """
+        df = pd.DataFrame()
+        df["prompt_tokens"] = self.prompt_lengths
+        df["generation_tokens"] = self.generation_lengths
+        df["ttft"] = self.ttfts
+        df["generation_time"] = self.generation_times
+        if user_id is not None:
+            df["user_id"] = user_id
+            df["question_id"] = range(1, len(self) + 1)
+        df["launch_time"] = self.launch_times
+        df["finish_time"] = self.finish_times
+        df["queue_time"] = self.queue_times
+        df["token_count_method"] = self.token_count_methods
+        df["itls"] = self.itls
+        for name, values in extra_columns.items():
+            df[name] = values
+        return df
+
+
+# Latency metrics aggregated by LatencyWindow, all in milliseconds
+WINDOW_METRICS = ("ttft_ms", "tpot_ms", "itl_ms", "e2e_ms", "queue_ms")
+
+
+class LatencyWindow:
+    """
+    Running aggregates of the requests that finished in one time window:
+    token counts and a QuantileSketch per latency metric. Recording a request
+    is O(1) (O(chunks) for its ITLs), and windows merge into run totals.
+    """
+
+    def __init__(self, start_time: float):
+        self.start_time = start_time
+        self.end_time = start_time
+        self.count = 0
+        self.prompt_tokens = 0
+        self.generation_tokens = 0
+        # Sum of generation_tokens / generation_time over the requests with a generation time
+        self.generation_speed_sum = 0.0
+        self.generation_speed_count = 0
+        self.sketches: Dict[str, QuantileSketch] = {name: QuantileSketch() for name in WINDOW_METRICS}
+
+    def record(self, response: Response):
+        self.count += 1
+        self.end_time = max(self.end_time, response.finish_time)
+        self.prompt_tokens += response.prompt_tokens
+        self.generation_tokens += response.generation_tokens
+        if response.generation_time > 0:
+            self.generation_speed_sum += response.generation_tokens / response.generation_time
+            self.generation_speed_count += 1
+        self.sketches["ttft_ms"].add(response.ttft * 1000)
+        if response.generation_tokens > 1:
+            self.sketches["tpot_ms"].add(response.generation_time / (response.generation_tokens - 1) * 1000)
+        self.sketches["e2e_ms"].add((response.ttft + response.generation_time) * 1000)
+        self.sketches["queue_ms"].add(response.queue_time * 1000)
+        if len(response.itls) > 0:
+            self.sketches["itl_ms"].add_many(np.asarray(response.itls, dtype=np.float64) * 1000)
+
+    def merge(self, other: "LatencyWindow"):
+        self.start_time = min(self.start_time, other.start_time)
+        self.end_time = max(self.end_time, other.end_time)
+        self.count += other.count
+        self.prompt_tokens += other.prompt_tokens
+        self.generation_tokens += other.generation_tokens
+        self.generation_speed_sum += other.generation_speed_sum
+        self.generation_speed_count += other.generation_speed_count
+        for name, sketch in other.sketches.items():
+            self.sketches[name].merge(sketch)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "start_time": self.start_time,
+            "end_time": self.end_time,
+            "count": self.count,
+            "prompt_tokens": self.prompt_tokens,
+            "generation_tokens": self.generation_tokens,
+            "sketches": {name: sketch.to_dict() for name, sketch in self.sketches.items()},
+        }
+
+
+class StreamingMetrics:
+    """
+    Per-window and whole-run aggregates for live logging. record() feeds the
+    current window; roll() closes it, merges it into the run total and starts
+    the next one, so each periodic summary costs the same however long the
+    run is. Must only be used from one thread (the scheduler's event loop).
+    """
+
+    def __init__(self, start_time: float = 0.0):
+        self.start(start_time)
+
+    def start(self, start_time: float):
+        """Start the first window (and the run) at start_time."""
+        self.window = LatencyWindow(start_time)
+        self.total = LatencyWindow(start_time)
+
+    def record(self, response: Response):
+        self.window.record(response)
+
+    def roll(self, end_time: float) -> LatencyWindow:
+        window = self.window
+        window.end_time = max(window.end_time, end_time)
+        self.total.merge(window)
+        self.window = LatencyWindow(end_time)
+        return window
+
+
+def print_window_summary(window: LatencyWindow, pending_queries: int = 0, qps: Optional[float] = None):
+    """Print the performance summary of a LatencyWindow, like process_summary does for a frame."""
+    total_time = window.end_time - window.start_time
+    if window.count == 0 or total_time <= 0:
+        logger.info("No requests finished in the last window")
+        return
+    sketches = window.sketches
+    average_generation_speed_per_request = (
+        window.generation_speed_sum / window.generation_speed_count
+        if window.generation_speed_count else math.nan
+    )
+    logger.info("Calculating performance summary")
+    print("\n")
+    print("==================== Performance summary ======================")
+    if qps is not None:
+        print(f"  \033[33mQPS: \033[32m{qps:.4f} reqs/s\033[0m\n")
+
+    print(
+        f"  \033[33mProcessing speed: "
+        f"\033[32m{window.count / total_time:.4f} reqs/s\033[0m\n"
+    )
+
+    print(f"  \033[33mRequests on-the-fly: {pending_queries}\033[0m\n")
+
+    print(
+        "  \033[33mInput tokens per second: "
+        f"\033[32m{window.prompt_tokens / total_time:.4f} tokens/s\033[0m\n"
+    )
+
+    print(
+        "  \033[33mOutput tokens per second: "
+        f"\033[32m{window.generation_tokens / total_time:.4f} tokens/s\033[0m\n"
+    )
+
+    print(
+        "  \033[33mAverage generation throughput (per request): "
+        f"\033[32m{average_generation_speed_per_request:.4f} "
+        "tokens/req/s\033[0m\n"
+    )
+
+    print(f"  \033[33mAverage TTFT: \033[32m{sketches['ttft_ms'].mean / 1000:.4f}s\033[0m\n")
+
+    for name, label in (("ttft_ms", "TTFT"), ("tpot_ms", "TPOT"), ("e2e_ms", "E2E latency")):
+        if sketches[name].count > 0:
+            print(
+                f"  \033[33m{label} (p50 / p99): \033[32m{sketches[name].quantile(0.5):.2f}ms / "
+                f"{sketches[name].quantile(0.99):.2f}ms\033[0m\n"
+            )
+
+    if sketches["queue_ms"].max > 0:
+        print(
+            "  \033[33mClient queue time (mean / p99): "
+            f"\033[32m{sketches['queue_ms'].mean / 1000:.4f}s / {sketches['queue_ms'].quantile(0.99) / 1000:.4f}s\033[0m\n"
+        )
+
+    if sketches["itl_ms"].count > 0:
+        print(
+            f"  \033[33mITL (p50 / p99): \033[32m{sketches['itl_ms'].quantile(0.5):.2f}ms / "
+            f"{sketches['itl_ms'].quantile(0.99):.2f}ms\033[0m\n"
+        )
+        print(f"  \033[33mLongest decode gap: \033[32m{sketches['itl_ms'].max:.2f}ms\033[0m\n")
+
+    print(f"Time range: {window.start_time} - {window.end_time} ({total_time:.2f}s)")
+
+    print("===============================================================")
+    print("\n")
+
+
+def process_summary(
+    df: pd.DataFrame,
+    start_time: Optional[float] = None,
+    end_time: Optional[float] = None,
+    pending_queries: int = 0,
+    qps: Optional[float] = None,
+) -> pd.DataFrame:
+    """
+    Print the performance summary of the requests that finished in
+    [start_time, end_time] and return them. The target QPS line is only
+    printed when qps is given.
+    """
+    if start_time and end_time:
+        launched_queries = len(
+            df.query(f"{start_time} <= launch_time <= {end_time}")
+        )
+        df = df.query(f"{start_time} <= finish_time <= {end_time}")
+    else:
+        launched_queries = len(df)
+
+    logger.debug(
+        f"Launched queries: {launched_queries}, "
+        f"pending queries: {pending_queries}, "
+        f"finished queries: {len(df)}"
+    )
+
+    if start_time is None:
+        start_time = df["launch_time"].min()
+    if end_time is None:
+        end_time = df["finish_time"].max()
+    total_time = end_time - start_time
+
+    total_requests = launched_queries + pending_queries
+    _qps = total_requests / total_time
+
+    total_finished_requests = len(df)
+    finished_qps = total_finished_requests / total_time
+
+    total_prompt_tokens = df["prompt_tokens"].sum()
+    total_generation_tokens = df["generation_tokens"].sum()
+    average_prefill_speed = total_prompt_tokens / total_time
+    average_generation_speed = total_generation_tokens / total_time
+    average_generation_speed_per_request = (
+        df["generation_tokens"] / df["generation_time"]
+    ).mean()
+    average_ttft = df["ttft"].mean()
+    logger.info("Calculating performance summary")
+    print("\n")
+    print("==================== Performance summary ======================")
+    if qps is not None:
+        print(f"  \033[33mQPS: \033[32m{qps:.4f} reqs/s\033[0m\n")
+
+    print(
+        f"  \033[33mProcessing speed: "
+        f"\033[32m{finished_qps:.4f} reqs/s\033[0m\n"
+    )
+
+    print(f"  \033[33mRequests on-the-fly: {pending_queries}\033[0m\n")
+
+    print(
+        "  \033[33mInput tokens per second: "
+        f"\033[32m{average_prefill_speed:.4f} tokens/s\033[0m\n"
+    )
+
+    print(
+        "  \033[33mOutput tokens per second: "
+        f"\033[32m{average_generation_speed:.4f} tokens/s\033[0m\n"
+    )
+
+    print(
+        "  \033[33mAverage generation throughput (per request): "
+        f"\033[32m{average_generation_speed_per_request:.4f} "
+        "tokens/req/s\033[0m\n"
+    )
+
+    print(f"  \033[33mAverage TTFT: \033[32m{average_ttft:.4f}s\033[0m\n")
+
+    if "queue_time" in df.columns and len(df) > 0 and df["queue_time"].max() > 0:
+        print(
+            "  \033[33mClient queue time (mean / p99): "
+            f"\033[32m{df['queue_time'].mean():.4f}s / {df['queue_time'].quantile(0.99):.4f}s\033[0m\n"
+        )
+
+    if "itls" in df.columns and len(df) > 0:
+        itls = [decode_itls(encoded) for encoded in df["itls"]]
+        all_itls = np.concatenate(itls)
+        if len(all_itls) > 0:
+            longest_gap = max(float(gaps.max()) for gaps in itls if len(gaps) > 0)
+            print(
+                f"  \033[33mITL (p50 / p99): \033[32m{np.median(all_itls) * 1000:.2f}ms / "
+                f"{np.percentile(all_itls, 99) * 1000:.2f}ms\033[0m\n"
+            )
+            print(f"  \033[33mLongest decode gap: \033[32m{longest_gap * 1000:.2f}ms\033[0m\n")
+
+    print(f"Time range: {start_time} - {end_time} ({total_time:.2f}s)")
+
+    print("===============================================================")
+    print("\n")
+    return df
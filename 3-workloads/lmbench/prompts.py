@@ -0,0 +1,119 @@
+import logging
+import random
+import string
+from typing import Dict, List, Optional, Union
+
+from .logger import init_logger
+from .tokens import get_tokenizer
+
+logger = init_logger(__name__, logging.INFO)
+
+# Filler word repeated to build synthetic prompts
+FILLER_WORD = "hi"
+
+# Token ids of this many filler words are encoded once and sliced for any length
+FILLER_BLOCK_WORDS = 1024
+
+# Letters of the random words that stand in for tokens without a tokenizer
+RANDOM_WORD_LEN = 5
+
+# A token id, or a word when there is no tokenizer
+Token = Union[int, str]
+
+
+class PromptGenerator:
+    """
+    Builds filler text with an exact token count for the model's tokenizer,
+    so synthetic system prompts, histories and answers hold the number of
+    tokens the spec asks for on every model.
+
+    Texts are memoized by length: sessions with the same lengths reuse the
+    decoded string instead of tokenizing again. Without a tokenizer it falls
+    back to one filler word per token.
+    """
+
+    def __init__(self, tokenizer: Optional[str] = None):
+        self.tokenizer = get_tokenizer(tokenizer) if tokenizer else None
+        # Token ids of the filler block, extended on demand
+        self._block: List[int] = []
+        # num_tokens -> decoded text
+        self._texts: Dict[int, str] = {}
+        # Ids that random_tokens() draws from, built on first use
+        self._random_pool: Optional[List[int]] = None
+
+    def _num_tokens(self, text: str) -> int:
+        return len(self.tokenizer.encode(text, add_special_tokens=False))
+
+    def _filler_ids(self, num_tokens: int) -> List[int]:
+        while len(self._block) < num_tokens:
+            # Continue the block with a leading space so words stay separate tokens
+            prefix = " " if self._block else ""
+            self._block += self.tokenizer.encode(
+                prefix + " ".join([FILLER_WORD] * FILLER_BLOCK_WORDS), add_special_tokens=False
+            )
+        return self._block[:num_tokens]
+
+    def _build(self, num_tokens: int) -> str:
+        if self.tokenizer is None:
+            return " ".join([FILLER_WORD] * num_tokens)
+        # Decoding and encoding again can merge tokens at the edges, so adjust the
+        # number of ids until the text encodes to exactly num_tokens
+        num_ids = num_tokens
+        for _ in range(8):
+            text = self.tokenizer.decode(self._filler_ids(num_ids))
+            diff = num_tokens - self._num_tokens(text)
+            if diff == 0:
+                return text
+            num_ids = max(num_ids + diff, 0)
+        logger.warning(f"Could not build a prompt of exactly {num_tokens} tokens, "
+                       f"using {self._num_tokens(text)} tokens")
+        return text
+
+    def text(self, num_tokens: int) -> str:
+        """Filler text that encodes to exactly num_tokens tokens."""
+        if num_tokens <= 0:
+            return ""
+        text = self._texts.get(num_tokens)
+        if text is None:
+            text = self._texts[num_tokens] = self._build(num_tokens)
+        return text
+
+    def encode(self, text: str) -> List[Token]:
+        """Tokens of text; words (one per filler token) without a tokenizer."""
+        if self.tokenizer is None:
+            return text.split(" ")
+        return self.tokenizer.encode(text, add_special_tokens=False)
+
+    def decode(self, tokens: List[Token]) -> str:
+        if self.tokenizer is None:
+            return " ".join(tokens)
+        return self.tokenizer.decode(tokens)
+
+    def _build_random_pool(self) -> List[int]:
+        # Whole words with a leading space ("Ġword" / "▁word") decode and encode
+        # again to the same tokens, unlike byte pieces or special tokens
+        special_ids = set(self.tokenizer.all_special_ids)
+        pool = [
+            token_id for token, token_id in self.tokenizer.get_vocab().items()
+            if token[:1] in ("Ġ", "▁") and token[1:].isascii() and token[1:].isalpha()
+            and token_id not in special_ids
+        ]
+        if not pool:
+            pool = [token_id for token_id in range(len(self.tokenizer)) if token_id not in special_ids]
+        return pool
+
+    def _draw(self, rng: random.Random, num_tokens: int) -> List[Token]:
+        if self.tokenizer is None:
+            return ["".join(rng.choices(string.ascii_lowercase, k=RANDOM_WORD_LEN)) for _ in range(num_tokens)]
+        if self._random_pool is None:
+            self._random_pool = self._build_random_pool()
+        return rng.choices(self._random_pool, k=num_tokens)
+
+    def random_tokens(self, rng: random.Random, num_tokens: int, avoid: Optional[Token] = None) -> List[Token]:
+        """num_tokens random tokens from rng, the first one different from avoid."""
+        if num_tokens <= 0:
+            return []
+        tokens = self._draw(rng, num_tokens)
+        while tokens[0] == avoid:
+            tokens[0] = self._draw(rng, 1)[0]
+        return tokens
@@ -0,0 +1,128 @@
+import json
+import logging
+from typing import Dict, List, NamedTuple, Optional
+
+import aiohttp
+
+from .admission import AdmissionController
+from .executor import RequestExecutor
+from .logger import init_logger
+from .loop import AsyncLoopWrapper
+from .tokens import TokenCounter
+
+try:
+    import orjson
+    json_loads = orjson.loads
+except ImportError:
+    json_loads = json.loads
+
+logger = init_logger(__name__, logging.INFO)
+
+
+class Usage(NamedTuple):
+    prompt_tokens: int
+    completion_tokens: int
+
+
+def parse_usage(usage: Optional[Dict]) -> Optional[Usage]:
+    if not usage:
+        return None
+    return Usage(usage.get("prompt_tokens", 0), usage.get("completion_tokens", 0))
+
+
+class RawRequestExecutor(RequestExecutor):
+    """
+    RequestExecutor that speaks HTTP and server-sent events directly over a
+    pooled aiohttp session instead of going through the openai SDK. Only the
+    text delta and usage of each chunk are read, with orjson when installed,
+    so hundreds of concurrent streams cost less client CPU and chunk
+    timestamps are not delayed by per-chunk object construction.
+    """
+
+    def __init__(self, base_url: str, model: str, api_type: str = "completions",
+                 api_key: str = "vllm_xxxxxxxxxxxxx", tokenizer: Optional[str] = None,
+                 max_in_flight: Optional[int] = None, max_pending: Optional[int] = None):
+        # Ensure base_url ends with /v1 for vLLM
+        if not base_url.endswith('/v1'):
+            base_url = base_url.rstrip('/') + '/v1'
+        self.base_url = base_url
+        self.headers = {"Authorization": f"Bearer {api_key}"}
+        self.model = model
+        self.api_type = api_type  # "completions" or "chat"
+        self.session: Optional[aiohttp.ClientSession] = None
+        # Only used when the server does not report usage in the stream
+        self.token_counter = TokenCounter(tokenizer)
+        self.admission = AdmissionController(max_in_flight, max_pending)
+        logger.info(f"Initialized raw SSE client with base_url={base_url}, model={model}, api_type={api_type}, "
+                    f"json={json_loads.__module__}")
+        self.loop = AsyncLoopWrapper.GetOrStartLoop()
+
+    def _get_session(self) -> aiohttp.ClientSession:
+        # Created lazily so that it is bound to the executor loop
+        if self.session is None:
+            connector = aiohttp.TCPConnector(limit=0, ttl_dns_cache=300)
+            self.session = aiohttp.ClientSession(
+                connector=connector,
+                headers=self.headers,
+                timeout=aiohttp.ClientTimeout(total=None),
+            )
+        return self.session
+
+    async def _post(self, endpoint: str, payload: Dict, extra_headers: Optional[Dict[str, str]]):
+        response = await self._get_session().post(
+            f"{self.base_url}/{endpoint}", json=payload, headers=extra_headers
+        )
+        if response.status != 200:
+            error_text = await response.text()
+            response.release()
+            raise RuntimeError(f"HTTP {response.status}: {error_text}")
+        return response
+
+    async def _stream(self, endpoint: str, payload: Dict, extra_headers: Optional[Dict[str, str]]):
+        chat = endpoint == "chat/completions"
+        async with await self._post(endpoint, payload, extra_headers) as response:
+            async for line in response.content:
+                if not line.startswith(b"data:"):
+                    continue
+                data = line[5:].strip()
+                if data == b"[DONE]":
+                    break
+                chunk = json_loads(data)
+                text = None
+                choices = chunk.get("choices")
+                if choices:
+                    if chat:
+                        text = (choices[0].get("delta") or {}).get("content")
+                    else:
+                        text = choices[0].get("text")
+                yield text, parse_usage(chunk.get("usage"))
+
+    def _stream_chat(self, model: str, messages: List[Dict[str, str]], max_tokens: int,
+                     extra_headers: Optional[Dict[str, str]]):
+        payload = {
+            "model": model,
+            "messages": messages,
+            "stream": True,
+            "max_tokens": max_tokens,
+            "temperature": 0.0,
+            "stream_options": {"include_usage": True},
+        }
+        return self._stream("chat/completions", payload, extra_headers)
+
+    def _stream_completions(self, model: str, prompt: str, max_tokens: int,
+                            extra_headers: Optional[Dict[str, str]]):
+        payload = {
+            "model": model,
+            "prompt": prompt,
+            "stream": True,
+            "max_tokens": max_tokens,
+            "temperature": 0.0,
+            "stream_options": {"include_usage": True},
+        }
+        return self._stream("completions", payload, extra_headers)
+
+    async def _close(self):
+        if self.session is not None:
+            await self.session.close()
+            self.session = None
+        self.token_counter.close()
@@ -0,0 +1,117 @@
+import logging
+import os
+from typing import Any, Dict, Optional, Sequence
+
+import numpy as np
+import pandas as pd
+
+from .executor import Response
+from .logger import init_logger
+from .metrics import StreamingMetrics, encode_itls
+
+logger = init_logger(__name__, logging.INFO)
+
+# Columns of the per-request summary, in the order RequestMetrics.to_frame writes them
+RESULT_COLUMNS = (
+    ("prompt_tokens", np.int64),
+    ("generation_tokens", np.int64),
+    ("ttft", np.float64),
+    ("generation_time", np.float64),
+    ("user_id", np.int64),
+    ("question_id", np.int64),
+    ("launch_time", np.float64),
+    ("finish_time", np.float64),
+    ("queue_time", np.float64),
+    ("token_count_method", object),
+    ("itls", object),
+)
+
+# Rows appended to the output file per flush
+CHUNK_SIZE = 4096
+
+
+class ResultWriter:
+    """
+    Append-only columnar buffer of the per-request results of one run.
+
+    Every finished request is written into preallocated typed arrays, one per
+    column, instead of a per-session list that is turned into a DataFrame and
+    concatenated again on every summary. Rows are appended to the output csv
+    in chunks, so memory does not grow with the length of the run and a run
+    that dies early still leaves its results on disk.
+
+    Requests are also fed to a StreamingMetrics (metrics) that periodic
+    summaries roll, so they never read the rows back. Must only be used from
+    one thread (the scheduler's event loop).
+    """
+
+    def __init__(
+        self,
+        path: str,
+        with_user_id: bool = True,
+        extra_columns: Sequence[str] = (),
+        chunk_size: int = CHUNK_SIZE,
+    ):
+        self.path = path
+        self.chunk_size = chunk_size
+        self.metrics = StreamingMetrics()
+        self.columns = [
+            (name, dtype) for name, dtype in RESULT_COLUMNS
+            if with_user_id or name not in ("user_id", "question_id")
+        ] + [(name, object) for name in extra_columns]
+
+        self._data: Dict[str, np.ndarray] = {
+            name: np.empty(chunk_size, dtype=dtype) for name, dtype in self.columns
+        }
+        # Rows of the current chunk, appended to the file by flush()
+        self._size = 0
+
+        self.num_rows = 0
+        # Start from an empty file, the header is written with the first chunk
+        if os.path.exists(path):
+            os.remove(path)
+        self._header_written = False
+
+    def record(self, response: Response, user_id: Optional[int] = None,
+               question_id: Optional[int] = None, **extra: Any):
+        """Append the row of one finished request."""
+        self.metrics.record(response)
+        row = self._size
+        data = self._data
+        data["prompt_tokens"][row] = response.prompt_tokens
+        data["generation_tokens"][row] = response.generation_tokens
+        data["ttft"][row] = response.ttft
+        data["generation_time"][row] = response.generation_time
+        if "user_id" in data:
+            data["user_id"][row] = user_id
+            data["question_id"][row] = question_id
+        data["launch_time"][row] = response.launch_time
+        data["finish_time"][row] = response.finish_time
+        data["queue_time"][row] = response.queue_time
+        data["token_count_method"][row] = response.token_count_method
+        data["itls"][row] = encode_itls(response.itls)
+        for name, value in extra.items():
+            data[name][row] = value
+        self._size += 1
+        self.num_rows += 1
+
+        if self._size == self.chunk_size:
+            self.flush()
+
+    def flush(self):
+        """Append the rows of the current chunk to the output file."""
+        if self._size == 0:
+            return
+        pd.DataFrame({name: self._data[name][:self._size] for name, _ in self.columns}).to_csv(
+            self.path, mode="a", header=not self._header_written, index=False
+        )
+        self._header_written = True
+        self._size = 0
+
+    def close(self) -> pd.DataFrame:
+        """Flush the remaining rows and read the whole run back from the output file."""
+        self.flush()
+        if not self._header_written:
+            return pd.DataFrame(columns=[name for name, _ in self.columns])
+        logger.info(f"Wrote {self.num_rows} requests to {self.path}")
+        return pd.read_csv(self.path)
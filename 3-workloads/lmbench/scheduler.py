@@ -0,0 +1,90 @@
+import asyncio
+import heapq
+import itertools
+import time
+from typing import Optional
+
+from .arrival import ArrivalProcess
+from .logger import init_logger
+
+
+class SessionScheduler:
+    """Event-driven scheduler that runs inside the AsyncLoopWrapper loop.
+
+    Callbacks are kept in a min-heap keyed by their wall-clock due time and
+    the scheduler sleeps until the earliest one is due, so work fires at its
+    scheduled instant and entities with nothing due cost nothing.
+
+    With an arrival clock, due times and callback timestamps are on the
+    clock's evenly spaced schedule and are warped onto wall-clock time, so
+    a workload written for evenly spaced requests follows the arrival process.
+    """
+
+    _logger = init_logger("SessionScheduler")
+
+    def __init__(self, loop: asyncio.AbstractEventLoop, clock: Optional[ArrivalProcess] = None):
+        self._loop = loop
+        self._clock = clock
+        self._heap = []
+        self._counter = itertools.count()
+        self._wakeup = asyncio.Event()
+        self._stopped = False
+        self._future = None
+
+    def call_at(self, due_time: float, callback):
+        """
+        Schedule callback(timestamp) at the wall-clock time due_time, or at
+        the schedule time due_time of the arrival clock.
+        Must be called from the loop thread.
+        """
+        wall_time = due_time if self._clock is None else self._clock.to_wall(due_time)
+        entry = (wall_time, next(self._counter), due_time, callback)
+        heapq.heappush(self._heap, entry)
+        if self._heap[0] is entry:
+            self._wakeup.set()
+
+    def call_at_threadsafe(self, due_time: float, callback):
+        self._loop.call_soon_threadsafe(self.call_at, due_time, callback)
+
+    def __len__(self):
+        return len(self._heap)
+
+    async def _run(self):
+        while not self._stopped:
+            if not self._heap:
+                self._wakeup.clear()
+                await self._wakeup.wait()
+                continue
+
+            delay = self._heap[0][0] - time.time()
+            if delay > 0:
+                self._wakeup.clear()
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), timeout=delay)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+
+            _, _, due_time, callback = heapq.heappop(self._heap)
+            timestamp = time.time()
+            if self._clock is not None:
+                # Never report a time before the due time because of rounding
+                timestamp = max(due_time, self._clock.to_schedule(timestamp))
+            try:
+                callback(timestamp)
+            except Exception as e:
+                self._logger.error(f"Error in scheduled callback: {e}")
+            # Let the streams in flight read their chunks between two callbacks,
+            # overdue callbacks after a stall would otherwise all run first
+            await asyncio.sleep(0)
+
+    def start(self):
+        assert self._future is None, "Scheduler is already started"
+        self._future = asyncio.run_coroutine_threadsafe(self._run(), self._loop)
+
+    def stop(self):
+        def _stop():
+            self._stopped = True
+            self._wakeup.set()
+
+        self._loop.call_soon_threadsafe(_stop)
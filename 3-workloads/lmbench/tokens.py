@@ -0,0 +1,70 @@
+import asyncio
+import logging
+import os
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
+from typing import Dict, List, Optional, Tuple
+
+from .history import render_completions_prompt
+from .logger import init_logger
+
+logger = init_logger(__name__, logging.INFO)
+
+# How the token counts of a request were obtained
+COUNT_FROM_USAGE = "usage"          # reported by the server in the stream
+COUNT_FROM_TOKENIZER = "tokenizer"  # counted on the client with the model tokenizer
+COUNT_FROM_CHUNKS = "chunks"        # no tokenizer: streamed chunks, prompt unknown
+
+
+@lru_cache(maxsize=None)
+def get_tokenizer(name: str):
+    """Load the tokenizer once per name, or return None if it is not available."""
+    try:
+        os.environ.setdefault("TOKENIZERS_PARALLELISM", "false")
+        from transformers import AutoTokenizer
+        return AutoTokenizer.from_pretrained(name)
+    except Exception as e:
+        logger.warning(f"Tokenizer {name} is not available ({e}), "
+                       "token counts and prompt lengths are approximate")
+        return None
+
+
+class TokenCounter:
+    """
+    Counts prompt and output tokens on the client for servers whose stream
+    does not report usage. Tokenization runs on a dedicated worker thread so
+    it never blocks the event loop that timestamps the streams.
+    """
+
+    def __init__(self, tokenizer: Optional[str] = None):
+        # Defaults to the tokenizer of each request's model
+        self.tokenizer = tokenizer
+        self._pool = ThreadPoolExecutor(max_workers=1, thread_name_prefix="lmbench-tokenizer")
+
+    def _count(self, model: str, messages: List[Dict[str, str]], prompt: Optional[str],
+               body: str, num_chunks: int) -> Tuple[int, int, str]:
+        tokenizer = get_tokenizer(self.tokenizer or model)
+        if tokenizer is None:
+            return 0, num_chunks, COUNT_FROM_CHUNKS
+        add_special_tokens = True
+        if prompt is None:
+            if getattr(tokenizer, "chat_template", None):
+                prompt = tokenizer.apply_chat_template(messages, tokenize=False, add_generation_prompt=True)
+                # The template already contains the special tokens
+                add_special_tokens = False
+            else:
+                prompt = render_completions_prompt(messages)
+        prompt_tokens = len(tokenizer.encode(prompt, add_special_tokens=add_special_tokens))
+        output_tokens = len(tokenizer.encode(body, add_special_tokens=False))
+        return prompt_tokens, output_tokens, COUNT_FROM_TOKENIZER
+
+    async def count(self, model: str, messages: List[Dict[str, str]], prompt: Optional[str],
+                    body: str, num_chunks: int) -> Tuple[int, int, str]:
+        """Return (prompt_tokens, output_tokens, method) for a finished request."""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(
+            self._pool, self._count, model, messages, prompt, body, num_chunks
+        )
+
+    def close(self):
+        self._pool.shutdown(wait=False)
@@ -1,19 +1,23 @@
 #!/usr/bin/env python3
 
 import argparse
-import asyncio
 import json
 import logging
+import sys
+import threading
 import time
-import random
-import string
 from dataclasses import dataclass
-from typing import Optional, List, Dict
+from pathlib import Path
+from typing import Optional
 
-import openai
+import numpy as np
 import pandas as pd
 
-from utils import AsyncLoopWrapper, init_logger
+# The shared lmbench client package lives in 3-workloads/
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+from lmbench import (ArrivalProcess, AsyncLoopWrapper, ChatHistory, RequestExecutor, Response, ResultWriter,
+                     SessionScheduler, add_arrival_arguments, add_client_arguments, create_executor,
+                     init_logger, print_window_summary)
 
 logger = init_logger(__name__, logging.INFO)
 
@@ -74,191 +78,89 @@ class UserConfig:
         )
 
 
-class ChatHistory:
-
-    def __init__(self):
-        self.history = []
+class RandomChatHistory(ChatHistory):
+    """Each query is independent, so no history (and no shared prefix) is kept."""
 
     def on_user_query(self, query: str):
         # For random workload, each query is independent (no shared history)
-        self.history = [{"role": "user", "content": query}]
+        self.clear()
+        self.append({"role": "user", "content": query})
 
     def on_system_response(self, response: str):
         # We don't maintain history for random workload to avoid shared prefixes
         pass
 
-    def get_messages_for_openai(self):
-        return self.history
-
-    def __len__(self):
-        return len(self.history)
-
-
-@dataclass
-class Response:
-    body: str
-    ttft: float
-    generation_time: float
-    prompt_tokens: int
-    generation_tokens: int
-    launch_time: float
-    finish_time: float
-
-
-class RequestExecutor:
-
-    def __init__(self, base_url: str, model: str):
-        # Ensure base_url ends with /v1 for vLLM
-        if not base_url.endswith('/v1'):
-            base_url = base_url.rstrip('/') + '/v1'
-        self.base_url = base_url
-        self.model = model
-        self.loop = AsyncLoopWrapper.GetOrStartLoop()
-        self.client = openai.AsyncOpenAI(
-            base_url=base_url,
-            api_key="dummy-key",
-        )
 
-    async def _async_launch_request(self, messages: List[Dict[str, str]], max_tokens: int,
-                                    extra_headers: Optional[Dict[str, str]] = None):
-        try:
-            logging.info(f"Sending request to model {self.model} with messages: {messages}")
-
-            # Initialize response tracking variables
-            words = ""
-            tokens_out = 0
-            tokens_prefill = 0
-            start_time = time.time()
-            first_token_time = None
-
-            # Convert chat messages to a single prompt string
-            prompt = ""
-            for msg in messages:
-                role = msg["role"]
-                content = msg["content"]
-                if role == "system":
-                    prompt += f"System: {content}\n"
-                elif role == "user":
-                    prompt += f"User: {content}\n"
-                elif role == "assistant":
-                    prompt += f"Assistant: {content}\n"
-            prompt += "Assistant: "
-
-            # Make the request
-            response = await self.client.completions.create(
-                prompt=prompt,
-                model=self.model,
-                stream=True,
-                max_tokens=max_tokens,
-                temperature=0.0,
-                stream_options={"include_usage": True},
-                extra_headers=extra_headers,
-            )
-
-            # Process the streaming response
-            async for chunk in response:
-                if not chunk.choices:
-                    continue
-
-                # Handle content
-                if chunk.choices[0].text is not None:
-                    if first_token_time is None and chunk.choices[0].text != "":
-                        first_token_time = time.time()
-                    words += chunk.choices[0].text
-
-            # Handle token counts if available
-            if hasattr(chunk, 'usage') and chunk.usage is not None:
-                tokens_out = chunk.usage.completion_tokens
-                tokens_prefill = chunk.usage.prompt_tokens
-
-            end_time = time.time()
-            ttft = first_token_time - start_time if first_token_time else 0
-            generation_time = end_time - (first_token_time or start_time)
-
-            return Response(
-                body=words,
-                ttft=ttft,
-                generation_time=generation_time,
-                prompt_tokens=tokens_prefill,
-                generation_tokens=tokens_out,
-                launch_time=start_time,
-                finish_time=end_time,
-            )
-
-        except Exception as e:
-            logger.error(f"Error in request: {e}")
-            return Response(
-                body="",
-                ttft=0,
-                generation_time=0,
-                prompt_tokens=0,
-                generation_tokens=0,
-                launch_time=time.time(),
-                finish_time=time.time(),
-            )
-
-    def launch_request(
-        self,
-        chat_history: ChatHistory,
-        max_tokens: int,
-        finish_callback,
-        extra_headers=None,
-    ):
-        """
-        finish_callback: Callable[[Response], None]
-        """
-        messages = chat_history.get_messages_for_openai()
-        real_callback = lambda x: finish_callback(x.result())
-        future = asyncio.run_coroutine_threadsafe(
-            self._async_launch_request(messages, max_tokens, extra_headers), self.loop
-        )
-        future.add_done_callback(real_callback)
+class RandomTextCorpus:
+    """
+    Random texts of lowercase words for every (user, question) of the run,
+    generated with numpy before the run starts so that launching a request
+    only looks up a ready string. Each text is seeded by the run's seed and
+    its user and question ids alone, so a run is reproducible however its
+    requests interleave.
+    """
+
+    def __init__(self, num_words: int, seed: int, user_ids: range, num_rounds: int):
+        self.num_words = num_words
+        self.seed = seed
+        start = time.time()
+        self._texts = {
+            (user_id, question_id): self._generate(user_id, question_id)
+            for user_id in user_ids
+            for question_id in range(1, num_rounds + 1)
+        }
+        logger.info(f"Generated {len(self._texts)} random prompts in {time.time() - start:.2f}s")
+
+    def _generate(self, user_id: int, question_id: int) -> str:
+        """Generate random text with exactly num_words words of 3 to 12 letters."""
+        if self.num_words <= 0:
+            return ""
+        rng = np.random.default_rng([self.seed, user_id, question_id])
+        word_lengths = rng.integers(3, 13, size=self.num_words)
+        # Every word is followed by a space, the last one is cut off
+        word_ends = np.cumsum(word_lengths + 1) - 1
+        text = rng.integers(ord("a"), ord("z") + 1, size=word_ends[-1] + 1, dtype=np.uint8)
+        text[word_ends] = ord(" ")
+        return text[:-1].tobytes().decode("ascii")
+
+    def get(self, user_id: int, question_id: int) -> str:
+        # Each text is sent once, drop it so memory shrinks as the run goes on
+        text = self._texts.pop((user_id, question_id), None)
+        if text is None:
+            # Not part of the planned run, still the same text for the same ids
+            text = self._generate(user_id, question_id)
+        return text
 
 
 class UserSession:
 
-    def __init__(self, user_config: UserConfig):
+    def __init__(self, user_config: UserConfig, corpus: RandomTextCorpus, results: ResultWriter):
         self.user_config = user_config
+        self.corpus = corpus
+        self.results = results
         self.last_request_time = None
-        self.chat_history = ChatHistory()
+        self.chat_history = RandomChatHistory()
         self.question_id = 0
 
         self.has_unfinished_request = False
         self.last_unfinished_log = 0
 
-        self.prompt_lengths = []
-        self.generation_lengths = []
-        self.ttfts = []
-        self.generation_times = []
-        self.launch_times = []
-        self.finish_times = []
+        # Successful requests, numbered from 1 in the question_id column
+        self.num_recorded = 0
 
         self.finished = False
 
-    def _update_result(self, response: Response):
-        self.prompt_lengths.append(response.prompt_tokens)
-        self.generation_lengths.append(response.generation_tokens)
-        self.ttfts.append(response.ttft)
-        self.generation_times.append(response.generation_time)
-        self.launch_times.append(response.launch_time)
-        self.finish_times.append(response.finish_time)
-
-    def _generate_random_text(self, target_words: int) -> str:
-        """Generate random text with approximately target_words words."""
-        words = []
-        for _ in range(target_words):
-            # Generate random words of varying lengths
-            word_length = random.randint(3, 12)
-            word = ''.join(random.choices(string.ascii_lowercase, k=word_length))
-            words.append(word)
-        return ' '.join(words)
+        # Set by the manager; called when a request finishes so that a
+        # session waiting on it is rescheduled without polling
+        self.on_ready = None
+        self.schedule_token = 0
 
     def _build_random_prompt(self):
         """Build a completely random prompt with no shared prefix."""
         self.question_id += 1
 
-        # Generate random content with exact prompt length
-        random_content = self._generate_random_text(self.user_config.prompt_len)
+        # Random content with exact prompt length, generated ahead of time
+        random_content = self.corpus.get(self.user_config.user_id, self.question_id)
 
         # Create a unique prompt with no shared prefix
         prompt = f"Question {self.question_id} for user {self.user_config.user_id}: {random_content}. Please provide a detailed response."
@@ -276,7 +178,7 @@ class UserSession:
         )
 
         max_tokens = self.user_config.answer_len
-        request_executor.launch_request(
+        request_executor.launch_history(
             self.chat_history,
             max_tokens,
             self._on_request_finished,
@@ -293,7 +195,11 @@ class UserSession:
             f"Prompt tokens: {response.prompt_tokens}, "
             f"generation tokens: {response.generation_tokens}"
         )
-        self._update_result(response)
+        if response.error is None:
+            self.num_recorded += 1
+            self.results.record(response, self.user_config.user_id, self.num_recorded)
+        if self.on_ready is not None:
+            self.on_ready(self)
 
     def set_internal_state(self, offset: float, timestamp: float):
         """Tell the session is the 'offset' seconds after the start"""
@@ -313,6 +219,15 @@ class UserSession:
             f"last_request_time: {self.last_request_time}"
         )
 
+    def next_step_time(self) -> float:
+        """Wall-clock time at which step() has work to do (0 means now)"""
+        if (
+            self.last_request_time is None
+            or self.question_id >= self.user_config.num_rounds
+        ):
+            return 0
+        return self.last_request_time + self.user_config.gap_between_requests
+
     def step(self, timestamp: float, request_executor: RequestExecutor):
         if (
             self.question_id >= self.user_config.num_rounds
@@ -325,7 +240,7 @@ class UserSession:
             self._launch_new_request(timestamp, request_executor)
             return
 
-        if timestamp - self.last_request_time > self.user_config.gap_between_requests:
+        if timestamp >= self.next_step_time():
             if self.has_unfinished_request:
                 if timestamp - self.last_unfinished_log > 10:
                     logger.warning(
@@ -338,23 +253,14 @@ class UserSession:
             self._launch_new_request(timestamp, request_executor)
             return
 
-    def summary(self) -> pd.DataFrame:
-        df = pd.DataFrame()
-        df["prompt_tokens"] = self.prompt_lengths
-        df["generation_tokens"] = self.generation_lengths
-        df["ttft"] = self.ttfts
-        df["generation_time"] = self.generation_times
-        df["user_id"] = self.user_config.user_id
-        df["question_id"] = range(1, len(self.prompt_lengths) + 1)
-        df["launch_time"] = self.launch_times
-        df["finish_time"] = self.finish_times
-        return df
-
 
 class UserSessionManager:
 
-    def __init__(self, workload_config: WorkloadConfig, init_user_id=0):
+    def __init__(self, workload_config: WorkloadConfig, corpus: RandomTextCorpus, results: ResultWriter,
+                 init_user_id=0):
         self.workload_config = workload_config
+        self.corpus = corpus
+        self.results = results
         self.sessions = []
 
         gap_between_requests_per_user = workload_config.num_users / workload_config.qps
@@ -372,15 +278,20 @@ class UserSessionManager:
 
         self.user_id = init_user_id
         self.last_user_join = 0
-        self.session_summaries = []
         self.start_time = None
 
         self.need_ramp_up = True
 
+        self.executor = None
+        self.scheduler = None
+        self.log_interval = None
+
     def _create_user_session(self):
         user_config = UserConfig.new_user_config(self.user_id, self.workload_config)
         self.user_id += 1
-        return UserSession(user_config)
+        user_session = UserSession(user_config, self.corpus, self.results)
+        user_session.on_ready = self._on_session_ready
+        return user_session
 
     def _ramp_up(self, timestamp: float, ramp_up_time: float):
         for i in range(self.workload_config.num_users):
@@ -392,31 +303,72 @@ class UserSessionManager:
             self.sessions.append(new_session)
         self.need_ramp_up = False
 
-    def step(self, timestamp: float, request_executor: RequestExecutor):
-        if self.start_time is None:
-            self.start_time = timestamp
+    def start(
+        self,
+        timestamp: float,
+        executor: RequestExecutor,
+        scheduler: SessionScheduler,
+        log_interval: Optional[float] = None,
+    ):
+        """
+        Hand the sessions over to the event-driven scheduler. From here on
+        all session state is driven from the scheduler's event loop.
+        """
+        self.executor = executor
+        self.scheduler = scheduler
+        self.log_interval = log_interval
+        scheduler.call_at_threadsafe(timestamp, self._on_start)
+        scheduler.start()
+
+    def _on_start(self, timestamp: float):
+        self.start_time = timestamp
+        self.results.metrics.start(timestamp)
+        self._ramp_up(timestamp, self.ramp_up_time)
+        for session in self.sessions:
+            self._schedule_session(session, session.next_step_time())
+        if self.log_interval is not None:
+            self.scheduler.call_at(timestamp + self.log_interval, self._log_summary)
+
+    def _schedule_session(self, session: UserSession, due_time: float):
+        # Bumping the token lazily invalidates any older heap entry
+        session.schedule_token += 1
+        token = session.schedule_token
+        self.scheduler.call_at(
+            due_time, lambda ts: self._step_session(session, token, ts)
+        )
 
-        if self.need_ramp_up:
-            self._ramp_up(timestamp, self.ramp_up_time)
+    def _step_session(self, session: UserSession, token: int, timestamp: float):
+        if token != session.schedule_token:
+            return
 
-        for session in self.sessions:
-            session.step(timestamp, request_executor)
+        session.step(timestamp, self.executor)
 
         # Remove finished sessions
-        finished_sessions = [s for s in self.sessions if s.finished]
-        for session in finished_sessions:
-            self.session_summaries.append(session.summary())
+        if session.finished:
             self.sessions.remove(session)
+            return
 
-    def summary(self, start_time: float, end_time: float) -> pd.DataFrame:
-        all_summaries = self.session_summaries.copy()
-        for session in self.sessions:
-            all_summaries.append(session.summary())
+        if session.has_unfinished_request and timestamp >= session.next_step_time():
+            # Parked until the request finishes and _on_session_ready fires
+            return
+
+        self._schedule_session(session, session.next_step_time())
+
+    def _on_session_ready(self, session: UserSession):
+        if not session.finished:
+            self._schedule_session(session, session.next_step_time())
 
-        if not all_summaries:
-            return pd.DataFrame()
+    def _log_summary(self, timestamp: float):
+        self.scheduler.call_at(timestamp + self.log_interval, self._log_summary)
+        # Request times are wall-clock times, the timestamp may be warped by the arrival process
+        window = self.results.metrics.roll(time.time())
+        self.results.flush()
+        pending_queries = len([s for s in self.sessions if s.has_unfinished_request])
+        print_window_summary(window, pending_queries, self.workload_config.qps)
 
-        combined_df = pd.concat(all_summaries, ignore_index=True)
+    def summary(self, combined_df: pd.DataFrame, start_time: float, end_time: float) -> pd.DataFrame:
+        if len(combined_df) == 0:
+            return combined_df
 
         # Filter by time range
         combined_df = combined_df[
@@ -496,16 +448,26 @@ def parse_arguments():
         default=30,
         help="The time between two summary loggings in seconds",
     )
+    parser.add_argument(
+        "--seed",
+        type=int,
+        default=0,
+        help="Seed of the random prompts, for reproducible runs (default: 0)",
+    )
 
+    add_arrival_arguments(parser)
+    add_client_arguments(parser)
     return parser.parse_args()
 
 
 def main():
     args = parse_arguments()
-    step_interval = 0.1
+    arrival = ArrivalProcess.from_spec(args.arrival, args.qps)
+    logger.info(f"Arrival process: {arrival}")
 
-    executor = RequestExecutor(
-        base_url=args.base_url, model=args.model
+    executor = create_executor(
+        args.client, base_url=args.base_url, model=args.model, api_key="dummy-key",
+        tokenizer=args.tokenizer, max_in_flight=args.max_in_flight, max_pending=args.max_pending,
     )
 
     workload_config = WorkloadConfig(
@@ -518,34 +480,34 @@ def main():
         enable_user_id=args.request_with_user_id,
     )
 
+    # Every prompt of the run is generated before it starts, so sends never wait for generation
+    corpus = RandomTextCorpus(
+        args.prompt_len, args.seed,
+        user_ids=range(args.init_user_id, args.init_user_id + args.num_users),
+        num_rounds=args.num_rounds,
+    )
+    # Rows are appended to the output file while the run goes on
+    results = ResultWriter(args.output)
     manager = UserSessionManager(
-        workload_config, init_user_id=args.init_user_id
+        workload_config, corpus, results, init_user_id=args.init_user_id
     )
 
-    num_steps = 0
     start_time = time.time()
-    last_summary_time = start_time
+    arrival.start(start_time)
+    scheduler = SessionScheduler(AsyncLoopWrapper.GetOrStartLoop(), arrival)
+    manager.start(start_time, executor, scheduler, args.log_interval)
     try:
-        while True:
-            num_steps += 1
-            manager.step(time.time(), executor)
-            time.sleep(step_interval)
-
-            if time.time() - last_summary_time > args.log_interval:
-                manager.summary(last_summary_time, time.time())
-                last_summary_time = time.time()
-
-            if args.time is not None and time.time() - start_time > args.time:
-                break
-
+        # Sessions run on the scheduler's loop, just wait for the time limit
+        threading.Event().wait(timeout=args.time)
     except KeyboardInterrupt:
         logger.info("Interrupted, waiting for the final result")
 
+    scheduler.stop()
+    executor.close()
     AsyncLoopWrapper.StopLoop()
 
-    logger.info(f"Finished benchmarking, dumping summary to {args.output}")
-    summary = manager.summary(0, time.time())
-    summary.to_csv(args.output, index=False)
+    logger.info(f"Finished benchmarking, summary written to {args.output}")
+    manager.summary(results.close(), 0, time.time())
 
 
 if __name__ == "__main__":
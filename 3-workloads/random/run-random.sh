@@ -5,9 +5,9 @@ SCRIPT_DIR="$( cd "$( dirname "${BASH_SOURCE[0]}" )" && pwd )"
 PROJECT_ROOT="$( cd "$SCRIPT_DIR/../.." && pwd )"
 cd "$SCRIPT_DIR"
 
-if [[ $# -lt 11 ]]; then
-    echo "Usage: $0 <model> <base url> <save file key> <num_users> <num_rounds> <prompt_len> <answer_len> <name> <serving_index> <spec_file_path> <lmbench_session_id> [qps_values...]"
-    echo "Example: $0 meta-llama/Llama-3.1-8B-Instruct http://localhost:8000 test 50 5 100 50 random-benchmark 0 0-bench-specs/random-spec.yaml session123 1.0"
+if [[ $# -lt 12 ]]; then
+    echo "Usage: $0 <model> <base url> <save file key> <num_users> <num_rounds> <prompt_len> <answer_len> <name> <serving_index> <spec_file_path> <lmbench_session_id> <arrival> [qps_values...]"
+    echo "Example: $0 meta-llama/Llama-3.1-8B-Instruct http://localhost:8000 test 50 5 100 50 random-benchmark 0 0-bench-specs/random-spec.yaml session123 None 1.0"
     exit 1
 fi
 
@@ -24,10 +24,11 @@ NAME=$8
 SERVING_INDEX=$9
 SPEC_FILE_PATH=${10}
 LMBENCH_SESSION_ID=${11}
+ARRIVAL=${12}  # Arrival process spec as JSON ("None" for evenly spaced requests)
 
 # If QPS values are provided, use them; otherwise use default
-if [ $# -gt 11 ]; then
-    QPS_VALUES=("${@:12}")
+if [ $# -gt 12 ]; then
+    QPS_VALUES=("${@:13}")
 else
     QPS_VALUES=(1.0)  # Default QPS value
 fi
@@ -80,6 +81,11 @@ run_benchmark() {
     local qps=$1
     local output_file="../../4-latest-results/${KEY}_random_output_${qps}.csv"
 
+    local arrival_args=()
+    if [[ -n "$ARRIVAL" && "$ARRIVAL" != "None" ]]; then
+        arrival_args=(--arrival "$ARRIVAL")
+    fi
+
     echo "Running random benchmark with QPS=$qps..."
     python3 "${SCRIPT_DIR}/random-qa.py" \
         --num-users "$NUM_USERS" \
@@ -92,7 +98,8 @@ run_benchmark() {
         --init-user-id "$INIT_USER_ID" \
         --output "$output_file" \
         --time 100 \
-        --request-with-user-id
+        --request-with-user-id \
+        "${arrival_args[@]}"
 
     sleep 10
 
@@ -120,6 +127,7 @@ for qps in "${QPS_VALUES[@]}"; do
         PROMPT_LEN="$PROMPT_LEN" \
         ANSWER_LEN="$ANSWER_LEN" \
         QPS="$qps" \
+        ARRIVAL="$ARRIVAL" \
         SERVING_INDEX="$SERVING_INDEX" \
         SPEC_FILE_PATH="$SPEC_FILE_PATH" \
         LMBENCH_SESSION_ID="$LMBENCH_SESSION_ID" \
@@ -9,17 +9,19 @@ HTTP endpoint at a fixed QPS, records latency metrics, and writes a CSV report
 """
 
 import argparse
-import asyncio
 import json
 import logging
+import sys
 import time
-from dataclasses import dataclass
+from pathlib import Path
 from typing import List, Optional
 import random
-import openai
 import pandas as pd
 
-from utils import AsyncLoopWrapper, init_logger
+# The shared lmbench client package lives in 3-workloads/
+sys.path.insert(0, str(Path(__file__).resolve().parents[2]))
+from lmbench import (AsyncLoopWrapper, ChatHistory, RequestExecutor, RequestMetrics, Response,
+                     add_client_arguments, create_executor, init_logger)
 
 logger = init_logger(__name__, logging.INFO)
 
@@ -50,99 +52,33 @@ def parse_args() -> argparse.Namespace:
                         help="Enable DEBUG logging")
     parser.add_argument("--request-with-user-id", action="store_true", default=True,
                         help="Whether to include user id in request headers")
+    add_client_arguments(parser)
     return parser.parse_args()
 
 # ---------------------------------------------------------------------------
-# Low‑level request handling
+# Benchmark runner
 # ---------------------------------------------------------------------------
 
-@dataclass
-class Response:
-    body: str
-    ttft: float
-    generation_time: float
-    prompt_tokens: int
-    generation_tokens: int
-    launch_time: float
-    finish_time: float
-
-
-class RequestExecutor:
-    """Wrapper over OpenAI completions API (not chat) that measures latency.
-    It now accepts a list of messages so that callers can maintain proper
-    conversation history. Messages are converted to a single prompt string
-    before the request, preserving previous behaviour while enabling the
-    chat-history abstraction requested by the user.
+class ShareGPTHistory(ChatHistory):
+    """
+    ShareGPT conversation: a static system prompt followed by the replayed user
+    messages, trimmed to keep the prompt within model context.
     """
 
-    def __init__(self, base_url: str, api_key: str, model: str):
-        # Ensure base_url ends with /v1 for vLLM
-        if not base_url.endswith('/v1'):
-            base_url = base_url.rstrip('/') + '/v1'
-        self.client = openai.AsyncOpenAI(api_key=api_key, base_url=base_url)
-        self.model = model
-        self.loop = AsyncLoopWrapper.GetOrStartLoop()
-
-    async def _async_request(self, messages: list[dict], max_tokens: int, extra_headers=None) -> Response:
-        start = time.time()
-        first_token: Optional[float] = None
-        body = ""
-
-        # Convert chat messages to a single prompt string
-        prompt = ""
-        for msg in messages:
-            role = msg["role"]
-            content = msg["content"]
-            if role == "system":
-                prompt += f"System: {content}\n"
-            elif role == "user":
-                prompt += f"User: {content}\n"
-            elif role == "assistant":
-                prompt += f"Assistant: {content}\n"
-        prompt += "Assistant: "
-
-        try:
-            stream = await self.client.completions.create(
-                prompt=prompt,
-                model=self.model,
-                temperature=0,
-                stream=True,
-                max_tokens=max_tokens,
-                stream_options={"include_usage": True},
-                extra_headers=extra_headers,
-            )
-
-            async for chunk in stream:
-                if not chunk.choices:
-                    continue
-                delta = chunk.choices[0].text
-                if delta:
-                    if first_token is None:
-                        first_token = time.time()
-                    body += delta
-
-            usage = chunk.usage  # type: ignore[attr-defined]
-            return Response(
-                body=body,
-                ttft=(first_token or time.time()) - start,
-                generation_time=time.time() - (first_token or start),
-                prompt_tokens=usage.prompt_tokens,
-                generation_tokens=usage.completion_tokens,
-                launch_time=start,
-                finish_time=time.time(),
-            )
-        except Exception as e:
-            logger.error(f"Error in request: {str(e)}")
-            raise
-
-    def launch_request(self, messages: list[dict], max_tokens: int, on_finish, user_id=None) -> None:
-        fut = asyncio.run_coroutine_threadsafe(
-            self._async_request(messages, max_tokens, {"x-user-id": str(user_id)} if user_id is not None else None), self.loop)
-        fut.add_done_callback(lambda f: on_finish(f.result()))
+    # Messages kept after the system prompt
+    max_messages = 32
+
+    def __init__(self):
+        super().__init__()
+        self.append({"role": "system", "content": "You are a helpful assistant."})
+
+    def on_user_query(self, query: str):
+        self.append({"role": "user", "content": query})
+        if len(self.history) > self.max_messages + 1:
+            # Drop the oldest message after the system prompt, with its rendered segment
+            del self.history[1]
+            del self.segments[1]
 
-# ---------------------------------------------------------------------------
-# Benchmark runner
-# ---------------------------------------------------------------------------
 
 class BenchmarkRunner:
     """Dispatch prompts at desired QPS and collect latency metrics."""
@@ -152,19 +88,20 @@ class BenchmarkRunner:
         self.executor = executor
         self.qps = qps
         self.time_limit = time_limit
-        self.results: List[Response] = []
+        self.metrics = RequestMetrics()
         self._next_idx = 0
         self.start_time = time.time()
         self.request_with_user_id = request_with_user_id
 
     def _on_finish(self, resp: Response):
-        self.results.append(resp)
+        if resp.error is None:
+            self.metrics.record(resp)
 
     def run(self) -> pd.DataFrame:
         logger.info("Benchmark started: %d prompts at %.2f QPS", len(self.prompts), self.qps)
 
-        # conversation_id -> history list; each history item is {'role': str, 'content': str}
-        histories: dict[int, list[dict]] = {}
+        # conversation_id -> history of the conversation
+        histories: dict[int, ShareGPTHistory] = {}
 
         while self._next_idx < len(self.prompts):
             # Check time limit
@@ -183,52 +120,25 @@ class BenchmarkRunner:
 
             # Initialise history with a static system prompt once
             if conv_id not in histories:
-                histories[conv_id] = [
-                    {"role": "system", "content": "You are a helpful assistant."}
-                ]
-
-            # Append new user message
-            histories[conv_id].append({"role": "user", "content": entry["input"]})
-
-            # Trim history to keep the prompt within model context –
-            # keep the system message plus the most recent 32 messages
-            if len(histories[conv_id]) > 33:
-                sys_msg = histories[conv_id][0]
-                histories[conv_id] = [sys_msg] + histories[conv_id][-32:]
-
-            # Build prompt string from full history
-            prompt_parts = []
-            for msg in histories[conv_id]:
-                role = msg["role"]
-                content = msg["content"]
-                if role == "system":
-                    prompt_parts.append(f"System: {content}\n")
-                elif role == "user":
-                    prompt_parts.append(f"User: {content}\n")
-                else:  # assistant
-                    prompt_parts.append(f"Assistant: {content}\n")
-            prompt_parts.append("Assistant: ")
-            prompt = "".join(prompt_parts)
+                histories[conv_id] = ShareGPTHistory()
+
+            # Append new user message; the history keeps the system message
+            # plus the most recent 32 messages
+            histories[conv_id].on_user_query(entry["input"])
 
             max_tokens = min(256, entry.get("output_length", 128))
 
             user_id = conv_id if self.request_with_user_id else None
 
-            self.executor.launch_request(histories[conv_id].copy(), max_tokens, self._on_finish, user_id)
+            extra_headers = {"x-user-id": str(user_id)} if user_id is not None else None
+            self.executor.launch_history(histories[conv_id], max_tokens, self._on_finish, extra_headers)
 
             self._next_idx += 1
 
         AsyncLoopWrapper.WaitLoop()  # wait for inflight requests
         logger.info("All requests completed")
 
-        df = pd.DataFrame({
-            "prompt_tokens": [r.prompt_tokens for r in self.results],
-            "generation_tokens": [r.generation_tokens for r in self.results],
-            "ttft": [r.ttft for r in self.results],
-            "generation_time": [r.generation_time for r in self.results],
-            "launch_time": [r.launch_time for r in self.results],
-            "finish_time": [r.finish_time for r in self.results],
-        })
+        df = self.metrics.to_frame()
 
         # Ensure deterministic ordering for downstream scripts/visualisation
         return df.sort_values("launch_time").reset_index(drop=True)
@@ -261,7 +171,9 @@ def main():
         logger.info(f"Loaded {len(prompts)} ShareGPT entries")
 
         # Initialize executor
-        executor = RequestExecutor(args.base_url, "EMPTY", args.model)
+        executor = create_executor(args.client, args.base_url, args.model, api_key="EMPTY",
+                                   tokenizer=args.tokenizer, max_in_flight=args.max_in_flight,
+                                   max_pending=args.max_pending)
 
         # Run benchmark
         runner = BenchmarkRunner(prompts, executor, args.qps, args.time, args.request_with_user_id)
@@ -279,6 +191,7 @@ def main():
 
         # Log summary
         log_summary(df)
+        executor.close()
     finally:
         # Always stop the asyncio loop
         AsyncLoopWrapper.StopLoop()
@@ -1,17 +1,23 @@
 # strict-multi-round-qa.py is a variation of multi-round-qa.py that adheres strictly to time between requests per user
 # Expectation: as QPS increases, TTFT will increase super-linearly
 import argparse
-import asyncio
+import bisect
 import random
+import sys
+import threading
 import time
 import logging
 from dataclasses import dataclass
-from typing import Optional, List, Dict, Any, cast
+from pathlib import Path
+from typing import Dict, List
 
-import openai
 import pandas as pd
 
-from utils import AsyncLoopWrapper, init_logger
+# The shared lmbench client package lives in 3-workloads/
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+from lmbench import (AsyncLoopWrapper, ChatHistory, PromptGenerator, RequestExecutor, RequestMetrics,
+                     Response, SessionScheduler, add_client_arguments, create_executor, init_logger,
+                     render_message)
 
 logger = init_logger(__name__, logging.INFO)
 
@@ -52,8 +58,8 @@ class WorkloadConfig:
     # Model name
     model: str
 
-    # The ratio of the conversation history that is reused between requests 
-    # (1 - kv_reuse_ratio) is completely randomized
+    # The fraction of the conversation history's tokens that each request shares as a prefix
+    # with the user's previous request; the rest is scrambled with random tokens
     kv_reuse_ratio: float
 
 #  Strict Multi-Round QA Visualization
@@ -123,8 +129,8 @@ class UserConfig:
     # Whether to include user id in request header
     enable_user_id: bool
 
-    # The ratio of the conversation history that is reused between requests 
-    # (1 - kv_reuse_ratio) is completely randomized
+    # The fraction of the conversation history's tokens that each request shares as a prefix
+    # with the user's previous request; the rest is scrambled with random tokens
     kv_reuse_ratio: float
 
     @staticmethod
@@ -143,269 +149,123 @@ class UserConfig:
             kv_reuse_ratio=workload_config.kv_reuse_ratio,
         )
 
-class ChatHistory:
-    def __init__(self):
-        self.history = []
-    
+class StrictChatHistory(ChatHistory):
+    """
+    Synthetic conversation whose answers are generated locally rather than by the model.
+
+    With kv_reuse_ratio < 1 the history is kept as it was sent: before each
+    request (start_request) the first message token at or after
+    kv_reuse_ratio of the history's content tokens is rewritten with random
+    tokens from the user's seed, so exactly that prefix is shared with the
+    previous request. Messages after it keep the text they were sent with,
+    the prefix cache cannot match past the first differing token anyway, so
+    each request only encodes its new messages and rewrites one message.
+    """
+
+    def __init__(self, prompt_generator: PromptGenerator, kv_reuse_ratio: float = 1.0, seed: int = 0):
+        super().__init__()
+        self.prompt_generator = prompt_generator
+        self.kv_reuse_ratio = kv_reuse_ratio
+        self.rng = random.Random(seed)
+        # Content tokens of every message as sent, and the token offset where each message starts
+        self.tokens: List[list] = []
+        self.offsets: List[int] = [0]
+        # Content tokens of the history sent with the previous request
+        self.num_sent_tokens = 0
+
+    def append(self, message: Dict[str, str]):
+        super().append(message)
+        tokens = self.prompt_generator.encode(message["content"])
+        self.tokens.append(tokens)
+        self.offsets.append(self.offsets[-1] + len(tokens))
+
+    def clear(self):
+        super().clear()
+        self.tokens = []
+        self.offsets = [0]
+        self.num_sent_tokens = 0
+
     def on_query(self, query: str):
         if len(self.history) == 0 or len(self.history) == 1:
-            self.history.append({"role": "user", "content": query})
+            self.append({"role": "user", "content": query})
         else:
             assert self.history[-1]["role"] == "assistant", "Expect system response"
-            self.history.append({"role": "user", "content": query})
+            self.append({"role": "user", "content": query})
 
     # in strict-multi-round-qa, the response should be synthetically generated and
     # on_response() should be called before on_query() after the first query
     def on_response(self, response: str):
         assert len(self.history) > 0, "Expect user query"
         assert self.history[-1]["role"] == "user", "Expect user query"
-        self.history.append({"role": "assistant", "content": response})
-
-    def get_messages_for_openai(self, kv_reuse_ratio: float):
-        # we use str length and ratios as an approximation for token length
-        if kv_reuse_ratio == 1.0:
-            return self.history
-        
-        total_length = sum(len(message["content"]) for message in self.history)
-
-        rng = random.Random(42)
-        # a shallow copy of the dictionaries in the list
-        postfix_scrambled_history = self.history.copy()
-        # randomize a postfix based on the kv_reuse_ratio
-        randomization_budget = int(total_length * (1 - kv_reuse_ratio))
-        for i in range(len(self.history) - 1, -1, -1):
-            message = self.history[i]
-            message_len = len(message["content"])
-            randomize = min(randomization_budget, message_len)
-            randomization_budget -= randomize
-            # do the randomization here
-            content_prefix, content_suffix = message["content"][:message_len - randomize], list(message["content"][message_len - randomize:])
-            rng.shuffle(content_suffix)
-            postfix_scrambled_history[i] = {"role": message["role"], "content": content_prefix + "".join(content_suffix)}
-            if i == len(self.history) - 1:
-                postfix_scrambled_history[i]["content"] += "write a very long story please."
-            if randomization_budget == 0:
-                break
-        return postfix_scrambled_history
-
-    def __len__(self):
-        return len(self.history)
+        self.append({"role": "assistant", "content": response})
 
+    def num_tokens(self) -> int:
+        return self.offsets[-1]
 
-@dataclass
-class Response:
-    body: str
-    ttft: float
-    generation_time: float
-    prompt_tokens: int
-    generation_tokens: int
-    launch_time: float
-    finish_time: float
-
-
-class RequestExecutor:
-    def __init__(self, base_url: str, model: str, api_type: str = "completions"):
-        # For vLLM server, we don't need an API key, but the client requires one
-        # Ensure base_url ends with /v1 for vLLM
-        if not base_url.endswith('/v1'):
-            base_url = base_url.rstrip('/') + '/v1'
-        self.client = openai.AsyncOpenAI(
-            api_key="vllm_xxxxxxxxxxxxx",  # Dummy API key for vLLM server
-            base_url=base_url
-        )
-        self.model = model
-        self.api_type = api_type  # "completions" or "chat"
-        logging.info(f"Initialized OpenAI client with base_url={base_url}, model={model}, api_type={api_type}")
-        self.loop = AsyncLoopWrapper.GetOrStartLoop()
-        self.request_history = []
-
-    async def _async_launch_request(self, messages: List[Dict[str, str]], max_tokens: int,
-                                    extra_headers: Optional[Dict[str, str]] = None):
-        try:
-            logging.info(f"Sending request to model {self.model} with messages: {messages}")
-            # Initialize response tracking variables
-            words = ""
-            tokens_out = 0
-            tokens_prefill = 0
-            start_time = time.time()
-            first_token_time = None
-
-            if self.api_type == "chat":
-                # Use chat completions API directly with messages
-                # Cast to proper message format for OpenAI client
-                chat_messages = cast(List[Any], messages)
-                response = await self.client.chat.completions.create(
-                    model=self.model,
-                    messages=chat_messages,
-                    stream=True,
-                    max_tokens=max_tokens,
-                    temperature=0.0,
-                    stream_options={"include_usage": True},
-                    extra_headers=extra_headers,
-                )
-
-                # Process the streaming response for chat completions
-                last_chunk = None
-                async for chunk in response:
-                    last_chunk = chunk
-                    if not chunk.choices:
-                        continue
-
-                    # Handle content for chat completions
-                    if chunk.choices[0].delta and chunk.choices[0].delta.content is not None:
-                        if first_token_time is None and chunk.choices[0].delta.content != "":
-                            first_token_time = time.time()
-                        words += chunk.choices[0].delta.content
-
-                # Handle token counts if available
-                if last_chunk and hasattr(last_chunk, 'usage') and last_chunk.usage is not None:
-                    tokens_out = last_chunk.usage.completion_tokens
-                    tokens_prefill = last_chunk.usage.prompt_tokens
-
-                # If we didn't get token counts from streaming, try to get them from the final response
-                if tokens_out == 0 or tokens_prefill == 0:
-                    print("No token counts from streaming, getting final response")
-                    print(f"{tokens_out}, {tokens_prefill}")
-                    try:
-                        final_response = await self.client.chat.completions.create(
-                            model=self.model,
-                            messages=chat_messages,
-                            stream=False,
-                        )
-                        if hasattr(final_response, 'usage') and final_response.usage is not None:
-                            tokens_out = final_response.usage.completion_tokens
-                            tokens_prefill = final_response.usage.prompt_tokens
-                    except Exception as e:
-                        logging.warning(f"Failed to get token counts from final response: {e}")
-
-            else:  # self.api_type == "completions"
-                # Convert chat messages to a single prompt string
-                prompt = ""
-                for msg in messages:
-                    role = msg["role"]
-                    content = msg["content"]
-                    if role == "system":
-                        prompt += f"System: {content}\n"
-                    elif role == "user":
-                        prompt += f"User: {content}\n"
-                    elif role == "assistant":
-                        prompt += f"Assistant: {content}\n"
-                prompt += "Assistant: "
-
-                # Make the request using completions API
-                response = await self.client.completions.create(
-                    prompt=prompt,
-                    model=self.model,
-                    stream=True,
-                    max_tokens=max_tokens,
-                    temperature=0.0,
-                    stream_options={"include_usage": True},
-                    extra_headers=extra_headers,
-                )
-
-                # Process the streaming response for completions
-                last_chunk = None
-                async for chunk in response:
-                    last_chunk = chunk
-                    if not chunk.choices:
-                        continue
-
-                    # Handle content for completions
-                    if chunk.choices[0].text is not None:
-                        if first_token_time is None and chunk.choices[0].text != "":
-                            first_token_time = time.time()
-                        words += chunk.choices[0].text
-
-                # Handle token counts if available
-                if last_chunk and hasattr(last_chunk, 'usage') and last_chunk.usage is not None:
-                    tokens_out = last_chunk.usage.completion_tokens
-                    tokens_prefill = last_chunk.usage.prompt_tokens
-
-                # If we didn't get token counts from streaming, try to get them from the final response
-                if tokens_out == 0 or tokens_prefill == 0:
-                    print("No token counts from streaming, getting final response")
-                    print(f"{tokens_out}, {tokens_prefill}")
-                    try:
-                        final_response = await self.client.completions.create(
-                            prompt=prompt,
-                            model=self.model,
-                            stream=False,
-                        )
-                        if hasattr(final_response, 'usage') and final_response.usage is not None:
-                            tokens_out = final_response.usage.completion_tokens
-                            tokens_prefill = final_response.usage.prompt_tokens
-                    except Exception as e:
-                        logging.warning(f"Failed to get token counts from final response: {e}")
-
-            # Calculate timing metrics
-            ttft = first_token_time - start_time if first_token_time else 0
-            generation_time = time.time() - first_token_time if first_token_time else 0
-
-            return Response(
-                body=words,
-                ttft=ttft,
-                generation_time=generation_time,
-                prompt_tokens=tokens_prefill,
-                generation_tokens=tokens_out,
-                launch_time=start_time,
-                finish_time=time.time(),
-            )
-        
-        except Exception as e:
-            logging.error(f"Error in _async_launch_request: {str(e)}")
-            logging.error(f"Request details - model: {self.model}, messages: {messages}")
-            raise
-
-    def launch_request(
-        self,
-        chat_history: ChatHistory,
-        max_tokens: int,
-        finish_callback,
-        kv_reuse_ratio: float,
-        extra_headers=None,
-    ):
+    def start_request(self) -> int:
         """
-        finish_callback: Callable[[Response], None]
+        Scramble the history for the next request and return the number of
+        content tokens it shares as a prefix with the previous request.
         """
-        messages = chat_history.get_messages_for_openai(kv_reuse_ratio)
-        real_callback = lambda x: finish_callback(x.result())
-        future = asyncio.run_coroutine_threadsafe(
-            self._async_launch_request(messages, max_tokens, extra_headers), self.loop
+        previous = self.num_sent_tokens
+        self.num_sent_tokens = self.num_tokens()
+        reused = int(self.num_tokens() * self.kv_reuse_ratio)
+        if reused >= previous:
+            # Everything sent before is reused, the new messages are new to the engine anyway
+            return previous
+
+        # Message holding the first token past the reused prefix, always one sent before
+        index = bisect.bisect_right(self.offsets, reused) - 1
+        position = reused - self.offsets[index]
+        tokens = self.tokens[index]
+        tokens = tokens[:position] + self.prompt_generator.random_tokens(
+            self.rng, len(tokens) - position, avoid=tokens[position]
         )
-        future.add_done_callback(real_callback)
+        # Replace rather than mutate, requests in flight hold the old message
+        message = {"role": self.history[index]["role"], "content": self.prompt_generator.decode(tokens)}
+        self.history[index] = message
+        self.segments[index] = render_message(message)
+        self.tokens[index] = tokens
+        return reused
+
 
 class UserSession:
 
-    def __init__(self, user_config: UserConfig):
+    def __init__(self, user_config: UserConfig, prompt_generator: PromptGenerator):
         self.user_config = user_config
+        self.prompt_generator = prompt_generator
         self.record_stats = user_config.record_stats
         self.last_request_time = None
-        self.chat_history = ChatHistory()
+        # Each user scrambles its history with its own random tokens
+        self.chat_history = StrictChatHistory(prompt_generator, user_config.kv_reuse_ratio, seed=user_config.user_id)
         self.question_id = 0
         self.unfinished_requests = 0 # this can be a number greater than 1 because answers are synthetic ("strictness")
         self.last_unfinished_log = 0
 
-        self.prompt_lengths = []
-        self.generation_lengths = []
-        self.ttfts = []
-        self.generation_times = []
-        self.launch_times = []
-        self.finish_times = []
+        self.metrics = RequestMetrics()
+        # Content tokens shared as a prefix with the previous request of this user, and their fraction
+        self.kv_reuse_tokens = []
+        self.kv_reuse_fractions = []
 
         self.finished = False
+
+        # Set by the manager; called when a request finishes so that a
+        # session waiting on it is rescheduled without polling
+        self.on_ready = None
+        self.schedule_token = 0
     
     # the callback for the request executor
-    def _update_result(self, response: Response):
+    def _update_result(self, response: Response, kv_reuse_tokens: int, kv_reuse_fraction: float):
         self.unfinished_requests -= 1
-        self.prompt_lengths.append(response.prompt_tokens)
-        self.generation_lengths.append(response.generation_tokens)
-        self.ttfts.append(response.ttft)
-        self.generation_times.append(response.generation_time)
-        self.launch_times.append(response.launch_time)
-        self.finish_times.append(response.finish_time)
+        if response.error is None:
+            self.metrics.record(response)
+            self.kv_reuse_tokens.append(kv_reuse_tokens)
+            self.kv_reuse_fractions.append(kv_reuse_fraction)
+        if self.on_ready is not None:
+            self.on_ready(self)
     
     def _gen_dummy_text(self, length):
-        return " ".join(["hi"] * length)
+        return self.prompt_generator.text(length)
     
     def _synthetic_conversation_build(self):
         if len(self.chat_history) == 0:
@@ -428,16 +288,24 @@ class UserSession:
 
     def _launch_new_request(self, timestamp: float, request_executor: RequestExecutor):
         self._synthetic_conversation_build()
-        request_executor.launch_request(
+        kv_reuse_tokens = self.chat_history.start_request()
+        kv_reuse_fraction = kv_reuse_tokens / max(self.chat_history.num_tokens(), 1)
+        request_executor.launch_history(
             chat_history=self.chat_history,
             max_tokens=self.user_config.answer_len,
-            finish_callback=self._update_result,
-            kv_reuse_ratio=self.user_config.kv_reuse_ratio,
+            finish_callback=lambda response: self._update_result(response, kv_reuse_tokens, kv_reuse_fraction),
             extra_headers={"x-user-id": str(self.user_config.user_id)},
         )
         self.unfinished_requests += 1
         self.last_request_time = timestamp
 
+    def next_step_time(self) -> float:
+        """Wall-clock time at which step() has work to do (0 means now)"""
+        if self.last_request_time is None or \
+            self.question_id >= self.user_config.num_rounds_per_user:
+            return 0
+        return self.last_request_time + self.user_config.time_between_requests_per_user
+
     def step(self, timestamp: float, request_executor: RequestExecutor):
         if self.question_id >= self.user_config.num_rounds_per_user and \
             self.unfinished_requests == 0:
@@ -446,28 +314,24 @@ class UserSession:
         
         # In the strict multi-round-qa, we always send requests when the gap between requests is reached ("strictness")
         if self.question_id < self.user_config.num_rounds_per_user and \
-            (self.last_request_time is None or \
-            timestamp - self.last_request_time > self.user_config.time_between_requests_per_user):
+            timestamp >= self.next_step_time():
             self._launch_new_request(timestamp, request_executor)
 
     # the summary for this user that will be aggregated by the UserSessionManager for final statistics
     def summary(self) -> pd.DataFrame:
-        df = pd.DataFrame()
-        df["prompt_tokens"] = self.prompt_lengths
-        df["generation_tokens"] = self.generation_lengths
-        df["ttft"] = self.ttfts
-        df["generation_time"] = self.generation_times
-        df["user_id"] = self.user_config.user_id
-        df["question_id"] = range(1, len(self.prompt_lengths) + 1)
-        df["launch_time"] = self.launch_times
-        df["finish_time"] = self.finish_times
-        df["record_stats"] = self.record_stats  # Mark whether this user's stats should be included in benchmarks
-        return df
+        # record_stats marks whether this user's stats should be included in benchmarks
+        return self.metrics.to_frame(
+            user_id=self.user_config.user_id,
+            record_stats=self.record_stats,
+            kv_reuse_tokens=self.kv_reuse_tokens,
+            kv_reuse_fraction=self.kv_reuse_fractions,
+        )
 
 class UserSessionManager:
 
-    def __init__(self, workload_config: WorkloadConfig):
+    def __init__(self, workload_config: WorkloadConfig, prompt_generator: PromptGenerator):
         self.workload_config = workload_config
+        self.prompt_generator = prompt_generator
         self.sessions = []
 
         self.user_id = 0
@@ -478,10 +342,16 @@ class UserSessionManager:
         self.gap_between_users = workload_config.num_rounds_per_user * \
             workload_config.time_between_requests_per_user / workload_config.num_concurrent_users
 
+        self.executor = None
+        self.scheduler = None
+        self.join_scheduled = False
+        self.done = threading.Event()
+
     def _create_user_session(self):
         self.user_id += 1
         user_config = UserConfig.new_user_config(self.user_id, self.workload_config)
-        user_session = UserSession(user_config)
+        user_session = UserSession(user_config, self.prompt_generator)
+        user_session.on_ready = self._on_session_ready
         self.sessions.append(user_session)
         return user_session
     
@@ -499,32 +369,75 @@ class UserSessionManager:
                     self.session_summaries.append(session.summary())
         self.sessions = [s for s in self.sessions if not s.finished]
 
-    def step(self, timestamp: float, executor: RequestExecutor) -> bool:
+    def start(self, timestamp: float, executor: RequestExecutor, scheduler: SessionScheduler):
         """
-        Returns:
-            bool: True if the benchmark is not finished, False otherwise
+        Hand the sessions over to the event-driven scheduler. `done` is set
+        once every benchmarked user has finished.
         """
-        if self.start_time is None:
-            self.start_time = timestamp
+        self.executor = executor
+        self.scheduler = scheduler
+        scheduler.call_at_threadsafe(timestamp, self._on_start)
+        scheduler.start()
+
+    def _on_start(self, timestamp: float):
+        self.start_time = timestamp
+        self._schedule_user_join(timestamp)
+
+    def _schedule_session(self, session: UserSession, due_time: float):
+        # Bumping the token lazily invalidates any older heap entry
+        session.schedule_token += 1
+        token = session.schedule_token
+        self.scheduler.call_at(
+            due_time, lambda ts: self._step_session(session, token, ts)
+        )
 
-        if len(self.sessions) < self.workload_config.num_concurrent_users:
-            if timestamp - self.last_user_join > self.gap_between_users:
-                new_session = self._create_user_session()
-                if new_session is not None:
-                    self.last_user_join = timestamp
-                    logger.info(
-                        f"Joined a new user {self.user_id}, "
-                        f"now active users: {len(self.sessions)}"
-                    )
+    def _step_session(self, session: UserSession, token: int, timestamp: float):
+        if token != session.schedule_token:
+            return
+
+        session.step(timestamp, self.executor)
+
+        if session.finished:
+            self._remove_finished_sessions()
+            if len(self.session_summaries) >= self.workload_config.num_concurrent_users:
+                self.done.set()
+            self._schedule_user_join(timestamp)
+            return
 
-        for session in self.sessions:
-            session.step(timestamp, executor)
+        if session.unfinished_requests > 0 and timestamp >= session.next_step_time():
+            # All rounds are sent, parked until the last answers come back
+            return
+
+        self._schedule_session(session, session.next_step_time())
 
-        self._remove_finished_sessions()
+    def _on_session_ready(self, session: UserSession):
+        if not session.finished:
+            self._schedule_session(session, session.next_step_time())
 
-        if len(self.session_summaries) >= self.workload_config.num_concurrent_users:
-            return False
-        return True
+    def _schedule_user_join(self, timestamp: float):
+        if self.join_scheduled:
+            return
+        self.join_scheduled = True
+        self.scheduler.call_at(
+            max(timestamp, self.last_user_join + self.gap_between_users),
+            self._join_user,
+        )
+
+    def _join_user(self, timestamp: float):
+        self.join_scheduled = False
+        if len(self.sessions) >= self.workload_config.num_concurrent_users:
+            return
+
+        new_session = self._create_user_session()
+        self.last_user_join = timestamp
+        logger.info(
+            f"Joined a new user {self.user_id}, "
+            f"now active users: {len(self.sessions)}"
+        )
+        self._schedule_session(new_session, timestamp)
+
+        if len(self.sessions) < self.workload_config.num_concurrent_users:
+            self._schedule_user_join(timestamp)
 
     def summary(self) -> pd.DataFrame:
         # we will throw an error if the session summaries are empty (intended, as something went wrong)
@@ -621,17 +534,19 @@ def parse_arguments():
         "--kv-reuse-ratio",
         type=float,
         default=1.0,
-        help="The ratio of the conversation history that is reused between requests (default: 1.0 i.e. full reuse)",
+        help="Fraction of the conversation history's tokens sent as a prefix of the user's previous request, "
+        "the rest is scrambled with random tokens (default: 1.0 i.e. full reuse)",
     )
+    add_client_arguments(parser)
     args = parser.parse_args()
     return args
 
 def main():
     args = parse_arguments()
-    step_interval = 0.05 # arbitrarily small granularity of iteration of the busy loop
 
-    executor = RequestExecutor(
-        base_url=args.base_url, model=args.model, api_type=args.api_type
+    executor = create_executor(
+        args.client, base_url=args.base_url, model=args.model, api_type=args.api_type,
+        tokenizer=args.tokenizer, max_in_flight=args.max_in_flight, max_pending=args.max_pending,
     )
 
     workload_config = WorkloadConfig(
@@ -647,17 +562,17 @@ def main():
         kv_reuse_ratio=args.kv_reuse_ratio,
     )
 
-    manager = UserSessionManager(workload_config)
+    manager = UserSessionManager(workload_config, PromptGenerator(args.tokenizer or args.model))
 
+    scheduler = SessionScheduler(AsyncLoopWrapper.GetOrStartLoop())
+    manager.start(time.time(), executor, scheduler)
     try:
-        while True:
-            if not manager.step(time.time(), executor):
-                break
-            time.sleep(step_interval)
-
+        manager.done.wait()
     except KeyboardInterrupt:
         logger.info("Interrupted, stopping the benchmark")
 
+    scheduler.stop()
+    executor.close()
     AsyncLoopWrapper.StopLoop()
     summary = manager.summary()
     summary.to_csv(args.output, index=False)
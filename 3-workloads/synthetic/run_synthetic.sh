@@ -5,9 +5,9 @@ SCRIPT_DIR="$( cd "$( dirname "${BASH_SOURCE[0]}" )" && pwd )"
 PROJECT_ROOT="$( cd "$SCRIPT_DIR/../.." && pwd )"
 cd "$SCRIPT_DIR"
 
-if [[ $# -lt 15 ]]; then
-    echo "Usage: $0 <model> <base url> <save file key> <num_users_warmup> <num_users> <num_rounds> <system_prompt> <chat_history> <answer_len> <use_sharegpt> <name> <serving_index> <spec_file_path> <lmbench_session_id> <api_type> [qps_values...]"
-    echo "Example: $0 meta-llama/Llama-3.1-8B-Instruct http://localhost:8000 test 0 10 2 0 8000 20 false layerwise-benchmark 0 0-bench-specs/layerwise-spec.yaml lmbench-1234567890-abcd1234 completions 0.5"
+if [[ $# -lt 16 ]]; then
+    echo "Usage: $0 <model> <base url> <save file key> <num_users_warmup> <num_users> <num_rounds> <system_prompt> <chat_history> <answer_len> <use_sharegpt> <name> <serving_index> <spec_file_path> <lmbench_session_id> <api_type> <arrival> [qps_values...]"
+    echo "Example: $0 meta-llama/Llama-3.1-8B-Instruct http://localhost:8000 test 0 10 2 0 8000 20 false layerwise-benchmark 0 0-bench-specs/layerwise-spec.yaml lmbench-1234567890-abcd1234 completions None 0.5"
     exit 1
 fi
 
@@ -28,10 +28,11 @@ SERVING_INDEX=${12}
 SPEC_FILE_PATH=${13}
 LMBENCH_SESSION_ID=${14}
 API_TYPE=${15}
+ARRIVAL=${16}  # Arrival process spec as JSON ("None" for evenly spaced requests)
 
 # If QPS values are provided, use them; otherwise use default
-if [ $# -gt 15 ]; then
-    QPS_VALUES=("${@:16}")
+if [ $# -gt 16 ]; then
+    QPS_VALUES=("${@:17}")
 else
     QPS_VALUES=(0.7)  # Default QPS value
 fi
@@ -105,6 +106,11 @@ run_benchmark() {
     # warmup with current init ID
     warmup
 
+    local arrival_args=()
+    if [[ -n "$ARRIVAL" && "$ARRIVAL" != "None" ]]; then
+        arrival_args=(--arrival "$ARRIVAL")
+    fi
+
     # actual benchmark with same init ID
     echo "Running benchmark with QPS=$qps..."
     python3 "${SCRIPT_DIR}/multi-round-qa.py" \
@@ -120,7 +126,8 @@ run_benchmark() {
         --output "$output_file" \
         --time 200 \
         --request-with-user-id \
-        --api-type "$API_TYPE"
+        --api-type "$API_TYPE" \
+        "${arrival_args[@]}"
 
     sleep 10
 
@@ -152,6 +159,7 @@ for qps in "${QPS_VALUES[@]}"; do
         QPS="$qps" \
         USE_SHAREGPT="$USE_SHAREGPT" \
         API_TYPE="$API_TYPE" \
+        ARRIVAL="$ARRIVAL" \
         SERVING_INDEX="$SERVING_INDEX" \
         SPEC_FILE_PATH="$SPEC_FILE_PATH" \
         LMBENCH_SESSION_ID="$LMBENCH_SESSION_ID" \
@@ -0,0 +1,226 @@
+#!/usr/bin/env python3
+"""
+LMBench Trace Compiler
+
+Compiles a JSONL trace into a columnar binary directory that the trace replayer
+loads with mmap instead of parsing every line:
+
+    <trace>.lmtrace/
+        timestamps.npy      int64, sorted ascending
+        input_lengths.npy   int64
+        output_lengths.npy  int64
+        hash_offsets.npy    int64, len(timestamps) + 1 offsets into hash_ids.npy
+        hash_ids.npy        int64, every request's hash_ids concatenated
+        meta.json           source fingerprint and trace statistics
+
+Compilation is idempotent: a trace whose size and mtime match the fingerprint in
+meta.json is not recompiled.
+
+Usage: python compile_trace.py <trace_file.jsonl> [--output DIR] [--force]
+"""
+
+import argparse
+import json
+import os
+import shutil
+import sys
+import time
+from array import array
+from pathlib import Path
+from typing import Any, Dict, Optional, Tuple
+
+import numpy as np
+
+COMPILED_SUFFIX = ".lmtrace"
+FORMAT_VERSION = 1
+
+
+def default_output_path(trace_file: str) -> str:
+    """Return the compiled directory path that sits next to a JSONL trace."""
+    path = Path(trace_file)
+    return str(path.with_suffix(COMPILED_SUFFIX))
+
+
+def is_compiled_trace(path: str) -> bool:
+    """Check whether path is a compiled trace directory."""
+    return os.path.isdir(path) and os.path.exists(os.path.join(path, "meta.json"))
+
+
+def source_fingerprint(trace_file: str) -> Dict[str, Any]:
+    """Identify a source trace by size and modification time."""
+    stat = os.stat(trace_file)
+    return {"size": stat.st_size, "mtime_ns": stat.st_mtime_ns}
+
+
+def is_compiled_trace_fresh(trace_file: str, output_dir: str) -> bool:
+    """Check whether output_dir was compiled from the current version of trace_file."""
+    if not is_compiled_trace(output_dir):
+        return False
+    try:
+        with open(os.path.join(output_dir, "meta.json"), "r") as f:
+            meta = json.load(f)
+    except (OSError, json.JSONDecodeError):
+        return False
+    return (meta.get("version") == FORMAT_VERSION
+            and meta.get("source_fingerprint") == source_fingerprint(trace_file))
+
+
+def compile_trace(trace_file: str, output_dir: str) -> Dict[str, Any]:
+    """Compile a JSONL trace into columnar numpy files and return its metadata."""
+    print(f"📁 Compiling: {trace_file}")
+    compile_start = time.time()
+
+    # Accumulate columns in compact typed buffers rather than a list of dicts
+    timestamps = array('q')
+    input_lengths = array('q')
+    output_lengths = array('q')
+    hash_counts = array('q')
+    hash_ids = array('q')
+    with open(trace_file, 'r') as f:
+        for line_num, line in enumerate(f, 1):
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                entry = json.loads(line)
+            except json.JSONDecodeError as e:
+                print(f"⚠️  Warning: Invalid JSON on line {line_num}: {e}")
+                continue
+            timestamps.append(int(entry['timestamp']))
+            input_lengths.append(int(entry['input_length']))
+            output_lengths.append(int(entry['output_length']))
+            entry_hash_ids = entry.get('hash_ids') or []
+            hash_counts.append(len(entry_hash_ids))
+            hash_ids.extend(int(h) for h in entry_hash_ids)
+
+    timestamps = np.frombuffer(timestamps, dtype=np.int64)
+    input_lengths = np.frombuffer(input_lengths, dtype=np.int64)
+    output_lengths = np.frombuffer(output_lengths, dtype=np.int64)
+    hash_counts = np.frombuffer(hash_counts, dtype=np.int64)
+    hash_ids = np.frombuffer(hash_ids, dtype=np.int64)
+    hash_offsets = np.zeros(len(timestamps) + 1, dtype=np.int64)
+    np.cumsum(hash_counts, out=hash_offsets[1:])
+    print(f"📊 Parsed {len(timestamps)} entries ({len(hash_ids)} hash_ids) in {time.time() - compile_start:.3f}s")
+
+    # Sort chronologically; a stable sort keeps the file order of equal timestamps
+    if len(timestamps) > 1 and np.any(timestamps[1:] < timestamps[:-1]):
+        print(f"🔄 Sorting entries by timestamp...")
+        order = np.argsort(timestamps, kind='stable')
+        timestamps = timestamps[order]
+        input_lengths = input_lengths[order]
+        output_lengths = output_lengths[order]
+        sorted_counts = hash_counts[order]
+        sorted_offsets = np.zeros_like(hash_offsets)
+        np.cumsum(sorted_counts, out=sorted_offsets[1:])
+        # Gather each request's hash_ids run from its old position to its new one
+        gather = np.repeat(hash_offsets[:-1][order] - sorted_offsets[:-1], sorted_counts)
+        gather += np.arange(len(hash_ids), dtype=np.int64)
+        hash_ids = hash_ids[gather]
+        hash_offsets = sorted_offsets
+
+    # Every request must be covered by its hash blocks (see TraceDataset.detect_block_size)
+    counts = np.diff(hash_offsets)
+    covered = counts > 0
+    block_size = 1
+    if np.any(covered):
+        # Integer ceil(input_length / len(hash_ids))
+        block_size = max(1, int(np.max(-(-input_lengths[covered] // counts[covered]))))
+
+    meta = {
+        "version": FORMAT_VERSION,
+        "source": os.path.abspath(trace_file),
+        "source_fingerprint": source_fingerprint(trace_file),
+        "num_requests": int(len(timestamps)),
+        "num_hash_ids": int(len(hash_ids)),
+        "first_timestamp": int(timestamps[0]) if len(timestamps) else None,
+        "last_timestamp": int(timestamps[-1]) if len(timestamps) else None,
+        "block_size": block_size,
+    }
+
+    # Write into a scratch directory and swap it in, so readers never see a partial trace
+    tmp_dir = f"{output_dir}.tmp.{os.getpid()}"
+    shutil.rmtree(tmp_dir, ignore_errors=True)
+    os.makedirs(tmp_dir)
+    columns = {
+        "timestamps": timestamps,
+        "input_lengths": input_lengths,
+        "output_lengths": output_lengths,
+        "hash_offsets": hash_offsets,
+        "hash_ids": hash_ids,
+    }
+    for name, values in columns.items():
+        np.save(os.path.join(tmp_dir, f"{name}.npy"), np.ascontiguousarray(values, dtype=np.int64))
+    with open(os.path.join(tmp_dir, "meta.json"), 'w') as f:
+        json.dump(meta, f, indent=2)
+    shutil.rmtree(output_dir, ignore_errors=True)
+    os.replace(tmp_dir, output_dir)
+
+    print(f"✅ Compiled {meta['num_requests']} requests to {output_dir} in {time.time() - compile_start:.3f}s")
+    return meta
+
+
+class CompiledTrace:
+    """Read-only view of a compiled trace whose columns are memory-mapped."""
+
+    def __init__(self, path: str):
+        self.path = path
+        with open(os.path.join(path, "meta.json"), 'r') as f:
+            self.meta = json.load(f)
+        if self.meta.get("version") != FORMAT_VERSION:
+            raise ValueError(f"Unsupported compiled trace version {self.meta.get('version')} in {path}")
+        self.timestamps = np.load(os.path.join(path, "timestamps.npy"), mmap_mode='r')
+        self.input_lengths = np.load(os.path.join(path, "input_lengths.npy"), mmap_mode='r')
+        self.output_lengths = np.load(os.path.join(path, "output_lengths.npy"), mmap_mode='r')
+        self.hash_offsets = np.load(os.path.join(path, "hash_offsets.npy"), mmap_mode='r')
+        self.hash_ids = np.load(os.path.join(path, "hash_ids.npy"), mmap_mode='r')
+
+    def __len__(self) -> int:
+        return len(self.timestamps)
+
+    def select_range(self, start_timestamp: int, end_timestamp: Optional[int]) -> Tuple[int, int]:
+        """Binary-search the [start, end] raw timestamp window and return its index range."""
+        lo = int(np.searchsorted(self.timestamps, start_timestamp, side='left'))
+        if end_timestamp is None:
+            return lo, len(self.timestamps)
+        hi = int(np.searchsorted(self.timestamps, end_timestamp, side='right'))
+        return lo, max(lo, hi)
+
+    def entry(self, index: int) -> Dict[str, Any]:
+        """Materialize one trace entry in the JSONL dict layout."""
+        start, end = self.hash_offsets[index], self.hash_offsets[index + 1]
+        return {
+            'timestamp': int(self.timestamps[index]),
+            'input_length': int(self.input_lengths[index]),
+            'output_length': int(self.output_lengths[index]),
+            'hash_ids': self.hash_ids[start:end].tolist(),
+        }
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Compile LMBench JSONL traces into memory-mappable columnar files"
+    )
+    parser.add_argument('trace_files', nargs='+', help='JSONL trace files to compile')
+    parser.add_argument('--output', default=None,
+                        help=f'Output directory (default: trace path with {COMPILED_SUFFIX} suffix, single trace only)')
+    parser.add_argument('--force', action='store_true', help='Recompile even if the compiled trace is up to date')
+
+    args = parser.parse_args()
+
+    if args.output and len(args.trace_files) > 1:
+        print("❌ --output can only be used with a single trace file")
+        sys.exit(1)
+
+    for trace_file in args.trace_files:
+        if not os.path.exists(trace_file):
+            print(f"❌ File not found: {trace_file}")
+            sys.exit(1)
+        output_dir = args.output or default_output_path(trace_file)
+        if not args.force and is_compiled_trace_fresh(trace_file, output_dir):
+            print(f"✅ {output_dir} is up to date")
+            continue
+        compile_trace(trace_file, output_dir)
+
+
+if __name__ == "__main__":
+    main()
@@ -5,9 +5,9 @@ SCRIPT_DIR="$( cd "$( dirname "${BASH_SOURCE[0]}" )" && pwd )"
 PROJECT_ROOT="$( cd "$SCRIPT_DIR/../../" && pwd )"
 cd "$SCRIPT_DIR"
 
-if [[ $# -lt 14 ]]; then
-    echo "Usage: $0 <model> <base url> <save file key> <n> <serving_index> <spec_file_path> <lmbench_session_id> <trace_file> <start_time> <duration> <preserve_timing> <time_scale> <api_type> <max_delay> [qps_values...]"
-    echo "Example: $0 meta-llama/Llama-3.1-8B-Instruct http://localhost:30080 test layerwise-benchmark 0 0-bench-specs/layerwise-spec.yaml lmbench-1234567890-abcd1234 traces/gmi_trace.jsonl 0 60 false 1.0 completions 10.0 1.0 2.0"
+if [[ $# -lt 16 ]]; then
+    echo "Usage: $0 <model> <base url> <save file key> <n> <serving_index> <spec_file_path> <lmbench_session_id> <trace_file> <start_time> <duration> <preserve_timing> <time_scale> <api_type> <max_delay> <arrival_process> <block_size> [qps_values...]"
+    echo "Example: $0 meta-llama/Llama-3.1-8B-Instruct http://localhost:30080 test layerwise-benchmark 0 0-bench-specs/layerwise-spec.yaml lmbench-1234567890-abcd1234 traces/gmi_trace.jsonl 0 60 false 1.0 completions 10.0 poisson None 1.0 2.0"
     exit 1
 fi
 
@@ -27,8 +27,10 @@ PRESERVE_TIMING=${11}
 TIME_SCALE=${12}
 API_TYPE=${13}
 MAX_DELAY=${14}  # Maximum delay between requests (for testing production traces)
+ARRIVAL_PROCESS=${15}  # Inter-arrival distribution in QPS mode (fixed or poisson)
+BLOCK_SIZE=${16}  # Tokens per trace hash_id block ("None" to infer from the trace)
 
-QPS_VALUES=("${@:15}")  # QPS values for QPS-controlled mode
+QPS_VALUES=("${@:17}")  # QPS values for QPS-controlled mode
 
 collect_pod_logs() {
     local baseline="$1"
@@ -93,11 +95,16 @@ run_trace_replayer() {
         if [[ -n "$MAX_DELAY" && "$MAX_DELAY" != "None" ]]; then
             cmd="$cmd --max-delay \"$MAX_DELAY\""
         fi
+
+        # Add block-size if specified (not empty or "None")
+        if [[ -n "$BLOCK_SIZE" && "$BLOCK_SIZE" != "None" ]]; then
+            cmd="$cmd --block-size \"$BLOCK_SIZE\""
+        fi
         
         eval $cmd
     else
-        # QPS-controlled mode
-        echo "📊 Running QPS-controlled replay (QPS: $1)"
+        # QPS-controlled mode (open loop)
+        echo "📊 Running QPS-controlled replay (QPS: $1, arrivals: $ARRIVAL_PROCESS)"
         cmd="python3 ./trace-replayer-qa.py \
             --model \"$MODEL\" \
             --base-url \"$BASE_URL\" \
@@ -106,12 +113,18 @@ run_trace_replayer() {
             --start-time \"$START_TIME\" \
             --duration \"$DURATION\" \
             --qps \"$1\" \
+            --arrival-process \"$ARRIVAL_PROCESS\" \
             --api-type \"$API_TYPE\""
         
         # Add max-delay if specified (not empty or "None") - though less useful in QPS mode
         if [[ -n "$MAX_DELAY" && "$MAX_DELAY" != "None" ]]; then
             cmd="$cmd --max-delay \"$MAX_DELAY\""
         fi
+
+        # Add block-size if specified (not empty or "None")
+        if [[ -n "$BLOCK_SIZE" && "$BLOCK_SIZE" != "None" ]]; then
+            cmd="$cmd --block-size \"$BLOCK_SIZE\""
+        fi
         
         eval $cmd
     fi
@@ -145,6 +158,14 @@ if [ $? -ne 0 ]; then
     echo "⚠️ Warning: Failed to sort trace file, continuing anyway..."
 fi
 
+# Compile the trace into memory-mapped columns (idempotent); the replayer picks up
+# an up-to-date compiled trace next to the JSONL file automatically
+echo "📦 Ensuring compiled trace is up to date..."
+python3 ./compile_trace.py "$TRACE_FILE"
+if [ $? -ne 0 ]; then
+    echo "⚠️ Warning: Failed to compile trace file, replaying from JSONL..."
+fi
+
 # Run benchmarks
 if [ "$PRESERVE_TIMING" = "true" ]; then
     # Single timed run
@@ -190,6 +211,7 @@ else
             KEY="$KEY" \
             WORKLOAD="trace_replayer" \
             QPS="$qps" \
+            ARRIVAL_PROCESS="$ARRIVAL_PROCESS" \
             TRACE_FILE="$TRACE_FILE" \
             START_TIME="$START_TIME" \
             DURATION="$DURATION" \
@@ -5,19 +5,31 @@ LMBench Trace Sorter and Analyzer
 This script sorts trace files chronologically and provides timing analysis.
 It's designed to be idempotent and run automatically during LMBench deployments.
 
+Results are cached in a sidecar file (<trace>.sortinfo.json) holding the file's
+hash, its sortedness and the gap statistics, so unchanged traces are skipped
+without being re-read. Traces are scanned as a stream and sorted with a chunked
+external merge sort, so files larger than memory can be processed.
+
 Usage: python sort_traces.py [trace_file_path]
 If no path provided, sorts all trace files in the traces/ directory.
 """
 
+import hashlib
+import heapq
 import json
 import os
 import sys
 import argparse
+import tempfile
 from pathlib import Path
-from typing import List, Dict, Tuple, Optional
+from typing import List, Dict, Tuple, Optional, Iterator
 import shutil
 import time
 
+SIDECAR_SUFFIX = ".sortinfo.json"
+SIDECAR_VERSION = 1
+DEFAULT_CHUNK_MB = 256
+
 
 def parse_timestamp(timestamp) -> int:
     """Parse timestamp to integer, handling both string and int types."""
@@ -26,9 +38,8 @@ def parse_timestamp(timestamp) -> int:
     return int(timestamp)
 
 
-def load_trace_entries(file_path: str) -> List[Dict]:
-    """Load all entries from a JSONL trace file."""
-    entries = []
+def iter_trace_lines(file_path: str) -> Iterator[Tuple[int, str]]:
+    """Stream (timestamp, line) pairs from a JSONL trace file, skipping invalid lines."""
     with open(file_path, 'r') as f:
         for line_num, line in enumerate(f, 1):
             line = line.strip()
@@ -36,36 +47,77 @@ def load_trace_entries(file_path: str) -> List[Dict]:
                 continue
             try:
                 entry = json.loads(line)
-                entries.append(entry)
             except json.JSONDecodeError as e:
                 print(f"⚠️  Warning: Invalid JSON on line {line_num}: {e}")
                 continue
-    return entries
+            yield parse_timestamp(entry['timestamp']), line
 
 
-def is_chronologically_sorted(entries: List[Dict]) -> bool:
-    """Check if trace entries are already sorted chronologically."""
-    if len(entries) <= 1:
-        return True
-    
-    prev_timestamp = parse_timestamp(entries[0]['timestamp'])
-    for entry in entries[1:]:
-        current_timestamp = parse_timestamp(entry['timestamp'])
-        if current_timestamp < prev_timestamp:
-            return False
-        prev_timestamp = current_timestamp
-    
-    return True
+def sidecar_path(file_path: str) -> str:
+    """Return the path of the sortedness sidecar for a trace file."""
+    return f"{file_path}{SIDECAR_SUFFIX}"
+
+
+def file_hash(file_path: str) -> str:
+    """Compute the SHA-256 of a file without loading it into memory."""
+    digest = hashlib.sha256()
+    with open(file_path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def load_sidecar(file_path: str) -> Optional[Dict]:
+    """
+    Return the cached timing analysis if the sidecar matches the current file.
+
+    Size and mtime are checked first; the file is only re-hashed when they changed,
+    so a touched but otherwise identical trace is still recognized.
+    """
+    try:
+        with open(sidecar_path(file_path), 'r') as f:
+            sidecar = json.load(f)
+    except (OSError, json.JSONDecodeError):
+        return None
+    if sidecar.get('version') != SIDECAR_VERSION or not sidecar.get('sorted'):
+        return None
+
+    stat = os.stat(file_path)
+    if sidecar.get('size') != stat.st_size:
+        return None
+    if sidecar.get('mtime_ns') != stat.st_mtime_ns:
+        if sidecar.get('sha256') != file_hash(file_path):
+            return None
+        # Same content, refresh the cheap fingerprint for next time
+        write_sidecar(file_path, sidecar['timing_analysis'], sidecar['sha256'])
+    return sidecar['timing_analysis']
+
+
+def write_sidecar(file_path: str, timing_analysis: Dict, sha256: Optional[str] = None):
+    """Record that a trace file is sorted, together with its timing analysis."""
+    stat = os.stat(file_path)
+    sidecar = {
+        'version': SIDECAR_VERSION,
+        'sha256': sha256 or file_hash(file_path),
+        'size': stat.st_size,
+        'mtime_ns': stat.st_mtime_ns,
+        'sorted': True,
+        'timing_analysis': timing_analysis,
+    }
+    tmp_path = f"{sidecar_path(file_path)}.tmp"
+    with open(tmp_path, 'w') as f:
+        json.dump(sidecar, f, indent=2)
+    os.replace(tmp_path, sidecar_path(file_path))
 
 
-def detect_timestamp_format(entries: List[Dict]) -> str:
+def detect_timestamp_format(timestamps: List[int]) -> str:
     """Detect whether timestamps are Unix nanoseconds, synthetic offsets, or other format."""
-    if not entries:
+    if not timestamps:
         return "unknown"
     
     # Sample a few timestamps to analyze
-    sample_size = min(10, len(entries))
-    timestamps = [parse_timestamp(entries[i]['timestamp']) for i in range(sample_size)]
+    sample_size = min(10, len(timestamps))
+    timestamps = timestamps[:sample_size]
     
     # Check if they look like Unix nanoseconds (around 19 digits, starting with 17...)
     # Unix nanoseconds for 2025 would be around 1.7e18
@@ -104,59 +156,59 @@ def format_timestamp(timestamp: int, format_type: str) -> str:
         return str(timestamp)
 
 
-def analyze_timing_gaps(entries: List[Dict]) -> Dict:
-    """Analyze timing gaps between consecutive requests."""
-    if len(entries) <= 1:
-        return {
-            'total_requests': len(entries),
-            'max_gap_seconds': 0.0,
-            'max_gap_nanoseconds': 0,
-            'min_gap_seconds': 0.0,
-            'min_gap_nanoseconds': 0,
-            'avg_gap_seconds': 0.0,
-            'total_duration_seconds': 0.0,
-            'unique_timestamps': len(set(parse_timestamp(e['timestamp']) for e in entries)),
-            'timestamp_format': 'unknown'
-        }
-    
-    # Sort entries by timestamp for analysis
-    sorted_entries = sorted(entries, key=lambda x: parse_timestamp(x['timestamp']))
-    
+def analyze_timing_gaps(file_path: str) -> Tuple[bool, Dict]:
+    """
+    Scan a trace file once, checking sortedness and analyzing gaps between consecutive requests.
+
+    Returns:
+        (is_sorted, timing_analysis): the analysis is only meaningful for a sorted file
+    """
+    total_requests = 0
+    unique_timestamps = 0
+    is_sorted = True
+    first_ts = None
+    prev_ts = None
+    max_gap = None
+    min_gap = None
+    sample_timestamps = []
+
+    for timestamp, _ in iter_trace_lines(file_path):
+        total_requests += 1
+        if len(sample_timestamps) < 10:
+            sample_timestamps.append(timestamp)
+        if prev_ts is None:
+            first_ts = timestamp
+            unique_timestamps = 1
+        else:
+            gap = timestamp - prev_ts
+            if gap < 0:
+                is_sorted = False
+            if gap != 0:
+                unique_timestamps += 1
+            max_gap = gap if max_gap is None else max(max_gap, gap)
+            min_gap = gap if min_gap is None else min(min_gap, gap)
+        prev_ts = timestamp
+
     # Detect timestamp format
-    timestamp_format = detect_timestamp_format(sorted_entries)
-    
-    gaps = []
-    unique_timestamps = set()
-    
-    for i in range(len(sorted_entries) - 1):
-        current_ts = parse_timestamp(sorted_entries[i]['timestamp'])
-        next_ts = parse_timestamp(sorted_entries[i + 1]['timestamp'])
-        unique_timestamps.add(current_ts)
-        unique_timestamps.add(next_ts)
-        
-        gap = next_ts - current_ts
-        gaps.append(gap)
-    
-    if not gaps:
-        return {
-            'total_requests': len(entries),
+    timestamp_format = detect_timestamp_format(sample_timestamps)
+
+    if max_gap is None:
+        return is_sorted, {
+            'total_requests': total_requests,
             'max_gap_seconds': 0.0,
             'max_gap_nanoseconds': 0,
             'min_gap_seconds': 0.0,
             'min_gap_nanoseconds': 0,
             'avg_gap_seconds': 0.0,
             'total_duration_seconds': 0.0,
-            'unique_timestamps': len(unique_timestamps),
-            'timestamp_format': timestamp_format
+            'unique_timestamps': unique_timestamps,
+            'timestamp_format': timestamp_format if total_requests > 1 else 'unknown'
         }
-    
-    max_gap = max(gaps)
-    min_gap = min(gaps)
-    avg_gap = sum(gaps) / len(gaps)
-    
-    first_ts = parse_timestamp(sorted_entries[0]['timestamp'])
-    last_ts = parse_timestamp(sorted_entries[-1]['timestamp'])
+
+    last_ts = prev_ts
     total_duration = last_ts - first_ts
+    # Consecutive gaps of a sorted trace telescope to its total duration
+    avg_gap = total_duration / (total_requests - 1)
     
     # Convert to seconds based on timestamp format
     if timestamp_format == "unix_nanoseconds":
@@ -169,22 +221,82 @@ def analyze_timing_gaps(entries: List[Dict]) -> Dict:
         # Unknown format, assume nanoseconds for backward compatibility
         gap_to_seconds = lambda x: x / 1e9
     
-    return {
-        'total_requests': len(entries),
+    return is_sorted, {
+        'total_requests': total_requests,
         'max_gap_seconds': gap_to_seconds(max_gap),
         'max_gap_nanoseconds': max_gap,
         'min_gap_seconds': gap_to_seconds(min_gap),
         'min_gap_nanoseconds': min_gap,
         'avg_gap_seconds': gap_to_seconds(avg_gap),
         'total_duration_seconds': gap_to_seconds(total_duration),
-        'unique_timestamps': len(unique_timestamps),
+        'unique_timestamps': unique_timestamps,
         'timestamp_format': timestamp_format,
         'first_timestamp': first_ts,
         'last_timestamp': last_ts
     }
 
 
-def sort_trace_file(file_path: str, backup: bool = False) -> Tuple[bool, Dict]:
+def write_sorted_chunk(chunk: List[Tuple[int, int, str]], directory: str) -> str:
+    """Sort one in-memory chunk and spill it to a temporary run file."""
+    chunk.sort()
+    fd, run_path = tempfile.mkstemp(prefix='.sort-run-', suffix='.jsonl', dir=directory)
+    with os.fdopen(fd, 'w') as f:
+        for timestamp, _, line in chunk:
+            f.write(f"{timestamp}\t{line}\n")
+    return run_path
+
+
+def iter_run(run_path: str) -> Iterator[Tuple[int, str]]:
+    """Stream (timestamp, line) pairs back from a sorted run file."""
+    with open(run_path, 'r') as f:
+        for record in f:
+            timestamp, line = record.rstrip('\n').split('\t', 1)
+            yield int(timestamp), line
+
+
+def external_sort(file_path: str, output_path: str, chunk_bytes: int):
+    """
+    Sort a JSONL trace by timestamp with a chunked external merge sort.
+
+    The input is read in chunks of roughly chunk_bytes, each chunk is sorted and
+    spilled to a run file, and the runs are k-way merged into output_path. Memory
+    use is bounded by the chunk size rather than the trace size. Ties keep their
+    original file order.
+    """
+    directory = os.path.dirname(os.path.abspath(output_path))
+    runs = []
+    chunk = []
+    chunk_size = 0
+    try:
+        for index, (timestamp, line) in enumerate(iter_trace_lines(file_path)):
+            chunk.append((timestamp, index, line))
+            chunk_size += len(line)
+            if chunk_size >= chunk_bytes:
+                runs.append(write_sorted_chunk(chunk, directory))
+                chunk = []
+                chunk_size = 0
+
+        with open(output_path, 'w') as out:
+            if not runs:
+                # The whole trace fit in one chunk, no merge needed
+                chunk.sort()
+                for _, _, line in chunk:
+                    out.write(line + '\n')
+            else:
+                if chunk:
+                    runs.append(write_sorted_chunk(chunk, directory))
+                    chunk = []
+                print(f"🔀 Merging {len(runs)} sorted runs...")
+                # heapq.merge is stable across runs, which preserve file order
+                for _, line in heapq.merge(*(iter_run(run) for run in runs), key=lambda x: x[0]):
+                    out.write(line + '\n')
+    finally:
+        for run in runs:
+            os.remove(run)
+
+
+def sort_trace_file(file_path: str, backup: bool = False, chunk_bytes: int = DEFAULT_CHUNK_MB << 20,
+                    force: bool = False) -> Tuple[bool, Dict]:
     """
     Sort a trace file chronologically.
     
@@ -193,25 +305,29 @@ def sort_trace_file(file_path: str, backup: bool = False) -> Tuple[bool, Dict]:
     """
     print(f"📁 Processing: {file_path}")
     
-    # Load entries
+    if not force:
+        cached_analysis = load_sidecar(file_path)
+        if cached_analysis is not None:
+            print(f"✅ {file_path} is unchanged and already sorted (cached in {sidecar_path(file_path)})")
+            return False, cached_analysis
+    
+    # Check sortedness and analyze timing in a single streaming pass
     try:
-        entries = load_trace_entries(file_path)
+        is_sorted, timing_analysis = analyze_timing_gaps(file_path)
     except Exception as e:
         print(f"❌ Error loading {file_path}: {e}")
         return False, {}
     
-    if not entries:
+    if timing_analysis['total_requests'] == 0:
         print(f"⚠️  Warning: {file_path} is empty or contains no valid entries")
         return False, {}
     
-    print(f"📊 Loaded {len(entries)} entries")
-    
-    # Analyze timing before sorting
-    timing_analysis = analyze_timing_gaps(entries)
+    print(f"📊 Scanned {timing_analysis['total_requests']} entries")
     
     # Check if already sorted
-    if is_chronologically_sorted(entries):
+    if is_sorted:
         print(f"✅ {file_path} is already chronologically sorted")
+        write_sidecar(file_path, timing_analysis)
         return False, timing_analysis
     
     print(f"🔄 Sorting {file_path} chronologically...")
@@ -222,19 +338,22 @@ def sort_trace_file(file_path: str, backup: bool = False) -> Tuple[bool, Dict]:
         shutil.copy2(file_path, backup_path)
         print(f"💾 Backup created: {backup_path}")
     
-    # Sort entries by timestamp
-    sorted_entries = sorted(entries, key=lambda x: parse_timestamp(x['timestamp']))
-    
-    # Write sorted entries back to file
+    # Sort into a temporary file and swap it in, so a failure never truncates the trace
+    tmp_path = f"{file_path}.sorting.{os.getpid()}"
     try:
-        with open(file_path, 'w') as f:
-            for entry in sorted_entries:
-                f.write(json.dumps(entry) + '\n')
-        print(f"✅ Successfully sorted {file_path}")
-        return True, timing_analysis
+        external_sort(file_path, tmp_path, chunk_bytes)
+        os.replace(tmp_path, file_path)
     except Exception as e:
         print(f"❌ Error writing sorted file {file_path}: {e}")
-        return False, timing_analysis
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        return False, {}
+    print(f"✅ Successfully sorted {file_path}")
+    
+    # Gap statistics are only meaningful on the sorted order
+    _, timing_analysis = analyze_timing_gaps(file_path)
+    write_sidecar(file_path, timing_analysis)
+    return True, timing_analysis
 
 
 def format_duration(seconds: float) -> str:
@@ -319,6 +438,17 @@ def main():
         default='traces', 
         help='Directory containing trace files (default: traces)'
     )
+    parser.add_argument(
+        '--chunk-mb', 
+        type=int,
+        default=DEFAULT_CHUNK_MB, 
+        help=f'Maximum size of each in-memory sort chunk in MB (default: {DEFAULT_CHUNK_MB})'
+    )
+    parser.add_argument(
+        '--force', 
+        action='store_true', 
+        help='Ignore cached sidecar results and rescan every trace'
+    )
     
     args = parser.parse_args()
     
@@ -353,7 +483,8 @@ def main():
             print(f"❌ File not found: {file_path}")
             continue
         
-        was_sorted, analysis = sort_trace_file(file_path, backup=args.backup)
+        was_sorted, analysis = sort_trace_file(file_path, backup=args.backup,
+                                               chunk_bytes=args.chunk_mb << 20, force=args.force)
         if was_sorted:
             total_sorted += 1
         
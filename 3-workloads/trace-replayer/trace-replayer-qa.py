@@ -2,7 +2,8 @@
 """
 Trace Replayer workload for LMBench.
 Replays conversation traces using deterministic synthetic prompt generation.
-Uses hash_ids as seeds to preserve cache locality patterns while generating valid text.
+Every hash_id maps to a fixed block of tokens of the model's tokenizer, so
+requests that share a hash_id prefix in the trace share a token prefix on the engine.
 """
 
 import argparse
@@ -11,23 +12,113 @@ import csv
 import json
 import time
 import random
+import functools
+import math
 import numpy as np
+from array import array
 from typing import List, Dict, Any, Optional
 import aiohttp
 import sys
 from pathlib import Path
 
+from compile_trace import CompiledTrace, default_output_path, is_compiled_trace, is_compiled_trace_fresh
+
+# The shared lmbench client package lives in 3-workloads/
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+from lmbench import AdmissionController, PromptGenerator, QuantileSketch, encode_itls
+
+# Common English words that are single tokens (with a leading space) for most
+# BPE tokenizers, so one word approximates one token in a hash block when the
+# model's tokenizer is not available
+BLOCK_VOCABULARY = [
+    "the", "a", "an", "and", "or", "but", "in", "on", "at", "to", "for", "of", "with", "by",
+    "from", "up", "about", "into", "through", "during", "before", "after", "above", "below",
+    "user", "system", "data", "process", "function", "value", "result", "input", "output",
+    "information", "analysis", "method", "approach", "solution", "problem", "question",
+    "answer", "response", "request", "message", "content", "text", "word", "sentence",
+    "document", "file", "code", "program", "script", "algorithm", "structure", "database",
+    "network", "server", "client", "application", "interface", "protocol", "service",
+    "configuration", "parameter", "variable", "constant", "string", "number", "array"
+]
+
+
+# Columns of the output csv, with the names expected by the post-processing scripts
+RESULT_FIELDS = ['launch_time', 'finish_time', 'ttft', 'generation_time', 'prompt_tokens', 'generation_tokens',
+                 'total_tokens', 'connect_time', 'queue_time', 'itls', 'error']
+
+# Hash blocks kept in memory, hot prefixes stay cached (a 512-token block is ~2 KB)
+BLOCK_CACHE_SIZE = 4096
+
+
+class CompiledTraceWindow:
+    """Lazy sequence of the entries of a compiled trace inside a time window.
+
+    Entries are materialized one at a time from the memory-mapped columns, so
+    the window costs no memory beyond the pages the replay actually touches.
+    """
+
+    def __init__(self, trace: CompiledTrace, lo: int, hi: int, earliest_timestamp: int,
+                 units_per_second: float, start_time: float):
+        self.trace = trace
+        self.lo = lo
+        self.hi = hi
+        self.earliest_timestamp = earliest_timestamp
+        self.units_per_second = units_per_second
+        self.start_time = start_time
+
+    def __len__(self) -> int:
+        return self.hi - self.lo
+
+    def __getitem__(self, index: int) -> Dict[str, Any]:
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError(index)
+        entry = self.trace.entry(self.lo + index)
+        entry['relative_timestamp'] = (entry['timestamp'] - self.earliest_timestamp) / self.units_per_second - self.start_time
+        return entry
+
+    def __iter__(self):
+        for index in range(len(self)):
+            yield self[index]
+
+    def relative_timestamps(self) -> np.ndarray:
+        """Relative timestamps of the whole window, computed without materializing entries."""
+        timestamps = self.trace.timestamps[self.lo:self.hi]
+        return (timestamps - self.earliest_timestamp) / self.units_per_second - self.start_time
+
+
 class TraceDataset:
     """Dataset that loads and processes conversation trace data."""
     
-    def __init__(self, trace_file: str, start_time: float = 0, duration: float = float('inf')):
+    def __init__(self, trace_file: str, start_time: float = 0, duration: float = float('inf'),
+                 block_size: Optional[int] = None, tokenizer: Optional[str] = None):
         self.trace_file = trace_file
         self.start_time = start_time
         self.duration = duration
+        self.block_size = block_size  # Tokens per hash_id block (None = infer from the trace)
+        # Blocks are token ids of this tokenizer; without one they are words, about one token each
+        self.prompt_generator = PromptGenerator(tokenizer)
+        if self.prompt_generator.tokenizer is None:
+            print("⚠️  No tokenizer available, hash blocks are words and prompt lengths are approximate")
+        self._block_tokens = functools.lru_cache(maxsize=BLOCK_CACHE_SIZE)(self._build_block)
         self.requests = []
         self.actual_trace_duration = 0  # Store the actual duration of the trace
         self.load_trace()
     
+    def detect_block_size(self, entries: List[Dict[str, Any]]) -> int:
+        """Infer the trace's tokens-per-hash_id block size.
+
+        Every request must be covered by its hash blocks, so the block size is
+        the largest ceil(input_length / len(hash_ids)) in the trace (512 for
+        the Mooncake trace).
+        """
+        block_size = 1
+        for entry in entries:
+            if entry.get('hash_ids'):
+                block_size = max(block_size, math.ceil(entry['input_length'] / len(entry['hash_ids'])))
+        return block_size
+
     def detect_timestamp_format(self, timestamps: List[int]) -> str:
         """Detect whether timestamps are Unix nanoseconds, milliseconds, or synthetic offsets."""
         if not timestamps:
@@ -56,6 +147,15 @@ class TraceDataset:
         
         return "unknown"
 
+    def timestamp_units_per_second(self, timestamp: int, format_type: str) -> float:
+        """Return how many raw timestamp units make up one second (see convert_timestamp_to_seconds)."""
+        if format_type == "unix_nanoseconds":
+            return 1e9
+        elif format_type in ("unix_milliseconds", "synthetic_offsets"):
+            return 1e3
+        else:
+            return 1e9 if timestamp > 1e15 else 1e3
+
     def convert_timestamp_to_seconds(self, timestamp: int, format_type: str) -> float:
         """Convert timestamp to seconds based on detected format."""
         if format_type == "unix_nanoseconds":
@@ -74,6 +174,15 @@ class TraceDataset:
 
     def load_trace(self):
         """Load and filter trace data with relative timestamps."""
+        if is_compiled_trace(self.trace_file):
+            self.load_compiled_trace(self.trace_file)
+            return
+        compiled_path = default_output_path(self.trace_file)
+        if self.trace_file.endswith('.jsonl') and is_compiled_trace_fresh(self.trace_file, compiled_path):
+            print(f"📦 Found up-to-date compiled trace: {compiled_path}")
+            self.load_compiled_trace(compiled_path)
+            return
+        
         print(f"📁 Loading trace file: {self.trace_file}")
         load_start_time = time.time()
         
@@ -106,6 +215,12 @@ class TraceDataset:
         timestamp_format = self.detect_timestamp_format(all_timestamps)
         print(f"🕐 Detected timestamp format: {timestamp_format}")
         
+        if self.block_size is None:
+            self.block_size = self.detect_block_size(all_entries)
+            print(f"🧱 Detected hash block size: {self.block_size} tokens")
+        else:
+            print(f"🧱 Using hash block size: {self.block_size} tokens")
+        
         # Get the earliest and latest timestamps to calculate actual trace duration
         earliest_timestamp = all_entries[0]['timestamp']
         latest_timestamp = all_entries[-1]['timestamp']
@@ -157,59 +272,106 @@ class TraceDataset:
             print(f"   Original trace spans: 0s to {self.actual_trace_duration:.2f}s")
             print(f"💡 Try adjusting START_TIME or DURATION parameters, or use DURATION: full")
     
+    def load_compiled_trace(self, path: str):
+        """Load a compiled trace with mmap and select the time window by binary search."""
+        print(f"📁 Loading compiled trace: {path}")
+        load_start_time = time.time()
+        trace = CompiledTrace(path)
+        print(f"⏱️  Mapped {len(trace)} entries from compiled trace in {time.time() - load_start_time:.3f}s")
+        
+        if len(trace) == 0:
+            print("❌ No entries found in trace file")
+            return
+        
+        # Detect timestamp format
+        timestamp_format = self.detect_timestamp_format(trace.timestamps[:10].tolist())
+        print(f"🕐 Detected timestamp format: {timestamp_format}")
+        
+        if self.block_size is None:
+            self.block_size = trace.meta['block_size']
+            print(f"🧱 Detected hash block size: {self.block_size} tokens")
+        else:
+            print(f"🧱 Using hash block size: {self.block_size} tokens")
+        
+        # Columns are sorted at compile time, so the extremes are the first and last entries
+        earliest_timestamp = int(trace.timestamps[0])
+        latest_timestamp = int(trace.timestamps[-1])
+        units_per_second = self.timestamp_units_per_second(earliest_timestamp, timestamp_format)
+        self.actual_trace_duration = (latest_timestamp - earliest_timestamp) / units_per_second
+        
+        print(f"📈 Original trace spans {self.actual_trace_duration:.2f} seconds ({len(trace)} requests)")
+        print(f"📅 Trace timestamp range: {earliest_timestamp} to {latest_timestamp}")
+        
+        # Handle special case: duration = -1 means use full trace duration
+        if self.duration == -1:
+            self.duration = self.actual_trace_duration
+            print(f"🎯 Using full trace duration: {self.actual_trace_duration:.2f} seconds ({len(trace)} total requests)")
+        
+        # Calculate time window and locate it by binary search over the sorted timestamps
+        end_time = self.start_time + self.duration
+        print(f"⏰ Filtering to time window: {self.start_time:.2f}s to {end_time:.2f}s")
+        filter_start = time.time()
+        start_timestamp = earliest_timestamp + math.ceil(self.start_time * units_per_second)
+        end_timestamp = None if math.isinf(end_time) else earliest_timestamp + math.floor(end_time * units_per_second)
+        lo, hi = trace.select_range(start_timestamp, end_timestamp)
+        self.requests = CompiledTraceWindow(trace, lo, hi, earliest_timestamp, units_per_second, self.start_time)
+        print(f"🔍 Selected {len(self.requests)} requests in time window ({time.time() - filter_start:.3f}s)")
+        
+        if len(self.requests) > 0:
+            relative_timestamps = self.requests.relative_timestamps()
+            time_span = float(relative_timestamps[-1] - relative_timestamps[0])
+            avg_input_len = float(np.mean(trace.input_lengths[lo:hi]))
+            avg_output_len = float(np.mean(trace.output_lengths[lo:hi]))
+            
+            print(f"✅ Trace loading complete!")
+            print(f"📊 Loaded trace statistics:")
+            print(f"   • Requests in window: {len(self.requests)}")
+            print(f"   • Time span: {time_span:.2f} seconds")
+            print(f"   • Average input length: {avg_input_len:.0f} tokens")
+            print(f"   • Average output length: {avg_output_len:.0f} tokens")
+            print(f"   • Request density: {len(self.requests)/time_span:.1f} req/s" if time_span > 0 else "   • Request density: ∞ req/s")
+        else:
+            print(f"⚠️  No requests found in the specified time window ({self.start_time}s to {end_time:.2f}s)")
+            print(f"   Original trace spans: 0s to {self.actual_trace_duration:.2f}s")
+            print(f"💡 Try adjusting START_TIME or DURATION parameters, or use DURATION: full")
+    
+    def _random_tokens(self, rng: random.Random, num_tokens: int) -> list:
+        if self.prompt_generator.tokenizer is None:
+            return rng.choices(BLOCK_VOCABULARY, k=num_tokens)
+        # Whole words with a leading space, so the decoded text encodes back to the same ids
+        return self.prompt_generator.random_tokens(rng, num_tokens)
+
+    def _build_block(self, hash_id: int):
+        """Deterministically map a trace hash_id to block_size tokens."""
+        tokens = self._random_tokens(random.Random(hash_id), self.block_size)
+        if self.prompt_generator.tokenizer is None:
+            return tuple(tokens)
+        return array('i', tokens)
+
     def generate_synthetic_prompt(self, hash_ids: List[int], target_length: int) -> str:
         """
-        Generate synthetic prompt based on hash_ids and target length.
-        Uses hash_ids as deterministic seeds for reproducible generation that preserves cache locality.
+        Generate a synthetic prompt of target_length tokens from the request's hash_ids.
+        The prompt is the concatenation of one fixed block of tokens per hash_id, so
+        requests sharing their first N hash_ids share their first N * block_size tokens.
         """
-        # Create a deterministic seed from hash_ids
-        seed = sum(hash_ids) % (2**31)
-        random.seed(seed)
-        np.random.seed(seed)
-        
-        # Vocabulary for generating realistic text
-        words = [
-            "the", "a", "an", "and", "or", "but", "in", "on", "at", "to", "for", "of", "with", "by",
-            "from", "up", "about", "into", "through", "during", "before", "after", "above", "below",
-            "user", "system", "data", "process", "function", "value", "result", "input", "output",
-            "information", "analysis", "method", "approach", "solution", "problem", "question",
-            "answer", "response", "request", "message", "content", "text", "word", "sentence",
-            "document", "file", "code", "program", "script", "algorithm", "structure", "database",
-            "network", "server", "client", "application", "interface", "protocol", "service",
-            "configuration", "parameter", "variable", "constant", "string", "number", "array"
-        ]
-        
-        # Generate text with target length (approximate token count)
-        generated_words = []
-        estimated_tokens = 0
-        
-        # Use hash_ids to influence word selection deterministically
-        base_offset = hash_ids[0] if hash_ids else 0
-        
-        while estimated_tokens < target_length:
-            # Select word deterministically based on hash_ids and position
-            word_idx = (base_offset + len(generated_words) + sum(hash_ids)) % len(words)
-            word = words[word_idx]
-            generated_words.append(word)
-            
-            # Rough estimate: 1 word ≈ 1.3 tokens on average
-            estimated_tokens = len(generated_words) * 1.3
-        
-        # Create coherent prompt structure with context
-        text_content = " ".join(generated_words)
-        
-        # Add variety to prompt structures based on hash_ids
-        prompt_type = sum(hash_ids) % 4
-        if prompt_type == 0:
-            prompt = f"Please analyze the following data and provide detailed insights: {text_content}. What are the key patterns and recommendations?"
-        elif prompt_type == 1:
-            prompt = f"Given this information: {text_content}, please summarize the main points and suggest next steps."
-        elif prompt_type == 2:
-            prompt = f"Review this content: {text_content}. Identify potential issues and propose solutions."
-        else:
-            prompt = f"Process the following input: {text_content}. Generate a comprehensive response with analysis."
+        tokens = []
+        remaining = target_length
+        for hash_id in hash_ids:
+            if remaining <= 0:
+                break
+            # The last block of a request is usually partial
+            tokens.extend(self._block_tokens(hash_id)[:remaining])
+            remaining -= self.block_size
         
-        return prompt
+        # Pad requests whose hash_ids do not cover input_length with tokens that are
+        # unique to this request, so they cannot create prefix hits the trace lacks
+        if remaining > 0:
+            rng = random.Random(f"{hash_ids}-{target_length}")
+            tokens.extend(self._random_tokens(rng, remaining))
+        
+        if self.prompt_generator.tokenizer is None:
+            return " ".join(tokens)
+        return self.prompt_generator.decode(tokens)
 
 class TraceReplayerBenchmark:
     """Main trace replayer class."""
@@ -217,7 +379,11 @@ class TraceReplayerBenchmark:
     def __init__(self, model: str, base_url: str, output_file: str, trace_file: str, 
                  start_time: float = 0, duration: float = 60, preserve_timing: bool = True,
                  time_scale: float = 1.0, qps: float = 1.0, api_type: str = "completions",
-                 max_delay: float = None):
+                 max_delay: float = None, arrival_process: str = "fixed", seed: int = 0,
+                 max_connections: int = 0, max_connections_per_host: int = 0,
+                 keepalive_timeout: float = 60.0, block_size: Optional[int] = None,
+                 max_in_flight: Optional[int] = None, max_pending: Optional[int] = None,
+                 tokenizer: Optional[str] = None):
         self.model = model
         self.base_url = base_url
         self.output_file = output_file
@@ -226,16 +392,78 @@ class TraceReplayerBenchmark:
         self.time_scale = time_scale
         self.qps = qps
         self.max_delay = max_delay  # Maximum delay between requests (for testing)
+        self.arrival_process = arrival_process  # Inter-arrival distribution in QPS mode
+        self.seed = seed
+        # Connection pool settings for the shared HTTP session (0 = no limit)
+        self.max_connections = max_connections
+        self.max_connections_per_host = max_connections_per_host
+        self.keepalive_timeout = keepalive_timeout
+        # Client-side cap on requests in flight (None = no cap)
+        self.admission = AdmissionController(max_in_flight, max_pending)
+        self.session = None
         self.request_id = 0
-        self.results = []
+        # Finished requests are written out as they complete, only running
+        # statistics of them stay in memory
+        self.csv_file = None
+        self.csv_writer = None
+        self.num_results = 0
+        self.latency_sum = 0.0
+        self.ttft_sketch = QuantileSketch()
+        self.itl_sketch = QuantileSketch()
+        self.connect_sketch = QuantileSketch()
         
         # Load dataset
-        self.dataset = TraceDataset(trace_file, start_time, duration)
+        self.dataset = TraceDataset(trace_file, start_time, duration, block_size, tokenizer or model)
+    
+    def create_session(self) -> aiohttp.ClientSession:
+        """Create the long-lived HTTP session shared by all requests.
+
+        Connections are pooled and kept alive so requests do not pay a TCP
+        handshake each, and a trace hook records how long every request
+        waited to acquire a connection and when it got it (connected_at).
+        """
+        async def on_request_start(session, trace_config_ctx, params):
+            trace_config_ctx.request_start = time.perf_counter()
+        
+        async def on_connection_acquired(session, trace_config_ctx, params):
+            if isinstance(trace_config_ctx.trace_request_ctx, dict):
+                now = time.perf_counter()
+                trace_config_ctx.trace_request_ctx['connected_at'] = now
+                trace_config_ctx.trace_request_ctx['connect_time'] = now - trace_config_ctx.request_start
+        
+        trace_config = aiohttp.TraceConfig()
+        trace_config.on_request_start.append(on_request_start)
+        trace_config.on_connection_create_end.append(on_connection_acquired)
+        trace_config.on_connection_reuseconn.append(on_connection_acquired)
+        
+        connector = aiohttp.TCPConnector(
+            limit=self.max_connections,
+            limit_per_host=self.max_connections_per_host,
+            keepalive_timeout=self.keepalive_timeout,
+            ttl_dns_cache=300,
+        )
+        return aiohttp.ClientSession(connector=connector, trace_configs=[trace_config])
     
-    async def send_request(self, prompt: str, max_tokens: int, timestamp: float) -> Dict[str, Any]:
-        """Send a single request to the API."""
+    async def send_request(self, prompt: str, max_tokens: int, timestamp: float,
+                           scheduled_time: Optional[float] = None) -> Dict[str, Any]:
+        """Send a single streaming request to the API.
+
+        The response is consumed as server-sent events so that the time to the
+        first token and the arrival time of every following token are measured
+        on the client, the same way the other workloads do. TTFT and latency
+        start once a connection is acquired; the wait for the pool and the
+        handshake is reported separately as connect_time.
+
+        scheduled_time is the wall-clock time the request was due to be sent;
+        when given, any lag of the client behind its schedule is counted in
+        queue_time together with the wait for an in-flight slot.
+        """
         self.request_id += 1
-        request_start_time = time.time()
+        enqueue_time = time.time() if scheduled_time is None else min(scheduled_time, time.time())
+        admitted = await self.admission.acquire()
+        # The request leaves the client queue here, TTFT starts once it has a connection
+        launch_time = time.time()
+        request_start = time.perf_counter()
         
         # Prepare request based on API type
         if self.api_type == "chat":
@@ -246,7 +474,9 @@ class TraceReplayerBenchmark:
                     {"role": "user", "content": prompt}
                 ],
                 "max_tokens": max_tokens,
-                "temperature": 0.0
+                "temperature": 0.0,
+                "stream": True,
+                "stream_options": {"include_usage": True}
             }
         else:  # completions
             url = f"{self.base_url}/v1/completions"
@@ -254,60 +484,131 @@ class TraceReplayerBenchmark:
                 "model": self.model,
                 "prompt": prompt,
                 "max_tokens": max_tokens,
-                "temperature": 0.0
+                "temperature": 0.0,
+                "stream": True,
+                "stream_options": {"include_usage": True}
             }
         
+        result = {
+            'timestamp': timestamp,
+            'request_id': self.request_id,
+            'launch_time': launch_time,
+            'latency': 0.0,
+            'ttft': 0.0,
+            'itls': array('f'),  # Inter-arrival times of the tokens after the first one
+            'connect_time': 0.0,
+            'queue_time': launch_time - enqueue_time,  # Client lag behind the schedule and wait for a slot
+            'prompt_tokens': 0,
+            'completion_tokens': 0,
+            'total_tokens': 0,
+            'error': None
+        }
+        
+        trace_ctx = {}
+        first_token_time = None
+        last_token_time = None
+        num_chunks = 0
+        usage = None
+        if not admitted:
+            result['error'] = "rejected: client pending queue is full"
+            return result
+        self.admission.record_queue_time(result['queue_time'])
         try:
-            async with aiohttp.ClientSession() as session:
-                async with session.post(url, json=payload) as response:
-                    request_end_time = time.time()
-                    latency = request_end_time - request_start_time
-                    
-                    if response.status == 200:
-                        data = await response.json()
+            async with self.session.post(url, json=payload, trace_request_ctx=trace_ctx) as response:
+                if response.status != 200:
+                    error_text = await response.text()
+                    result['error'] = f"HTTP {response.status}: {error_text}"
+                else:
+                    async for line in response.content:
+                        line = line.strip()
+                        if not line.startswith(b"data:"):
+                            continue
+                        data = line[len(b"data:"):].strip()
+                        if data == b"[DONE]":
+                            break
+                        chunk = json.loads(data)
                         
-                        # Extract token counts
-                        usage = data.get("usage", {})
-                        prompt_tokens = usage.get("prompt_tokens", 0)
-                        completion_tokens = usage.get("completion_tokens", 0)
-                        total_tokens = prompt_tokens + completion_tokens
+                        # The final chunk only carries the usage when include_usage is set
+                        if chunk.get("usage"):
+                            usage = chunk["usage"]
+                        choices = chunk.get("choices")
+                        if not choices:
+                            continue
+                        if self.api_type == "chat":
+                            text = choices[0].get("delta", {}).get("content")
+                        else:
+                            text = choices[0].get("text")
+                        if not text:
+                            continue
                         
-                        return {
-                            'timestamp': timestamp,
-                            'request_id': self.request_id,
-                            'latency': latency,
-                            'prompt_tokens': prompt_tokens,
-                            'completion_tokens': completion_tokens,
-                            'total_tokens': total_tokens,
-                            'error': None
-                        }
-                    else:
-                        error_text = await response.text()
-                        return {
-                            'timestamp': timestamp,
-                            'request_id': self.request_id,
-                            'latency': latency,
-                            'prompt_tokens': 0,
-                            'completion_tokens': 0,
-                            'total_tokens': 0,
-                            'error': f"HTTP {response.status}: {error_text}"
-                        }
+                        now = time.perf_counter()
+                        if first_token_time is None:
+                            first_token_time = now
+                        else:
+                            result['itls'].append(now - last_token_time)
+                        last_token_time = now
+                        num_chunks += 1
         
         except Exception as e:
-            request_end_time = time.time()
-            latency = request_end_time - request_start_time
-            return {
-                'timestamp': timestamp,
-                'request_id': self.request_id,
-                'latency': latency,
-                'prompt_tokens': 0,
-                'completion_tokens': 0,
-                'total_tokens': 0,
-                'error': str(e)
-            }
+            result['error'] = str(e)
+        finally:
+            self.admission.release()
+        
+        result['connect_time'] = trace_ctx.get('connect_time', 0.0)
+        # Requests that never got a connection fall back to the request start
+        connected_at = trace_ctx.get('connected_at', request_start)
+        result['latency'] = time.perf_counter() - connected_at
+        if first_token_time is not None:
+            result['ttft'] = first_token_time - connected_at
+        elif result['error'] is None:
+            result['error'] = "No tokens received in the streaming response"
+        
+        if usage is not None:
+            result['prompt_tokens'] = usage.get("prompt_tokens", 0)
+            result['completion_tokens'] = usage.get("completion_tokens", 0)
+        else:
+            # Servers without usage reporting: count streamed chunks instead
+            result['completion_tokens'] = num_chunks
+        result['total_tokens'] = result['prompt_tokens'] + result['completion_tokens']
+        return result
+    
+    def record_result(self, result: Dict[str, Any]):
+        """Append the row of one finished request to the output csv and update the running statistics."""
+        # Extract values with defaults
+        launch_time = result.get('launch_time', 0)
+        latency = result.get('latency', 0)
+        ttft = result.get('ttft', 0)
+        connect_time = result.get('connect_time', 0.0)
+        
+        # Convert result format to match expected fields
+        self.csv_writer.writerow({
+            'launch_time': launch_time,  # Wall-clock time the request was sent
+            'finish_time': launch_time + connect_time + latency,  # Arrival of the last token
+            'ttft': ttft,  # Measured time to first streamed token
+            'generation_time': latency - ttft if ttft > 0 else 0,  # First token to last token
+            'prompt_tokens': result.get('prompt_tokens', 0),
+            'generation_tokens': result.get('completion_tokens', 0),  # Rename completion_tokens to generation_tokens
+            'total_tokens': result.get('total_tokens', 0),
+            'connect_time': connect_time,  # Time spent acquiring a pooled connection
+            'queue_time': result.get('queue_time', 0.0),  # Time spent waiting for an in-flight slot
+            'itls': encode_itls(result.get('itls', [])),  # Packed float32 gaps between streamed tokens
+            'error': result.get('error', '')
+        })
+        
+        self.num_results += 1
+        self.latency_sum += latency
+        self.connect_sketch.add(connect_time)
+        if not result.get('error'):
+            self.ttft_sketch.add(ttft)
+            self.itl_sketch.add_many(result.get('itls', []))
     
     async def run_timed_replay(self):
-        """Run replay preserving original timing."""
+        """Run replay preserving original timing.
+
+        Entries are pulled lazily from the sorted trace and only the next send
+        is armed at any time, so the number of live tasks is bounded by the
+        requests in flight rather than by the length of the trace.
+        """
         if not self.dataset.requests:
             print("No requests to replay!")
             return
@@ -319,49 +620,31 @@ class TraceReplayerBenchmark:
         completed_requests = 0
         successful_requests = 0
         failed_requests = 0
+        in_flight = 0
+        max_in_flight = 0
         start_time = time.time()
         
         # Progress reporting intervals
         progress_intervals = [0.1, 0.25, 0.5, 0.75, 0.9, 0.95, 0.99]
         reported_intervals = set()
+        total_latency = 0
+        total_tokens_generated = 0
         
-        tasks = []
+        pending = set()
         
-        async def schedule_request(entry, request_index):
-            nonlocal completed_requests, successful_requests, failed_requests
-            
-            # Use the pre-calculated relative timestamp
-            delay = entry['relative_timestamp'] * self.time_scale
-            
-            # Cap delay if max_delay is set (useful for testing with production traces)
-            if self.max_delay is not None and delay > self.max_delay:
-                delay = self.max_delay
-            
-            if delay > 0:
-                await asyncio.sleep(delay)
-            
-            # Log first few requests for visibility
-            if request_index < 5:
-                delay_info = f"delay={delay:.3f}s"
-                if self.max_delay is not None and entry['relative_timestamp'] * self.time_scale > self.max_delay:
-                    original_delay = entry['relative_timestamp'] * self.time_scale
-                    delay_info = f"delay={delay:.3f}s (capped from {original_delay:.1f}s)"
-                print(f"📤 Request {request_index + 1}: input_len={entry['input_length']}, output_len={entry['output_length']}, {delay_info}")
-            
-            # Generate synthetic prompt using hash_ids and input_length from trace
-            prompt = self.dataset.generate_synthetic_prompt(
-                entry['hash_ids'], 
-                entry['input_length']
-            )
+        async def dispatch_request(entry, prompt, request_index, scheduled_time):
+            nonlocal completed_requests, successful_requests, failed_requests, in_flight
+            nonlocal total_latency, total_tokens_generated
             
             # Send request and track timing
-            request_start = time.time()
             result = await self.send_request(
                 prompt, 
                 entry['output_length'],  # Use exact output_length from trace
-                entry['relative_timestamp']
+                entry['relative_timestamp'],
+                scheduled_time
             )
-            request_end = time.time()
+            in_flight -= 1
+            self.record_result(result)
             
             # Update counters
             completed_requests += 1
@@ -371,6 +654,8 @@ class TraceReplayerBenchmark:
                     print(f"❌ Request {request_index + 1} failed: {result['error']}")
             else:
                 successful_requests += 1
+                total_latency += result.get('latency', 0)
+                total_tokens_generated += result.get('completion_tokens', 0)
             
             # Progress reporting
             progress = completed_requests / total_requests
@@ -381,97 +666,134 @@ class TraceReplayerBenchmark:
                     rate = completed_requests / elapsed if elapsed > 0 else 0
                     print(f"🔄 Progress: {progress*100:.0f}% ({completed_requests}/{total_requests}) | "
                           f"Success: {successful_requests} | Failed: {failed_requests} | "
-                          f"Rate: {rate:.1f} req/s | Elapsed: {elapsed:.1f}s")
+                          f"Rate: {rate:.1f} req/s | In flight: {in_flight} | Elapsed: {elapsed:.1f}s")
                     break
-            
-            return result
         
-        # Schedule all requests with their index for logging
+        def on_dispatch_done(task):
+            pending.discard(task)
+            if not task.cancelled() and task.exception() is not None:
+                print(f"❌ Exception during request: {task.exception()}")
+        
+        print(f"⏱️  Dispatching {total_requests} requests lazily from the trace...")
         for index, entry in enumerate(self.dataset.requests):
-            task = asyncio.create_task(schedule_request(entry, index))
-            tasks.append(task)
+            # Use the pre-calculated relative timestamp
+            delay = entry['relative_timestamp'] * self.time_scale
+            
+            # Cap delay if max_delay is set (useful for testing with production traces)
+            if self.max_delay is not None and delay > self.max_delay:
+                delay = self.max_delay
+            
+            # Generate synthetic prompt using hash_ids and input_length from trace
+            # before waiting, so that it stays off the send path
+            prompt = self.dataset.generate_synthetic_prompt(
+                entry['hash_ids'], 
+                entry['input_length']
+            )
+            
+            # Sleep against the absolute schedule so overshoot does not accumulate
+            wait = start_time + delay - time.time()
+            if wait > 0:
+                await asyncio.sleep(wait)
+            else:
+                # Behind schedule or a burst of equal timestamps: still let the
+                # running streams read their chunks between two dispatches
+                await asyncio.sleep(0)
+            
+            # Log first few requests for visibility
+            if index < 5:
+                delay_info = f"delay={delay:.3f}s"
+                if self.max_delay is not None and entry['relative_timestamp'] * self.time_scale > self.max_delay:
+                    original_delay = entry['relative_timestamp'] * self.time_scale
+                    delay_info = f"delay={delay:.3f}s (capped from {original_delay:.1f}s)"
+                print(f"📤 Request {index + 1}: input_len={entry['input_length']}, output_len={entry['output_length']}, {delay_info}")
+            
+            in_flight += 1
+            max_in_flight = max(max_in_flight, in_flight)
+            task = asyncio.create_task(dispatch_request(entry, prompt, index, start_time + delay))
+            pending.add(task)
+            task.add_done_callback(on_dispatch_done)
         
-        # Wait for all requests to complete
-        print(f"⏱️  Scheduling {len(tasks)} requests...")
-        results = await asyncio.gather(*tasks, return_exceptions=True)
+        # Wait for the outstanding requests to complete
+        if pending:
+            await asyncio.gather(*pending, return_exceptions=True)
         total_time = time.time() - start_time
         
-        # Process results and show final summary
-        successful = 0
-        failed = 0
-        total_latency = 0
-        total_tokens_generated = 0
-        
-        for result in results:
-            if isinstance(result, Exception):
-                failed += 1
-                print(f"❌ Exception during request: {result}")
-            elif result.get('error'):
-                failed += 1
-            else:
-                successful += 1
-                total_latency += result.get('latency', 0)
-                total_tokens_generated += result.get('completion_tokens', 0)
+        successful = successful_requests
+        failed = total_requests - successful  # Failed requests and requests that raised
         
         # Final statistics
         print(f"\n🎯 Timed Replay Complete!")
         print(f"📊 Final Statistics:")
-        print(f"   • Total requests: {len(results)}")
+        print(f"   • Total requests: {total_requests}")
         print(f"   • Successful: {successful}")
         print(f"   • Failed: {failed}")
-        print(f"   • Success rate: {(successful/len(results)*100):.1f}%" if results else "0%")
+        print(f"   • Success rate: {(successful/total_requests*100):.1f}%")
         print(f"   • Total time: {total_time:.2f}s")
-        print(f"   • Average rate: {len(results)/total_time:.1f} req/s" if total_time > 0 else "∞ req/s")
+        print(f"   • Average rate: {total_requests/total_time:.1f} req/s" if total_time > 0 else "∞ req/s")
+        print(f"   • Max requests in flight: {max_in_flight}")
         if successful > 0:
             print(f"   • Average latency: {total_latency/successful:.3f}s")
             print(f"   • Total tokens generated: {total_tokens_generated}")
             print(f"   • Token generation rate: {total_tokens_generated/total_time:.1f} tokens/s" if total_time > 0 else "∞ tokens/s")
-        
-        self.results.extend([r for r in results if not isinstance(r, Exception)])
     
     async def run_qps_replay(self):
-        """Run replay at a fixed QPS rate."""
+        """Run an open-loop replay at a fixed or Poisson QPS rate.
+
+        Requests are dispatched on their own schedule regardless of how many
+        are still outstanding, so a slow server does not lower the offered load.
+        """
         if not self.dataset.requests:
             print("No requests to replay!")
             return
         
-        print(f"📊 Starting QPS-controlled replay at {self.qps} QPS")
+        print(f"📊 Starting open-loop QPS replay at {self.qps} QPS ({self.arrival_process} arrivals)")
         print(f"📋 Will process {len(self.dataset.requests)} requests from trace")
         
         # Calculate interval between requests
         interval = 1.0 / self.qps if self.qps > 0 else 0
-        print(f"⏱️  Request interval: {interval:.3f}s between requests")
+        if self.arrival_process == "poisson":
+            print(f"⏱️  Mean request interval: {interval:.3f}s (exponentially distributed)")
+        else:
+            print(f"⏱️  Request interval: {interval:.3f}s between requests")
+        rng = random.Random(self.seed)
         
         # Progress tracking
         total_requests = len(self.dataset.requests)
         completed_requests = 0
         successful_requests = 0
         failed_requests = 0
+        in_flight = 0
+        max_in_flight = 0
         start_time = time.time()
         
         # Progress reporting intervals
         progress_intervals = [0.1, 0.25, 0.5, 0.75, 0.9, 0.95, 0.99]
         reported_intervals = set()
         
-        for i, entry in enumerate(self.dataset.requests):
-            # Log first few requests for visibility
-            if i < 5:
-                print(f"📤 Request {i + 1}: input_len={entry['input_length']}, output_len={entry['output_length']}")
-            
-            # Generate synthetic prompt using hash_ids and input_length from trace
-            prompt = self.dataset.generate_synthetic_prompt(
-                entry['hash_ids'], 
-                entry['input_length']
-            )
+        total_latency = 0
+        total_tokens_generated = 0
+        
+        # Wall-clock span of the requests actually sent, for the achieved send rate
+        num_sent = 0
+        first_launch_time = float('inf')
+        last_launch_time = float('-inf')
+        
+        async def dispatch_request(entry, prompt, request_index, scheduled_time):
+            nonlocal completed_requests, successful_requests, failed_requests, in_flight
+            nonlocal num_sent, first_launch_time, last_launch_time, total_latency, total_tokens_generated
             
-            # Send request and track timing
-            request_start = time.time()
+            # Stamped with the scheduled send time, so that client lag is not hidden
             result = await self.send_request(
                 prompt, 
                 entry['output_length'],  # Use exact output_length from trace
-                time.time()
+                scheduled_time,
+                scheduled_time
             )
-            request_end = time.time()
+            in_flight -= 1
+            num_sent += 1
+            first_launch_time = min(first_launch_time, result['launch_time'])
+            last_launch_time = max(last_launch_time, result['launch_time'])
+            self.record_result(result)
             
             # Update counters
             completed_requests += 1
@@ -481,19 +803,19 @@ class TraceReplayerBenchmark:
                     error_msg = result['error']
                     # Clean up error messages for common cases
                     if "maximum context length" in error_msg:
-                        print(f"❌ Request {i + 1} failed: Context length exceeded")
+                        print(f"❌ Request {request_index + 1} failed: Context length exceeded")
                     elif "HTTP" in error_msg and "400" in error_msg:
-                        print(f"❌ Request {i + 1} failed: Bad request (likely context/token limit)")
+                        print(f"❌ Request {request_index + 1} failed: Bad request (likely context/token limit)")
                     elif "HTTP" in error_msg:
-                        print(f"❌ Request {i + 1} failed: {error_msg.split(':')[0]}")  # Just show HTTP status
+                        print(f"❌ Request {request_index + 1} failed: {error_msg.split(':')[0]}")  # Just show HTTP status
                     else:
-                        print(f"❌ Request {i + 1} failed: {error_msg}")
+                        print(f"❌ Request {request_index + 1} failed: {error_msg}")
                 elif failed_requests == 4:
                     print(f"❌ ... (suppressing further error messages, {failed_requests} total failures so far)")
             else:
                 successful_requests += 1
-            
-            self.results.append(result)
+                total_latency += result.get('latency', 0)
+                total_tokens_generated += result.get('completion_tokens', 0)
             
             # Progress reporting
             progress = completed_requests / total_requests
@@ -504,85 +826,112 @@ class TraceReplayerBenchmark:
                     actual_rate = completed_requests / elapsed if elapsed > 0 else 0
                     print(f"🔄 Progress: {progress*100:.0f}% ({completed_requests}/{total_requests}) | "
                           f"Success: {successful_requests} | Failed: {failed_requests} | "
-                          f"Target: {self.qps:.1f} req/s | Actual: {actual_rate:.1f} req/s | Elapsed: {elapsed:.1f}s")
+                          f"Target: {self.qps:.1f} req/s | Completed: {actual_rate:.1f} req/s | "
+                          f"In flight: {in_flight} | Elapsed: {elapsed:.1f}s")
                     break
+        
+        def on_dispatch_done(task):
+            pending.discard(task)
+            if not task.cancelled() and task.exception() is not None:
+                print(f"❌ Exception during request: {task.exception()}")
+        
+        # Dispatch against an absolute schedule so that sleep overshoot and
+        # slow responses never accumulate into a lower offered rate. Finished
+        # tasks drop out of pending, so only the requests in flight are kept
+        pending = set()
+        next_send_time = start_time
+        for i, entry in enumerate(self.dataset.requests):
+            # Generate synthetic prompt using hash_ids and input_length from trace
+            # before waiting, so that it stays off the send path
+            prompt = self.dataset.generate_synthetic_prompt(
+                entry['hash_ids'], 
+                entry['input_length']
+            )
+            
+            delay = next_send_time - time.time()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            else:
+                # Behind schedule: yield so the requests already in flight keep streaming
+                await asyncio.sleep(0)
+            
+            # Log first few requests for visibility
+            if i < 5:
+                print(f"📤 Request {i + 1}: input_len={entry['input_length']}, output_len={entry['output_length']}")
+            
+            in_flight += 1
+            max_in_flight = max(max_in_flight, in_flight)
+            task = asyncio.create_task(dispatch_request(entry, prompt, i, next_send_time))
+            pending.add(task)
+            task.add_done_callback(on_dispatch_done)
             
-            # Rate limiting
-            if interval > 0 and i < len(self.dataset.requests) - 1:
-                await asyncio.sleep(interval)
+            if interval > 0:
+                if self.arrival_process == "poisson":
+                    next_send_time += rng.expovariate(self.qps)
+                else:
+                    next_send_time += interval
+        
+        print(f"📨 All {total_requests} requests dispatched in {time.time() - start_time:.2f}s, "
+              f"waiting for {in_flight} outstanding requests...")
+        
+        if pending:
+            await asyncio.gather(*pending, return_exceptions=True)
+        
+        # Measured on the launch times of the requests, i.e. when they actually
+        # went out; n requests span n - 1 inter-arrival gaps
+        send_duration = last_launch_time - first_launch_time
+        achieved_send_rate = (num_sent - 1) / send_duration if send_duration > 0 else float('inf')
         
         # Final statistics
         total_time = time.time() - start_time
-        total_latency = sum(r.get('latency', 0) for r in self.results if not r.get('error'))
-        total_tokens_generated = sum(r.get('completion_tokens', 0) for r in self.results if not r.get('error'))
         
         print(f"\n🎯 QPS Replay Complete!")
         print(f"📊 Final Statistics:")
-        print(f"   • Total requests: {len(self.results)}")
+        print(f"   • Total requests: {completed_requests}")
         print(f"   • Successful: {successful_requests}")
         print(f"   • Failed: {failed_requests}")
-        print(f"   • Success rate: {(successful_requests/len(self.results)*100):.1f}%" if self.results else "0%")
+        print(f"   • Success rate: {(successful_requests/completed_requests*100):.1f}%" if completed_requests else "0%")
         print(f"   • Total time: {total_time:.2f}s")
-        print(f"   • Target QPS: {self.qps:.1f} req/s")
-        print(f"   • Actual rate: {len(self.results)/total_time:.1f} req/s" if total_time > 0 else "∞ req/s")
+        print(f"   • Arrival process: {self.arrival_process}")
+        print(f"   • Target send rate: {self.qps:.2f} req/s")
+        print(f"   • Achieved send rate: {achieved_send_rate:.2f} req/s")
+        print(f"   • Completion rate: {completed_requests/total_time:.2f} req/s" if total_time > 0 else "∞ req/s")
+        print(f"   • Max requests in flight: {max_in_flight}")
         if successful_requests > 0:
             print(f"   • Average latency: {total_latency/successful_requests:.3f}s")
             print(f"   • Total tokens generated: {total_tokens_generated}")
             print(f"   • Token generation rate: {total_tokens_generated/total_time:.1f} tokens/s" if total_time > 0 else "∞ tokens/s")
         
-        print(f"QPS replay completed. Successful requests: {successful_requests}/{len(self.results)}")
+        print(f"QPS replay completed. Successful requests: {successful_requests}/{completed_requests}")
     
     async def run_benchmark(self):
         """Run the benchmark."""
-        if self.preserve_timing:
-            await self.run_timed_replay()
-        else:
-            await self.run_qps_replay()
-        
-        # Save results
-        if self.results:
-            print(f"\n💾 Saving results to {self.output_file}...")
-            with open(self.output_file, 'w', newline='') as csvfile:
-                # Use field names expected by post-processing scripts
-                fieldnames = ['launch_time', 'finish_time', 'ttft', 'generation_time', 'prompt_tokens', 'generation_tokens', 'total_tokens', 'error']
-                writer = csv.DictWriter(csvfile, fieldnames=fieldnames)
-                writer.writeheader()
-                for result in self.results:
-                    # Extract values with defaults
-                    timestamp = result.get('timestamp', 0)
-                    latency = result.get('latency', 0)
-                    prompt_tokens = result.get('prompt_tokens', 0)
-                    completion_tokens = result.get('completion_tokens', 0)
-                    total_tokens = result.get('total_tokens', 0)
-                    error = result.get('error', '')
-                    
-                    # Calculate realistic timing estimates
-                    if error or completion_tokens == 0:
-                        # For errors or no tokens generated, set minimal realistic values
-                        ttft = min(latency * 0.5, 1.0)  # Cap TTFT at 1 second for errors
-                        generation_time = max(latency - ttft, 0.001)  # Ensure positive generation time
-                    else:
-                        # For successful requests, estimate based on token generation
-                        # Assume TTFT is time to generate first token + processing overhead
-                        estimated_ttft = min(latency * 0.2, 2.0)  # 20% of latency, capped at 2s
-                        generation_time = max(latency - estimated_ttft, 0.001)  # Ensure positive
-                        ttft = estimated_ttft
-                    
-                    # Convert result format to match expected fields
-                    converted_result = {
-                        'launch_time': timestamp,  # Use timestamp as launch_time
-                        'finish_time': timestamp + latency,  # launch_time + latency
-                        'ttft': ttft,  # Time to first token (realistic estimate)
-                        'generation_time': generation_time,  # Time to generate remaining tokens
-                        'prompt_tokens': prompt_tokens,
-                        'generation_tokens': completion_tokens,  # Rename completion_tokens to generation_tokens
-                        'total_tokens': total_tokens,
-                        'error': error
-                    }
-                    writer.writerow(converted_result)
-            print(f"✅ Results saved successfully!")
-            print(f"📈 Total requests processed: {len(self.results)}")
-            print(f"📊 Average latency: {sum(r.get('latency', 0) for r in self.results) / len(self.results):.2f}s")
+        self.session = self.create_session()
+        # Results are streamed to the output file as the requests finish
+        self.csv_file = open(self.output_file, 'w', newline='')
+        self.csv_writer = csv.DictWriter(self.csv_file, fieldnames=RESULT_FIELDS)
+        self.csv_writer.writeheader()
+        try:
+            if self.preserve_timing:
+                await self.run_timed_replay()
+            else:
+                await self.run_qps_replay()
+        finally:
+            await self.session.close()
+            self.csv_file.close()
+        
+        if self.num_results:
+            print(f"\n💾 Results saved to {self.output_file}")
+            print(f"📈 Total requests processed: {self.num_results}")
+            print(f"📊 Average latency: {self.latency_sum / self.num_results:.2f}s")
+            if self.ttft_sketch.count:
+                print(f"⚡ TTFT: mean {self.ttft_sketch.mean*1000:.2f}ms, p99 {self.ttft_sketch.quantile(0.99)*1000:.2f}ms")
+                if self.itl_sketch.count:
+                    print(f"⏱️  ITL: mean {self.itl_sketch.mean*1000:.2f}ms, p99 {self.itl_sketch.quantile(0.99)*1000:.2f}ms")
+            print(f"🔌 Connection acquire time: mean {self.connect_sketch.mean*1000:.2f}ms, "
+                  f"p99 {self.connect_sketch.quantile(0.99)*1000:.2f}ms")
+            if self.admission.max_in_flight is not None:
+                print(f"🚦 Admission control: {self.admission}")
         else:
             print("⚠️ No results to save!")
         
@@ -605,14 +954,36 @@ def main():
     parser.add_argument('--qps', type=float, default=1.0, help='Queries per second (for QPS mode)')
     parser.add_argument('--api-type', choices=['completions', 'chat'], default='completions',
                        help='API type to use')
+    parser.add_argument('--arrival-process', choices=['fixed', 'poisson'], default='fixed',
+                       help='Inter-arrival distribution for QPS mode (fixed interval or Poisson)')
+    parser.add_argument('--seed', type=int, default=0,
+                       help='Random seed for Poisson arrivals')
+    
+    # Connection pool options
+    parser.add_argument('--max-connections', type=int, default=0,
+                       help='Maximum pooled connections shared by all requests (0 = no limit)')
+    parser.add_argument('--max-connections-per-host', type=int, default=0,
+                       help='Maximum pooled connections per host (0 = no limit)')
+    parser.add_argument('--keepalive-timeout', type=float, default=60.0,
+                       help='Seconds an idle pooled connection is kept alive for reuse')
+    parser.add_argument('--max-in-flight', type=int, default=None,
+                       help='Maximum requests in flight; later requests wait on the client and the wait '
+                            'is recorded as queue_time instead of TTFT (default: no cap)')
+    parser.add_argument('--max-pending', type=int, default=None,
+                       help='Maximum requests waiting for an in-flight slot; further requests are rejected '
+                            '(default: unbounded)')
     
     # Trace replayer specific parameters  
     parser.add_argument('--trace-file', default='traces/gmi_trace.jsonl', 
-                       help='Path to trace file in JSONL format')
+                       help='Path to a JSONL trace file or a compiled .lmtrace directory (see compile_trace.py)')
     parser.add_argument('--start-time', type=float, default=0, 
                        help='Start time in seconds (relative to trace start)')
     parser.add_argument('--duration', type=float, default=60, 
                        help='Duration to replay in seconds (-1 for full trace duration)')
+    parser.add_argument('--block-size', type=int, default=None,
+                       help='Tokens per trace hash_id block (default: inferred from the trace, e.g. 512 for Mooncake)')
+    parser.add_argument('--tokenizer', default=None,
+                       help='Tokenizer that hash blocks and prompt lengths are counted in (default: the model\'s)')
     
     # Timing options
     parser.add_argument('--preserve-timing', action='store_true',
@@ -645,7 +1016,7 @@ def main():
         print(f"🕐 Using TIME_SCALE: {args.time_scale} (consider using --speed-up for more intuitive control)")
     
     if not args.preserve_timing:
-        print(f"   • QPS Mode: {args.qps} req/s")
+        print(f"   • QPS Mode: {args.qps} req/s (open loop, {args.arrival_process} arrivals)")
     
     print(f"   • Output File: {args.output}")
     print("=" * 60)
@@ -653,7 +1024,11 @@ def main():
     # Run benchmark
     benchmark = TraceReplayerBenchmark(args.model, args.base_url, args.output, args.trace_file, 
                  start_time=args.start_time, duration=args.duration, preserve_timing=args.preserve_timing,
-                 time_scale=args.time_scale, qps=args.qps, api_type=args.api_type, max_delay=args.max_delay)
+                 time_scale=args.time_scale, qps=args.qps, api_type=args.api_type, max_delay=args.max_delay,
+                 arrival_process=args.arrival_process, seed=args.seed,
+                 max_connections=args.max_connections, max_connections_per_host=args.max_connections_per_host,
+                 keepalive_timeout=args.keepalive_timeout, block_size=args.block_size,
+                 max_in_flight=args.max_in_flight, max_pending=args.max_pending, tokenizer=args.tokenizer)
     asyncio.run(benchmark.run_benchmark())
 
 if __name__ == "__main__":
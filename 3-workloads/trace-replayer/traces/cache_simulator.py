@@ -0,0 +1,441 @@
+#!/usr/bin/env python3
+"""
+Finite-capacity KV cache simulator for trace files.
+
+Replays a JSONL trace's hash_ids against a tiered KV cache (GPU HBM, CPU
+offload, remote) of a fixed number of blocks per tier and reports the hit rate
+of each tier, overall and per time window. Unlike the infinite-cache
+"theoretical hit rate", this predicts how much CPU offload capacity a trace
+needs before spending GPU hours on it.
+
+Lookups follow prefix caching semantics: a request's blocks are looked up in
+order, each in GPU, then CPU, then remote, and reuse stops at the first block
+that no tier holds. Every block of the request then ends up in the GPU tier.
+
+Tier modes:
+  write-through  every block is also stored in the lower tiers (LMCache offload)
+  demote         tiers are exclusive; GPU victims move to CPU, CPU victims to remote
+
+Eviction policies: lru, lfu, arc, prefix (evict prefix-tree leaves in LRU order,
+so a shared prefix is never dropped before the suffixes built on it).
+
+Usage:
+  python cache_simulator.py mooncake_trace.jsonl --gpu-blocks 2000 --cpu-blocks 5000 20000 \\
+      --policies lru arc prefix --output cache_sim.json
+"""
+
+import argparse
+import heapq
+import json
+import sys
+from collections import OrderedDict
+from typing import Dict, List, Optional
+
+
+class EvictionPolicy:
+    """A fixed-capacity set of cached blocks that picks its own victims."""
+
+    def __init__(self, capacity: int):
+        self.capacity = capacity
+
+    def __contains__(self, key: int) -> bool:
+        raise NotImplementedError
+
+    def __len__(self) -> int:
+        raise NotImplementedError
+
+    def access(self, key: int):
+        """Record a hit on a cached block."""
+        raise NotImplementedError
+
+    def insert(self, key: int, parent: Optional[int]) -> List[int]:
+        """Cache a new block (whose prefix predecessor is parent) and return the evicted blocks."""
+        raise NotImplementedError
+
+    def remove(self, key: int):
+        """Drop a cached block without counting it as an eviction."""
+        raise NotImplementedError
+
+
+class LRUPolicy(EvictionPolicy):
+    """Least recently used."""
+
+    def __init__(self, capacity: int):
+        super().__init__(capacity)
+        self.entries = OrderedDict()
+
+    def __contains__(self, key):
+        return key in self.entries
+
+    def __len__(self):
+        return len(self.entries)
+
+    def access(self, key):
+        self.entries.move_to_end(key)
+
+    def insert(self, key, parent):
+        self.entries[key] = None
+        evicted = []
+        while len(self.entries) > self.capacity:
+            evicted.append(self.entries.popitem(last=False)[0])
+        return evicted
+
+    def remove(self, key):
+        self.entries.pop(key, None)
+
+
+class LFUPolicy(EvictionPolicy):
+    """Least frequently used, ties broken by least recent use (O(1) frequency buckets)."""
+
+    def __init__(self, capacity: int):
+        super().__init__(capacity)
+        self.frequency = {}
+        self.buckets = {}  # frequency -> OrderedDict of keys in LRU order
+        self.min_frequency = 0
+
+    def __contains__(self, key):
+        return key in self.frequency
+
+    def __len__(self):
+        return len(self.frequency)
+
+    def _unlink(self, key):
+        frequency = self.frequency[key]
+        bucket = self.buckets[frequency]
+        del bucket[key]
+        if not bucket:
+            del self.buckets[frequency]
+            if self.min_frequency == frequency:
+                self.min_frequency = frequency + 1
+        return frequency
+
+    def access(self, key):
+        frequency = self._unlink(key) + 1
+        self.frequency[key] = frequency
+        self.buckets.setdefault(frequency, OrderedDict())[key] = None
+
+    def insert(self, key, parent):
+        evicted = []
+        while len(self.frequency) >= self.capacity and self.frequency:
+            victim, _ = self.buckets[self.min_frequency].popitem(last=False)
+            if not self.buckets[self.min_frequency]:
+                del self.buckets[self.min_frequency]
+            del self.frequency[victim]
+            if self.frequency and self.min_frequency not in self.buckets:
+                self.min_frequency = min(self.buckets)
+            evicted.append(victim)
+        self.frequency[key] = 1
+        self.buckets.setdefault(1, OrderedDict())[key] = None
+        self.min_frequency = 1
+        return evicted
+
+    def remove(self, key):
+        if key in self.frequency:
+            self._unlink(key)
+            del self.frequency[key]
+            if self.frequency and self.min_frequency not in self.buckets:
+                self.min_frequency = min(self.buckets)
+
+
+class ARCPolicy(EvictionPolicy):
+    """Adaptive Replacement Cache (Megiddo and Modha), balancing recency against frequency."""
+
+    def __init__(self, capacity: int):
+        super().__init__(capacity)
+        self.t1 = OrderedDict()  # Seen once recently
+        self.t2 = OrderedDict()  # Seen at least twice recently
+        self.b1 = OrderedDict()  # Ghost entries evicted from t1
+        self.b2 = OrderedDict()  # Ghost entries evicted from t2
+        self.p = 0  # Target size of t1
+
+    def __contains__(self, key):
+        return key in self.t1 or key in self.t2
+
+    def __len__(self):
+        return len(self.t1) + len(self.t2)
+
+    def access(self, key):
+        if key in self.t1:
+            del self.t1[key]
+        else:
+            del self.t2[key]
+        self.t2[key] = None
+
+    def _replace(self, in_b2: bool) -> int:
+        if self.t1 and (len(self.t1) > self.p or (in_b2 and len(self.t1) == self.p) or not self.t2):
+            victim, _ = self.t1.popitem(last=False)
+            self.b1[victim] = None
+        else:
+            victim, _ = self.t2.popitem(last=False)
+            self.b2[victim] = None
+        return victim
+
+    def insert(self, key, parent):
+        evicted = []
+        if key in self.b1:
+            # Recency miss: grow the recency side
+            self.p = min(self.capacity, self.p + max(len(self.b2) // max(len(self.b1), 1), 1))
+            del self.b1[key]
+            if len(self) >= self.capacity:
+                evicted.append(self._replace(False))
+            self.t2[key] = None
+            return evicted
+        if key in self.b2:
+            # Frequency miss: grow the frequency side
+            self.p = max(0, self.p - max(len(self.b1) // max(len(self.b2), 1), 1))
+            del self.b2[key]
+            if len(self) >= self.capacity:
+                evicted.append(self._replace(True))
+            self.t2[key] = None
+            return evicted
+
+        if len(self.t1) + len(self.b1) >= self.capacity:
+            if len(self.t1) < self.capacity:
+                if self.b1:
+                    self.b1.popitem(last=False)
+                if len(self) >= self.capacity:
+                    evicted.append(self._replace(False))
+            else:
+                victim, _ = self.t1.popitem(last=False)
+                evicted.append(victim)
+        elif len(self.t1) + len(self.t2) + len(self.b1) + len(self.b2) >= self.capacity:
+            if len(self.t1) + len(self.t2) + len(self.b1) + len(self.b2) >= 2 * self.capacity:
+                self.b2.popitem(last=False)
+            if len(self) >= self.capacity:
+                evicted.append(self._replace(False))
+        self.t1[key] = None
+        return evicted
+
+    def remove(self, key):
+        self.t1.pop(key, None)
+        self.t2.pop(key, None)
+
+
+class PrefixAwarePolicy(EvictionPolicy):
+    """
+    Evict only prefix-tree leaves (blocks with no cached successor), least recently used first.
+
+    A block's KV is only reusable if its whole prefix is cached, so evicting an
+    inner block would strand every cached block after it.
+    """
+
+    def __init__(self, capacity: int):
+        super().__init__(capacity)
+        self.last_access = {}
+        self.parent = {}
+        self.children = {}  # Cached successors of each cached block
+        self.leaf_heap = []  # (last_access, key), lazily invalidated
+        self.clock = 0
+
+    def __contains__(self, key):
+        return key in self.last_access
+
+    def __len__(self):
+        return len(self.last_access)
+
+    def _touch(self, key):
+        self.clock += 1
+        self.last_access[key] = self.clock
+        if not self.children[key]:
+            heapq.heappush(self.leaf_heap, (self.clock, key))
+
+    def access(self, key):
+        self._touch(key)
+
+    def _drop(self, key):
+        del self.last_access[key]
+        for child in self.children.pop(key):
+            self.parent[child] = None
+        parent = self.parent.pop(key)
+        if parent is not None:
+            siblings = self.children[parent]
+            siblings.discard(key)
+            if not siblings:
+                heapq.heappush(self.leaf_heap, (self.last_access[parent], parent))
+
+    def insert(self, key, parent):
+        evicted = []
+        while len(self.last_access) >= self.capacity and self.leaf_heap:
+            stamp, victim = heapq.heappop(self.leaf_heap)
+            if self.last_access.get(victim) != stamp or self.children[victim]:
+                continue  # Stale heap entry
+            self._drop(victim)
+            evicted.append(victim)
+        if parent not in self.last_access:
+            parent = None
+        self.parent[key] = parent
+        self.children[key] = set()
+        if parent is not None:
+            self.children[parent].add(key)
+        self._touch(key)
+        return evicted
+
+    def remove(self, key):
+        if key in self.last_access:
+            self._drop(key)
+
+
+POLICIES = {
+    "lru": LRUPolicy,
+    "lfu": LFUPolicy,
+    "arc": ARCPolicy,
+    "prefix": PrefixAwarePolicy,
+}
+
+TIERS = ["gpu", "cpu", "remote"]
+
+
+class TieredCache:
+    """GPU, CPU and remote tiers, each with its own capacity and a shared eviction policy type."""
+
+    def __init__(self, capacities: Dict[str, int], policy: str, mode: str):
+        self.mode = mode
+        self.tiers = [(name, POLICIES[policy](capacities[name])) for name in TIERS if capacities[name] > 0]
+
+    def lookup(self, key: int) -> Optional[str]:
+        """Return the name of the first tier holding key (recording the hit there), or None."""
+        for name, tier in self.tiers:
+            if key in tier:
+                tier.access(key)
+                return name
+        return None
+
+    def _insert(self, level: int, key: int, parent: Optional[int]):
+        name, tier = self.tiers[level]
+        if key in tier:
+            # Already cached here; only lookups count as uses of a tier
+            return
+        evicted = tier.insert(key, parent)
+        if self.mode == "demote" and level + 1 < len(self.tiers):
+            for victim in evicted:
+                self._insert(level + 1, victim, None)
+
+    def store(self, key: int, parent: Optional[int]):
+        """Place a block the request computed or loaded into the GPU tier (and below, for write-through)."""
+        if self.mode == "demote":
+            # Exclusive tiers: a promoted block leaves the lower tier
+            for _, tier in self.tiers[1:]:
+                tier.remove(key)
+            self._insert(0, key, parent)
+        else:
+            for level in range(len(self.tiers)):
+                self._insert(level, key, parent)
+
+
+def timestamp_to_seconds(timestamp: int) -> float:
+    """Convert a raw trace timestamp to seconds (nanoseconds above 1e15, otherwise milliseconds)."""
+    return timestamp / 1e9 if timestamp > 1e15 else timestamp / 1e3
+
+
+def simulate(filename: str, capacities: Dict[str, int], policy: str, mode: str, window: float) -> Dict:
+    """Replay a trace against one cache configuration and return its hit-rate summary."""
+    cache = TieredCache(capacities, policy, mode)
+    seen = set()  # Infinite-cache reference
+
+    totals = {"requests": 0, "blocks": 0, "misses": 0, "infinite_cache_hits": 0}
+    totals.update({f"{name}_hits": 0 for name in TIERS})
+    windows = []
+    current = None
+    start_seconds = None
+
+    with open(filename, 'r') as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            request = json.loads(line)
+            hash_ids = request.get("hash_ids") or []
+            seconds = timestamp_to_seconds(int(request["timestamp"]))
+            if start_seconds is None:
+                start_seconds = seconds
+            index = int((seconds - start_seconds) // window)
+            if current is None or current["window"] != index:
+                current = {"window": index, "start_s": index * window, "requests": 0, "blocks": 0, "misses": 0}
+                current.update({f"{name}_hits": 0 for name in TIERS})
+                windows.append(current)
+
+            # Prefix lookup: reuse stops at the first block no tier holds
+            hit_tiers = []
+            for hash_id in hash_ids:
+                tier = cache.lookup(hash_id)
+                if tier is None:
+                    break
+                hit_tiers.append(tier)
+            infinite_hits = 0
+            for hash_id in hash_ids:
+                if hash_id not in seen:
+                    break
+                infinite_hits += 1
+            seen.update(hash_ids)
+
+            parent = None
+            for hash_id in hash_ids:
+                cache.store(hash_id, parent)
+                parent = hash_id
+
+            misses = len(hash_ids) - len(hit_tiers)
+            for bucket in (totals, current):
+                bucket["requests"] += 1
+                bucket["blocks"] += len(hash_ids)
+                bucket["misses"] += misses
+                for tier in hit_tiers:
+                    bucket[f"{tier}_hits"] += 1
+            totals["infinite_cache_hits"] += infinite_hits
+
+    def hit_rates(bucket):
+        blocks = bucket["blocks"]
+        rates = {f"{name}_hit_rate": bucket[f"{name}_hits"] / blocks if blocks else 0.0 for name in TIERS}
+        rates["total_hit_rate"] = (blocks - bucket["misses"]) / blocks if blocks else 0.0
+        return rates
+
+    for bucket in windows:
+        bucket.update(hit_rates(bucket))
+    summary = dict(totals)
+    summary.update(hit_rates(totals))
+    summary["infinite_cache_hit_rate"] = totals["infinite_cache_hits"] / totals["blocks"] if totals["blocks"] else 0.0
+
+    return {
+        "policy": policy,
+        "mode": mode,
+        "capacity_blocks": dict(capacities),
+        "summary": summary,
+        "windows": windows,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Simulate tiered KV cache hit rates for a trace")
+    parser.add_argument('trace_file', nargs='?', default='gmi_trace.jsonl', help='JSONL trace file (default: gmi_trace.jsonl)')
+    parser.add_argument('--gpu-blocks', type=int, default=1000, help='GPU HBM capacity in blocks (default: 1000)')
+    parser.add_argument('--cpu-blocks', type=int, nargs='+', default=[0],
+                        help='CPU offload capacity in blocks; several values run a sweep (default: 0, disabled)')
+    parser.add_argument('--remote-blocks', type=int, default=0, help='Remote tier capacity in blocks (default: 0, disabled)')
+    parser.add_argument('--policies', nargs='+', choices=sorted(POLICIES), default=['lru'],
+                        help='Eviction policies to compare (default: lru)')
+    parser.add_argument('--mode', choices=['write-through', 'demote'], default='write-through',
+                        help='How lower tiers are filled (default: write-through, as LMCache offloading does)')
+    parser.add_argument('--window', type=float, default=60.0, help='Time window for hit rates over time, in seconds (default: 60)')
+    parser.add_argument('--output', default=None, help='Also write the JSON results to this file')
+    args = parser.parse_args()
+
+    results = []
+    for policy in args.policies:
+        for cpu_blocks in args.cpu_blocks:
+            capacities = {"gpu": args.gpu_blocks, "cpu": cpu_blocks, "remote": args.remote_blocks}
+            result = simulate(args.trace_file, capacities, policy, args.mode, args.window)
+            summary = result["summary"]
+            print(f"{policy:>6} gpu={args.gpu_blocks} cpu={cpu_blocks} remote={args.remote_blocks}: "
+                  f"hit rate {summary['total_hit_rate']:.3f} (gpu {summary['gpu_hit_rate']:.3f}, "
+                  f"cpu {summary['cpu_hit_rate']:.3f}, remote {summary['remote_hit_rate']:.3f}, "
+                  f"infinite {summary['infinite_cache_hit_rate']:.3f})", file=sys.stderr)
+            results.append(result)
+
+    output = {"trace_file": args.trace_file, "window_seconds": args.window, "results": results}
+    print(json.dumps(output, indent=2))
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(output, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
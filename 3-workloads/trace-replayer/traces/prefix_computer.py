@@ -1,33 +1,182 @@
 #!/usr/bin/env python3
+"""
+Prefix reuse analyzer for trace files.
 
+Streams a JSONL trace in chronological order and inserts every request's
+hash_ids into a prefix trie, computing in a single linear pass:
+
+  • per-request reusable prefix: leading blocks already seen in an earlier request
+    (the hit length an unbounded prefix cache would achieve)
+  • total and unique blocks, and the overall reusable block/token ratio
+  • the fan-out distribution of shared prefixes (children per trie node)
+  • how many requests share each block
+  • the pairwise common-prefix totals, which equal sum(C(count, 2)) over trie nodes
+
+The summary is printed as JSON and can be written next to benchmark results.
+
+Usage: python prefix_computer.py [trace_file] [--block-size N] [--output summary.json]
+"""
+
+import argparse
 import json
+import math
+import sys
+from collections import Counter
+from typing import Dict, Optional
+
+
+def histogram_percentile(histogram: Counter, percentile: float) -> int:
+    """Return the value at the given percentile of a {value: count} histogram."""
+    total = sum(histogram.values())
+    if total == 0:
+        return 0
+    rank = max(1, math.ceil(total * percentile / 100))
+    seen = 0
+    for value in sorted(histogram):
+        seen += histogram[value]
+        if seen >= rank:
+            return value
+    return max(histogram)
+
+
+def power_of_two_buckets(histogram: Counter) -> Dict[str, int]:
+    """Group a {value: count} histogram into 1, 2-3, 4-7, ... buckets."""
+    buckets = Counter()
+    for value, count in histogram.items():
+        low = 1 << (value.bit_length() - 1)
+        high = (low << 1) - 1
+        buckets[(low, high)] += count
+    return {str(low) if low == high else f"{low}-{high}": buckets[(low, high)] for low, high in sorted(buckets)}
+
+
+def analyze_trace(filename: str, block_size: Optional[int] = None) -> Dict:
+    """Build the prefix trie over the trace's hash_ids and summarize prefix reuse."""
+    # Trie stored flat: (parent node, hash_id) -> node, with per-node request and child counts
+    edges = {}
+    node_counts = [0]  # Node 0 is the root
+    child_counts = [0]
 
-def common_prefix_length(a, b):
-    """Returns the length of the common prefix between two lists."""
-    min_len = min(len(a), len(b))
-    for i in range(min_len):
-        if a[i] != b[i]:
-            return i
-    return min_len
+    num_requests = 0
+    total_blocks = 0
+    reusable_blocks = 0
+    requests_with_reuse = 0
+    reusable_histogram = Counter()
+    total_input_tokens = 0
+    reusable_tokens = 0
+    inferred_block_size = 1
+    reuse_by_request = []  # (input_length, reusable blocks) when the block size must be inferred
+    previous_timestamp = None
+    unsorted = False
 
-def parse_trace(filename):
     with open(filename, 'r') as f:
-        requests = [json.loads(line.strip()) for line in f]
-    
-    hash_lists = [r["hash_ids"] for r in requests]
-    n = len(hash_lists)
-    total_prefix_reuse = 0
-    comparisons = 0
-
-    for i in range(n):
-        for j in range(i + 1, n):
-            reuse = common_prefix_length(hash_lists[i], hash_lists[j])
-            total_prefix_reuse += reuse
-            comparisons += 1
-            print(f"Request {i} and {j}: prefix reuse = {reuse}")
-
-    print(f"\nTotal prefix reuse across {comparisons} pairs: {total_prefix_reuse}")
-    print(f"Average prefix reuse: {total_prefix_reuse / comparisons:.2f}")
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            request = json.loads(line)
+            hash_ids = request.get("hash_ids") or []
+            input_length = int(request.get("input_length", 0))
+            timestamp = int(request["timestamp"]) if "timestamp" in request else None
+            if timestamp is not None and previous_timestamp is not None and timestamp < previous_timestamp:
+                unsorted = True
+            previous_timestamp = timestamp
+
+            node = 0
+            reusable = 0
+            matching = True
+            for hash_id in hash_ids:
+                child = edges.get((node, hash_id))
+                if child is None:
+                    matching = False
+                    child = len(node_counts)
+                    edges[(node, hash_id)] = child
+                    node_counts.append(0)
+                    child_counts.append(0)
+                    child_counts[node] += 1
+                elif matching:
+                    reusable += 1
+                node_counts[child] += 1
+                node = child
+
+            num_requests += 1
+            total_blocks += len(hash_ids)
+            reusable_blocks += reusable
+            reusable_histogram[reusable] += 1
+            if reusable > 0:
+                requests_with_reuse += 1
+            total_input_tokens += input_length
+            if hash_ids:
+                inferred_block_size = max(inferred_block_size, math.ceil(input_length / len(hash_ids)))
+            if block_size is not None:
+                reusable_tokens += min(reusable * block_size, input_length)
+            else:
+                reuse_by_request.append((input_length, reusable))
+
+    if block_size is None:
+        block_size = inferred_block_size
+        reusable_tokens = sum(min(reusable * block_size, input_length) for input_length, reusable in reuse_by_request)
+
+    # Single pass over trie nodes for fan-out, sharing and pairwise statistics
+    # The root's fan-out is the number of distinct first blocks, reported separately
+    fanout_histogram = Counter(c for c in child_counts[1:] if c > 0)
+    sharing_histogram = Counter(node_counts[1:])
+    pairwise_total = sum(count * (count - 1) // 2 for count in node_counts[1:])
+    pairs = num_requests * (num_requests - 1) // 2
+
+    return {
+        "trace_file": filename,
+        "num_requests": num_requests,
+        "block_size": block_size,
+        "chronologically_sorted": not unsorted,
+        "total_blocks": total_blocks,
+        "unique_blocks": len(node_counts) - 1,
+        "reusable_blocks": reusable_blocks,
+        "block_reuse_ratio": reusable_blocks / total_blocks if total_blocks else 0.0,
+        "total_input_tokens": total_input_tokens,
+        "reusable_tokens": reusable_tokens,
+        "token_reuse_ratio": reusable_tokens / total_input_tokens if total_input_tokens else 0.0,
+        "per_request_reusable_blocks": {
+            "mean": reusable_blocks / num_requests if num_requests else 0.0,
+            "p50": histogram_percentile(reusable_histogram, 50),
+            "p90": histogram_percentile(reusable_histogram, 90),
+            "p99": histogram_percentile(reusable_histogram, 99),
+            "max": max(reusable_histogram) if reusable_histogram else 0,
+            "requests_with_reuse": requests_with_reuse,
+            "fraction_with_reuse": requests_with_reuse / num_requests if num_requests else 0.0,
+        },
+        "prefix_fanout": {
+            "distinct_first_blocks": child_counts[0],
+            "branch_points": sum(count for fanout, count in fanout_histogram.items() if fanout >= 2),
+            "max_fanout": max(child_counts[1:], default=0),
+            "histogram": {str(fanout): fanout_histogram[fanout] for fanout in sorted(fanout_histogram)},
+        },
+        "requests_sharing_block": power_of_two_buckets(sharing_histogram),
+        "pairwise_prefix_reuse": {
+            "pairs": pairs,
+            "total": pairwise_total,
+            "average": pairwise_total / pairs if pairs else 0.0,
+        },
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Analyze prefix reuse of a trace with a hash_id prefix trie")
+    parser.add_argument('trace_file', nargs='?', default='gmi_trace.jsonl', help='JSONL trace file (default: gmi_trace.jsonl)')
+    parser.add_argument('--block-size', type=int, default=None,
+                        help='Tokens per hash_id block (default: inferred from the trace)')
+    parser.add_argument('--output', default=None, help='Also write the JSON summary to this file')
+    args = parser.parse_args()
+
+    summary = analyze_trace(args.trace_file, args.block_size)
+    if not summary["chronologically_sorted"]:
+        print("⚠️  Trace is not chronologically sorted; run sort_traces.py first for meaningful reuse numbers",
+              file=sys.stderr)
+
+    print(json.dumps(summary, indent=2))
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(summary, f, indent=2)
+
 
 if __name__ == "__main__":
-    parse_trace("gmi_trace.jsonl")
+    main()
@@ -1,6 +1,7 @@
 # SPDX-License-Identifier: Apache-2.0
 # SPDX-FileCopyrightText: Copyright contributors to the vLLM project
 
+import contextlib
 import io
 import json
 import os
@@ -21,6 +22,72 @@ from transformers import AutoTokenizer, PreTrainedTokenizer, PreTrainedTokenizer
 AIOHTTP_TIMEOUT = aiohttp.ClientTimeout(total=6 * 60 * 60)
 
 
+def _connection_trace_config() -> aiohttp.TraceConfig:
+    """Record how long each request waits to acquire a connection.
+
+    The time runs from the start of the request until a pooled connection is
+    reused or a new one is established, so it covers both waiting for a free
+    slot in the pool and the TCP handshake. The moment the connection was
+    acquired is kept as connected_at, TTFT and latency are measured from it
+    so that this client overhead is only reported as connect_time.
+    """
+
+    async def on_request_start(session, trace_config_ctx, params):
+        trace_config_ctx.request_start = time.perf_counter()
+
+    async def on_connection_acquired(session, trace_config_ctx, params):
+        if isinstance(trace_config_ctx.trace_request_ctx, dict):
+            now = time.perf_counter()
+            trace_config_ctx.trace_request_ctx["connected_at"] = now
+            trace_config_ctx.trace_request_ctx["connect_time"] = (
+                now - trace_config_ctx.request_start
+            )
+
+    trace_config = aiohttp.TraceConfig()
+    trace_config.on_request_start.append(on_request_start)
+    trace_config.on_connection_create_end.append(on_connection_acquired)
+    trace_config.on_connection_reuseconn.append(on_connection_acquired)
+    return trace_config
+
+
+def create_client_session(
+    max_connections: int = 0,
+    max_connections_per_host: int = 0,
+    keepalive_timeout: float = 60.0,
+) -> aiohttp.ClientSession:
+    """Create a long-lived session with a keep-alive connection pool.
+
+    A limit of 0 means no limit. Must be called from inside the event loop.
+    """
+    connector = aiohttp.TCPConnector(
+        limit=max_connections,
+        limit_per_host=max_connections_per_host,
+        keepalive_timeout=keepalive_timeout,
+        ttl_dns_cache=300,
+    )
+    return aiohttp.ClientSession(
+        connector=connector,
+        trust_env=True,
+        timeout=AIOHTTP_TIMEOUT,
+        trace_configs=[_connection_trace_config()],
+    )
+
+
+@contextlib.asynccontextmanager
+async def _session_scope(session: Optional[aiohttp.ClientSession]):
+    # Reuse the shared session when one is given, otherwise fall back to a
+    # per-request session (which pays the connection setup every time)
+    if session is not None:
+        yield session
+        return
+    async with aiohttp.ClientSession(
+        trust_env=True,
+        timeout=AIOHTTP_TIMEOUT,
+        trace_configs=[_connection_trace_config()],
+    ) as session:
+        yield session
+
+
 @dataclass
 class RequestFuncInput:
     prompt: str
@@ -47,6 +114,7 @@ class RequestFuncOutput:
     tpot: float = 0.0  # avg next-token latencies
     prompt_len: int = 0
     error: str = ""
+    connect_time: float = 0.0  # Time spent acquiring a connection, not included in ttft and latency
 
 
 async def async_request_tgi(
@@ -278,15 +346,14 @@ async def async_request_deepspeed_mii(
 async def async_request_openai_completions(
     request_func_input: RequestFuncInput,
     pbar: Optional[tqdm] = None,
+    session: Optional[aiohttp.ClientSession] = None,
 ) -> RequestFuncOutput:
     api_url = request_func_input.api_url
     assert api_url.endswith(("completions", "profile")), (
         "OpenAI Completions API URL must end with 'completions' or 'profile'."
     )
 
-    async with aiohttp.ClientSession(
-        trust_env=True, timeout=AIOHTTP_TIMEOUT
-    ) as session:
+    async with _session_scope(session) as session:
         payload = {
             "model": request_func_input.model_name
             if request_func_input.model_name
@@ -321,10 +388,15 @@ async def async_request_openai_completions(
         generated_text = ""
         st = time.perf_counter()
         most_recent_timestamp = st
+        trace_ctx = {}
         try:
             async with session.post(
-                url=api_url, json=payload, headers=headers
+                url=api_url, json=payload, headers=headers, trace_request_ctx=trace_ctx
             ) as response:
+                output.connect_time = trace_ctx.get("connect_time", 0.0)
+                # TTFT and latency start once the connection is acquired
+                st = trace_ctx.get("connected_at", st)
+                most_recent_timestamp = st
                 if response.status == 200:
                     first_chunk_received = False
                     async for chunk_bytes in response.content:
@@ -384,15 +456,14 @@ async def async_request_openai_completions(
 async def async_request_openai_chat_completions(
     request_func_input: RequestFuncInput,
     pbar: Optional[tqdm] = None,
+    session: Optional[aiohttp.ClientSession] = None,
 ) -> RequestFuncOutput:
     api_url = request_func_input.api_url
     assert api_url.endswith(("chat/completions", "profile")), (
         "OpenAI Chat Completions API URL must end with 'chat/completions'."
     )
 
-    async with aiohttp.ClientSession(
-        trust_env=True, timeout=AIOHTTP_TIMEOUT
-    ) as session:
+    async with _session_scope(session) as session:
         content = [{"type": "text", "text": request_func_input.prompt}]
         if request_func_input.multi_modal_content:
             content.append(request_func_input.multi_modal_content)
@@ -434,10 +505,15 @@ async def async_request_openai_chat_completions(
         ttft = 0.0
         st = time.perf_counter()
         most_recent_timestamp = st
+        trace_ctx = {}
         try:
             async with session.post(
-                url=api_url, json=payload, headers=headers
+                url=api_url, json=payload, headers=headers, trace_request_ctx=trace_ctx
             ) as response:
+                output.connect_time = trace_ctx.get("connect_time", 0.0)
+                # TTFT and latency start once the connection is acquired
+                st = trace_ctx.get("connected_at", st)
+                most_recent_timestamp = st
                 if response.status == 200:
                     async for chunk_bytes in response.content:
                         chunk_bytes = chunk_bytes.strip()
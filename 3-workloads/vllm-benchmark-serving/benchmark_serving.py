@@ -24,6 +24,7 @@ On the client side, run:
 
 import argparse
 import asyncio
+import functools
 import gc
 import json
 import os
@@ -35,6 +36,7 @@ from dataclasses import dataclass
 from datetime import datetime
 from typing import Any, Optional
 
+import aiohttp
 import numpy as np
 from tqdm.asyncio import tqdm
 from transformers import PreTrainedTokenizerBase
@@ -44,6 +46,7 @@ from backend_request_func import (
     OPENAI_COMPATIBLE_BACKENDS,
     RequestFuncInput,
     RequestFuncOutput,
+    create_client_session,
 )
 
 try:
@@ -105,6 +108,12 @@ class BenchmarkMetrics:
     median_e2el_ms: float
     std_e2el_ms: float
     percentiles_e2el_ms: list[tuple[float, float]]
+    # Time spent waiting for a connection from the client pool,
+    # reported separately so that client overhead is visible.
+    mean_conn_ms: float
+    median_conn_ms: float
+    std_conn_ms: float
+    percentiles_conn_ms: list[tuple[float, float]]
 
 
 async def get_request(
@@ -170,6 +179,7 @@ def calculate_metrics(
     all_tpots: list[float] = []
     ttfts: list[float] = []
     e2els: list[float] = []
+    conns: list[float] = []
     for i in range(len(outputs)):
         if outputs[i].success:
             output_len = outputs[i].output_tokens
@@ -197,6 +207,7 @@ def calculate_metrics(
             itls += outputs[i].itl
             ttfts.append(outputs[i].ttft)
             e2els.append(outputs[i].latency)
+            conns.append(outputs[i].connect_time)
             completed += 1
         else:
             actual_output_lens.append(0)
@@ -265,12 +276,48 @@ def calculate_metrics(
         percentiles_e2el_ms=[
             (p, np.percentile(e2els or 0, p) * 1000) for p in selected_percentiles
         ],
+        mean_conn_ms=np.mean(conns or 0) * 1000,
+        std_conn_ms=np.std(conns or 0) * 1000,
+        median_conn_ms=np.median(conns or 0) * 1000,
+        percentiles_conn_ms=[
+            (p, np.percentile(conns or 0, p) * 1000) for p in selected_percentiles
+        ],
     )
 
     return metrics, actual_output_lens
 
 
 async def benchmark(
+    backend: str,
+    max_connections: int = 0,
+    max_connections_per_host: int = 0,
+    keepalive_timeout: float = 60.0,
+    **kwargs,
+):
+    """Run the benchmark with one long-lived connection pool for the whole run.
+
+    Requests do not pay a TCP handshake each. Only the OpenAI-compatible
+    request functions accept a shared session; it is closed on every exit
+    path, including a failed initial test run.
+    """
+    if backend not in OPENAI_COMPATIBLE_BACKENDS:
+        return await _benchmark(backend=backend, session=None, **kwargs)
+    async with create_client_session(
+        max_connections=max_connections,
+        max_connections_per_host=max_connections_per_host,
+        keepalive_timeout=keepalive_timeout,
+    ) as session:
+        return await _benchmark(
+            backend=backend,
+            session=session,
+            max_connections=max_connections,
+            max_connections_per_host=max_connections_per_host,
+            keepalive_timeout=keepalive_timeout,
+            **kwargs,
+        )
+
+
+async def _benchmark(
     backend: str,
     api_url: str,
     base_url: str,
@@ -291,12 +338,20 @@ async def benchmark(
     lora_modules: Optional[Iterable[str]],
     extra_body: Optional[dict],
     request_with_user_id: bool = True,
+    max_connections: int = 0,
+    max_connections_per_host: int = 0,
+    keepalive_timeout: float = 60.0,
+    session: Optional[aiohttp.ClientSession] = None,
 ):
     if backend in ASYNC_REQUEST_FUNCS:
         request_func = ASYNC_REQUEST_FUNCS[backend]
     else:
         raise ValueError(f"Unknown backend: {backend}")
 
+    # The pooled session is created and closed by benchmark()
+    if session is not None:
+        request_func = functools.partial(request_func, session=session)
+
     print("Starting initial single prompt test run...")
     test_prompt, test_prompt_len, test_output_len, test_mm_content = (
         input_requests[0].prompt,
@@ -358,6 +413,12 @@ async def benchmark(
     print(f"Burstiness factor: {burstiness} ({distribution})")
     print(f"Maximum request concurrency: {max_concurrency}")
     print(f"Request with user ID: {request_with_user_id}")
+    if session is not None:
+        print(
+            f"Connection pool: limit={max_connections or 'unlimited'}, "
+            f"per-host limit={max_connections_per_host or 'unlimited'}, "
+            f"keepalive={keepalive_timeout}s"
+        )
 
     pbar = None if disable_tqdm else tqdm(total=len(input_requests))
 
@@ -482,6 +543,7 @@ async def benchmark(
         "output_lens": actual_output_lens,
         "ttfts": [output.ttft for output in outputs],
         "itls": [output.itl for output in outputs],
+        "connect_times": [output.connect_time for output in outputs],
         "generated_texts": [output.generated_text for output in outputs],
         "errors": [output.error for output in outputs],
     }
@@ -529,6 +591,7 @@ async def benchmark(
     process_one_metric("tpot", "TPOT", "Time per Output Token (excl. 1st token)")
     process_one_metric("itl", "ITL", "Inter-token Latency")
     process_one_metric("e2el", "E2EL", "End-to-end Latency")
+    process_one_metric("conn", "Conn", "Connection Acquire Time")
 
     print("=" * 50)
 
@@ -812,6 +875,9 @@ def main(args: argparse.Namespace):
             lora_modules=args.lora_modules,
             extra_body=sampling_params,
             request_with_user_id=args.request_with_user_id,
+            max_connections=args.max_connections,
+            max_connections_per_host=args.max_connections_per_host,
+            keepalive_timeout=args.keepalive_timeout,
         )
     )
 
@@ -854,6 +920,7 @@ def main(args: argparse.Namespace):
                 "output_lens",
                 "ttfts",
                 "itls",
+                "connect_times",
                 "generated_texts",
                 "errors",
             ]:
@@ -937,6 +1004,27 @@ if __name__ == "__main__":
         "actual request rate may be lower than specified with --request-rate, "
         "if the server is not processing requests fast enough to keep up.",
     )
+    parser.add_argument(
+        "--max-connections",
+        type=int,
+        default=0,
+        help="Maximum number of connections in the client connection pool "
+        "shared by all requests (0 means no limit). Requests beyond the limit "
+        "wait for a free connection; that wait is reported as the connection "
+        "acquire time.",
+    )
+    parser.add_argument(
+        "--max-connections-per-host",
+        type=int,
+        default=0,
+        help="Maximum number of pooled connections per host (0 means no limit).",
+    )
+    parser.add_argument(
+        "--keepalive-timeout",
+        type=float,
+        default=60.0,
+        help="Seconds an idle pooled connection is kept alive for reuse.",
+    )
 
     parser.add_argument(
         "--model",
@@ -1055,11 +1143,11 @@ if __name__ == "__main__":
     parser.add_argument(
         "--percentile-metrics",
         type=str,
-        default="ttft,tpot,itl",
+        default="ttft,tpot,itl,conn",
         help="Comma-separated list of selected metrics to report percentils. "
         "This argument specifies the metrics to report percentiles. "
-        'Allowed metric names are "ttft", "tpot", "itl", "e2el". '
-        'Default value is "ttft,tpot,itl".',
+        'Allowed metric names are "ttft", "tpot", "itl", "e2el", "conn". '
+        'Default value is "ttft,tpot,itl,conn".',
     )
     parser.add_argument(
         "--metric-percentiles",
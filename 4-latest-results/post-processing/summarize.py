@@ -8,6 +8,7 @@ from datetime import datetime
 import numpy as np
 import yaml
 import json
+import base64
 
 # Import upload functionality
 try:
@@ -17,6 +18,65 @@ except ImportError:
     UPLOAD_AVAILABLE = False
     print("Warning: upload_to_api module not available. Auto-upload disabled.")
 
+# Mergeable latency sketches, shared with the live summaries of the workloads
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "..", "3-workloads"))
+try:
+    from lmbench.sketch import QuantileSketch
+    SKETCHES_AVAILABLE = True
+except ImportError:
+    SKETCHES_AVAILABLE = False
+    print("Warning: lmbench package not available. Latency sketches disabled.")
+
+def decode_itls(encoded) -> np.ndarray:
+    """Unpack the base64 float32 inter-chunk gaps (seconds) written by the workloads."""
+    if not isinstance(encoded, str) or not encoded:
+        return np.empty(0, dtype=np.float32)
+    return np.frombuffer(base64.b64decode(encoded), dtype='<f4')
+
+def summarize_decode_stalls(itls_per_request: list, stall_threshold_ms: Optional[float] = None) -> dict:
+    """Longest decode gap per request and the gaps above the stall threshold.
+
+    The default threshold is 5x the median inter-token latency.
+    """
+    all_itls_ms = np.concatenate(itls_per_request).astype(np.float64) * 1000
+    longest_gap_ms = np.array([gaps.max() for gaps in itls_per_request], dtype=np.float64) * 1000
+    if stall_threshold_ms is None:
+        stall_threshold_ms = 5 * float(np.median(all_itls_ms))
+    stalls_per_request = np.array([int(np.count_nonzero(gaps * 1000 > stall_threshold_ms))
+                                   for gaps in itls_per_request])
+    stall_gaps_ms = all_itls_ms[all_itls_ms > stall_threshold_ms]
+    return {
+        "longest_gap_ms": {
+            "mean": round(longest_gap_ms.mean(), 2),
+            "median": round(float(np.median(longest_gap_ms)), 2),
+            "p99": round(np.percentile(longest_gap_ms, 99), 2),
+            "max": round(longest_gap_ms.max(), 2)
+        },
+        "stall_threshold_ms": round(stall_threshold_ms, 2),
+        "stall_count": int(len(stall_gaps_ms)),
+        "stalled_requests": int(np.count_nonzero(stalls_per_request)),
+        "stalled_request_fraction": round(np.count_nonzero(stalls_per_request) / len(itls_per_request), 4),
+        "stall_time_s": round(stall_gaps_ms.sum() / 1000, 3)
+    }
+
+def build_latency_sketches(df: pd.DataFrame) -> dict:
+    """Serialized TTFT, TPOT, ITL and E2E sketches (ms) of the requests in df.
+
+    The sketches of several windows or runs can be merged with
+    lmbench.merge_sketches to get their percentiles without the raw data.
+    """
+    sketches = {name: QuantileSketch() for name in ("ttft_ms", "tpot_ms", "itl_ms", "e2e_ms")}
+    sketches["ttft_ms"].add_many(df["ttft"].to_numpy() * 1000)
+    sketches["e2e_ms"].add_many((df["ttft"] + df["generation_time"]).to_numpy() * 1000)
+    multi_token = df["generation_tokens"] > 1
+    sketches["tpot_ms"].add_many(
+        (df["generation_time"][multi_token] / (df["generation_tokens"][multi_token] - 1)).to_numpy() * 1000
+    )
+    if "itls" in df.columns:
+        for gaps in map(decode_itls, df["itls"]):
+            sketches["itl_ms"].add_many(gaps.astype(np.float64) * 1000)
+    return {name: sketch.to_dict() for name, sketch in sketches.items()}
+
 def ProcessSummary(
     df: pd.DataFrame,
     start_time: Optional[float] = None,
@@ -25,6 +85,8 @@ def ProcessSummary(
     qps: Optional[float] = None,
     is_strict_synthetic: bool = False,
     num_rounds_per_user: Optional[int] = None,
+    stall_threshold_ms: Optional[float] = None,
+    sketch_window_s: Optional[float] = None,
 ) -> dict:
     """Process benchmark results and return as a dictionary."""
     # Check if the DataFrame is empty
@@ -35,6 +97,10 @@ def ProcessSummary(
         }
 
     try:
+        # Failed requests (recorded by the trace replayer) carry no timing information
+        if "error" in df.columns:
+            df = df[df["error"].isna() | (df["error"] == "")]
+
         if start_time is not None and end_time is not None:
             launched_queries = len(df.query(f"{start_time} <= launch_time <= {end_time}"))
             df = df.query(f"{start_time} <= finish_time <= {end_time}")
@@ -68,13 +134,22 @@ def ProcessSummary(
         median_tpot = tpot.median()
         p99_tpot = np.percentile(tpot, 99)
 
-        # Inter-token Latency (including TTFT - total time divided by all tokens)
-        # ITL should include the time to first token, representing average time per token overall
-        df['itl'] = ((df['ttft'] + df['generation_time']) / df['generation_tokens']) * 1000
-        itl = df['itl'].replace([float('inf'), -float('inf'), np.nan], np.nan).dropna()
-        mean_itl = itl.mean()
-        median_itl = itl.median()
-        p99_itl = np.percentile(itl, 99)
+        # Inter-token Latency from the recorded gaps between streamed chunks
+        itls_per_request = []
+        if "itls" in df.columns:
+            itls_per_request = [gaps for gaps in map(decode_itls, df["itls"]) if len(gaps) > 0]
+        if itls_per_request:
+            itl = np.concatenate(itls_per_request).astype(np.float64) * 1000
+            mean_itl = itl.mean()
+            median_itl = np.median(itl)
+            p99_itl = np.percentile(itl, 99)
+        else:
+            # Without per-chunk timestamps, approximate ITL as total time divided by all tokens (including TTFT)
+            df['itl'] = ((df['ttft'] + df['generation_time']) / df['generation_tokens']) * 1000
+            itl = df['itl'].replace([float('inf'), -float('inf'), np.nan], np.nan).dropna()
+            mean_itl = itl.mean()
+            median_itl = itl.median()
+            p99_itl = np.percentile(itl, 99)
 
         # Handle strict synthetic workload differently
         if is_strict_synthetic and num_rounds_per_user is not None:
@@ -117,7 +192,7 @@ def ProcessSummary(
             input_token_throughput = total_prompt_tokens / total_time
             total_token_throughput = (total_prompt_tokens + total_generation_tokens) / total_time
 
-        return {
+        summary = {
             "successful_requests": int(finished_requests),
             "benchmark_duration_s": round(total_time, 2),
             "total_input_tokens": int(total_prompt_tokens),
@@ -143,6 +218,70 @@ def ProcessSummary(
             }
         }
 
+        # Decode hiccups (e.g. KV cache store/retrieve) that averages hide
+        if itls_per_request:
+            summary["itl_ms"]["p90"] = round(np.percentile(itl, 90), 2)
+            summary["itl_ms"]["p999"] = round(np.percentile(itl, 99.9), 2)
+            summary["decode_stalls"] = summarize_decode_stalls(itls_per_request, stall_threshold_ms)
+
+        # Client-side connection acquire time (only recorded by some workloads)
+        if "connect_time" in df.columns:
+            connect_ms = df["connect_time"].dropna() * 1000
+            if not connect_ms.empty:
+                summary["connect_ms"] = {
+                    "mean": round(connect_ms.mean(), 2),
+                    "median": round(connect_ms.median(), 2),
+                    "p99": round(np.percentile(connect_ms, 99), 2)
+                }
+
+        # Time spent waiting for a client in-flight slot, not included in TTFT
+        if "queue_time" in df.columns:
+            queue_ms = df["queue_time"].dropna() * 1000
+            if not queue_ms.empty and queue_ms.max() > 0:
+                summary["client_queue_ms"] = {
+                    "mean": round(queue_ms.mean(), 2),
+                    "median": round(queue_ms.median(), 2),
+                    "p99": round(np.percentile(queue_ms, 99), 2)
+                }
+
+        # Critical path of agentic fan-out rounds, written on every request of the round
+        if "round_latency" in df.columns and "round_id" in df.columns:
+            round_ms = df.drop_duplicates(["user_id", "round_id"])["round_latency"].dropna() * 1000
+            if not round_ms.empty:
+                summary["round_latency_ms"] = {
+                    "mean": round(round_ms.mean(), 2),
+                    "median": round(round_ms.median(), 2),
+                    "p99": round(np.percentile(round_ms, 99), 2),
+                    "count": int(len(round_ms))
+                }
+
+        # Prefix shared with the user's previous request (strict synthetic KV_REUSE_RATIO)
+        if "kv_reuse_fraction" in df.columns:
+            reuse = df["kv_reuse_fraction"].dropna()
+            if not reuse.empty:
+                summary["kv_reuse_fraction"] = {
+                    "mean": round(reuse.mean(), 4),
+                    "median": round(reuse.median(), 4),
+                    "min": round(reuse.min(), 4)
+                }
+
+        if SKETCHES_AVAILABLE:
+            summary["sketches"] = build_latency_sketches(df)
+            # Optional per-window sketches (by finish time) to merge windows across runs
+            if sketch_window_s:
+                window_ids = ((df["finish_time"] - start_time) // sketch_window_s).astype(int)
+                summary["sketch_windows"] = [
+                    {
+                        "start_time": start_time + window_id * sketch_window_s,
+                        "end_time": start_time + (window_id + 1) * sketch_window_s,
+                        "count": len(window_df),
+                        "sketches": build_latency_sketches(window_df),
+                    }
+                    for window_id, window_df in df.groupby(window_ids)
+                ]
+
+        return summary
+
     except Exception as e:
         return {
             "error": f"Failed to process benchmark results: {str(e)}",
@@ -238,6 +377,12 @@ def process_output(filename: str, **kwargs):
                     "p99": round(float(metrics_dict.get('p99_itl_ms', 0)), 2)
                 }
             }
+            if 'mean_conn_ms' in metrics_dict:
+                results["connect_ms"] = {
+                    "mean": round(float(metrics_dict.get('mean_conn_ms', 0)), 2),
+                    "median": round(float(metrics_dict.get('median_conn_ms', 0)), 2),
+                    "p99": round(float(metrics_dict.get('p99_conn_ms', 0)), 2)
+                }
 
             # Use REQUEST_RATE as QPS for VLLMBenchmark workloads
             request_rate = kwargs.get('REQUEST_RATE', 'unknown')
@@ -276,13 +421,25 @@ def process_output(filename: str, **kwargs):
             except (ValueError, TypeError):
                 qps_float = None
 
+        # Gaps longer than this count as decode stalls (default: 5x the median ITL)
+        stall_threshold_ms = kwargs.get('STALL_THRESHOLD_MS')
+        if stall_threshold_ms is not None:
+            stall_threshold_ms = float(stall_threshold_ms)
+
+        # Seconds per window of the optional per-window latency sketches
+        sketch_window_s = kwargs.get('SKETCH_WINDOW_S')
+        if sketch_window_s is not None:
+            sketch_window_s = float(sketch_window_s)
+
         # Process benchmark results using the standard method
         results = ProcessSummary(
             df, 
             pending_queries=0,
             qps=qps_float,
             is_strict_synthetic=is_strict_synthetic,
-            num_rounds_per_user=num_rounds_per_user
+            num_rounds_per_user=num_rounds_per_user,
+            stall_threshold_ms=stall_threshold_ms,
+            sketch_window_s=sketch_window_s
         )
 
         # Create timestamp
@@ -1,6 +1,7 @@
 #!/usr/bin/env python3
 
 import yaml
+import json
 import os
 import subprocess
 import time
@@ -211,6 +212,14 @@ def validate_single_spec_config(config: Dict[str, Any], file_path: str) -> Dict[
         for workload in workload_cfg:
             if workload not in supported_workloads:
                 raise ValueError(f"Unsupported workload type: {workload} in {file_path}")
+            # Catch malformed QPS search specs before any baseline is deployed
+            workload_configs = workload_cfg[workload] if isinstance(workload_cfg[workload], list) else [workload_cfg[workload]]
+            for workload_config in workload_configs:
+                qps_values = (workload_config or {}).get('QPS')
+                if is_qps_search(qps_values):
+                    if workload not in ['LMCacheSynthetic', 'Random']:
+                        raise ValueError(f"QPS search is only supported for LMCacheSynthetic and Random workloads, not {workload} in {file_path}")
+                    parse_qps_search(qps_values)
 
     # Note: Infrastructure validation is now handled at the run-bench.yaml level
     # Individual spec files no longer need to specify infrastructure
@@ -917,6 +926,136 @@ def synthetic_sharegpt_data_generation() -> None:
     else:
         raise RuntimeError("Failed to generate ShareGPT data")
 
+# QPS search mode: QPS: {search: {slo_ttft_p99_ms: 2000, min: 0.1, max: 50}}
+QPS_SEARCH_DEFAULTS = {
+    'min': 0.1,
+    'max': 50.0,
+    'tolerance': 0.1,  # stop once max / min of the bracket is within 1 + tolerance
+    'max_probes': 8,
+    'min_throughput_ratio': None,  # e.g. 0.9: also fail probes that sustain < 90% of the target QPS
+}
+QPS_SEARCH_METRICS = ['ttft', 'tpot', 'itl', 'client_queue']
+QPS_SEARCH_STATS = ['mean', 'median', 'p99']
+
+def is_qps_search(qps_values: Any) -> bool:
+    """Whether the QPS entry of a workload asks for a saturation search instead of a list of values."""
+    return isinstance(qps_values, dict) and 'search' in qps_values
+
+def parse_qps_search(qps_values: Dict[str, Any]) -> Dict[str, Any]:
+    """Validate a QPS search spec and split it into the search settings and the SLOs."""
+    search_config = dict(QPS_SEARCH_DEFAULTS)
+    slos = {}
+    for key, value in (qps_values.get('search') or {}).items():
+        if key in QPS_SEARCH_DEFAULTS:
+            search_config[key] = value
+            continue
+        # slo_<metric>_<stat>_ms, e.g. slo_ttft_p99_ms
+        metric, _, stat = key[len('slo_'):-len('_ms')].rpartition('_')
+        if not (key.startswith('slo_') and key.endswith('_ms')) or metric not in QPS_SEARCH_METRICS or stat not in QPS_SEARCH_STATS:
+            raise ValueError(f"Unsupported QPS search key: {key} (expected slo_<{'|'.join(QPS_SEARCH_METRICS)}>_<{'|'.join(QPS_SEARCH_STATS)}>_ms "
+                             f"or one of {', '.join(QPS_SEARCH_DEFAULTS)})")
+        slos[(metric, stat)] = float(value)
+    if not slos:
+        raise ValueError("QPS search needs at least one SLO, e.g. slo_ttft_p99_ms: 2000")
+    if not 0 < float(search_config['min']) < float(search_config['max']):
+        raise ValueError(f"QPS search needs 0 < min < max, got min={search_config['min']} max={search_config['max']}")
+    search_config['slos'] = slos
+    return search_config
+
+def read_qps_probe_summary(benchmark_name: str, workload: str, qps: str, since: float) -> Optional[Dict[str, Any]]:
+    """Results of the summary JSON that summarize.py wrote for one probe (None if it wrote none)."""
+    suite_dir = Path(__file__).parent / '4-latest-results' / benchmark_name
+    summaries = [path for path in suite_dir.glob(f"{KEY}_{workload}_{qps}_*.json") if path.stat().st_mtime >= since]
+    if not summaries:
+        return None
+    with open(max(summaries, key=lambda path: path.stat().st_mtime), 'r') as f:
+        return json.load(f).get('results')
+
+def check_qps_probe(results: Optional[Dict[str, Any]], qps: float, search_config: Dict[str, Any]) -> tuple:
+    """Whether a probe met every SLO, with the measured value of each SLO."""
+    if not results or 'error' in results:
+        return False, {}
+    passed = True
+    measured = {}
+    for (metric, stat), limit in search_config['slos'].items():
+        # summarize.py leaves out client_queue_ms when no request waited on the client
+        value = float(results.get(f"{metric}_ms", {}).get(stat, 0.0))
+        measured[f"{metric}_{stat}_ms"] = value
+        passed = passed and value <= limit
+    min_throughput_ratio = search_config['min_throughput_ratio']
+    if min_throughput_ratio is not None:
+        throughput = float(results.get('request_throughput_req_per_s', 0.0))
+        measured['request_throughput_req_per_s'] = throughput
+        passed = passed and throughput >= float(min_throughput_ratio) * qps
+    return passed, measured
+
+def search_max_sustainable_qps(qps_values: Dict[str, Any], workload: str, benchmark_name: str, run_probe) -> Optional[float]:
+    """
+    Find the highest QPS that meets the SLOs of a QPS search spec.
+
+    run_probe(qps) runs the workload (warmup, benchmark and summarize.py) at a single
+    QPS. The search probes min and max first, then bisects the bracket on a log scale
+    (QPS ranges span orders of magnitude) until it is within the tolerance or the
+    probe budget is spent. Returns None when even min misses the SLOs.
+    """
+    search_config = parse_qps_search(qps_values)
+    slo_text = ', '.join(f"{metric} {stat} <= {limit}ms" for (metric, stat), limit in search_config['slos'].items())
+    print(f"🔎 Searching the max sustainable QPS of {workload} in [{search_config['min']}, {search_config['max']}] ({slo_text})")
+
+    probes = []
+
+    def probe(qps: float) -> bool:
+        qps_text = f"{qps:.3g}"
+        since = time.time()
+        run_probe(qps_text)
+        results = read_qps_probe_summary(benchmark_name, workload, qps_text, since)
+        passed, measured = check_qps_probe(results, float(qps_text), search_config)
+        probes.append({'qps': float(qps_text), 'passed': passed, 'measured': measured})
+        print(f"{'✅' if passed else '❌'} QPS {qps_text}: {measured if measured else 'no results'}")
+        return passed
+
+    low, high = float(search_config['min']), float(search_config['max'])
+    max_probes = int(search_config['max_probes'])
+    best = None
+    if probe(low):
+        best = low
+        if probe(high):
+            best = high
+        else:
+            while len(probes) < max_probes and high / low > 1 + float(search_config['tolerance']):
+                mid = float(f"{(low * high) ** 0.5:.3g}")
+                if mid <= low or mid >= high:
+                    break
+                if probe(mid):
+                    low = best = mid
+                else:
+                    high = mid
+
+    if best is None:
+        print(f"⚠️ {workload} misses the SLOs even at the minimum QPS {search_config['min']}")
+    else:
+        print(f"🏁 Max sustainable QPS of {workload} on {KEY}: {best}")
+
+    # One saturation result per baseline next to the per-QPS summaries
+    suite_dir = Path(__file__).parent / '4-latest-results' / benchmark_name
+    suite_dir.mkdir(parents=True, exist_ok=True)
+    timestamp = time.strftime("%Y%m%d-%H%M")
+    output_path = suite_dir / f"{KEY}_{workload}_saturation_{timestamp}.json"
+    with open(output_path, 'w') as f:
+        json.dump({
+            "name": benchmark_name,
+            "lmbench-session-id": LMBENCH_SESSION_ID,
+            "timestamp": timestamp,
+            "baseline": KEY,
+            "workload": workload,
+            "max_sustainable_qps": best,
+            "search": {k: v for k, v in search_config.items() if k != 'slos'},
+            "slos_ms": {f"{metric}_{stat}": limit for (metric, stat), limit in search_config['slos'].items()},
+            "probes": probes,
+        }, f, indent=2)
+    print(f"Saturation result saved to {output_path}")
+    return best
+
 def run_synthetic(synthetic_config: Dict[str, Any]) -> None:
     """Run the synthetic workload with the specified configuration."""
 
@@ -944,6 +1083,7 @@ def run_synthetic(synthetic_config: Dict[str, Any]) -> None:
     CHAT_HISTORY = synthetic_config.get('CHAT_HISTORY')
     ANSWER_LEN = synthetic_config.get('ANSWER_LEN')
     USE_SHAREGPT = synthetic_config.get('USE_SHAREGPT', False)
+    ARRIVAL = synthetic_config.get('ARRIVAL')  # e.g. {type: gamma, burstiness: 0.5}; evenly spaced when unset
     if USE_SHAREGPT and (not run_synthetic.share_gpt_generated):
         synthetic_sharegpt_data_generation()
         run_synthetic.share_gpt_generated = True
@@ -976,6 +1116,7 @@ def run_synthetic(synthetic_config: Dict[str, Any]) -> None:
     SPEC_FILE_PATH=${13}
     LMBENCH_SESSION_ID=${14}
     API_TYPE=${15}
+    ARRIVAL=${16}
     [qps_values...]
     """
     cmd.extend([str(NUM_USERS_WARMUP)])
@@ -990,6 +1131,17 @@ def run_synthetic(synthetic_config: Dict[str, Any]) -> None:
     cmd.extend([str(CURRENT_SPEC_FILE_PATH)]) # Pass the spec file path
     cmd.extend([str(LMBENCH_SESSION_ID)]) # Pass the session ID
     cmd.extend([str(api_type)]) # Pass the API type
+    cmd.extend([json.dumps(ARRIVAL) if ARRIVAL is not None else 'None']) # Pass the arrival process spec
+
+    if is_qps_search(qps_values):
+        # Each probe runs the script with a single QPS value
+        def run_probe(qps: str) -> None:
+            print(f"Running synthetic workload with parameters: {' '.join(cmd + [qps])}")
+            subprocess.run(cmd + [qps], check=True)
+        search_max_sustainable_qps(qps_values, 'synthetic', benchmark_name, run_probe)
+        print("Synthetic QPS search completed successfully")
+        return
+
     cmd.extend([str(qps) for qps in qps_values])
 
     # Execute the workload
@@ -1021,6 +1173,8 @@ def run_trace_replayer(trace_replayer_config: Dict[str, Any]) -> None:
     duration = trace_replayer_config.get('DURATION')
     preserve_timing = trace_replayer_config.get('PRESERVE_TIMING', False)
     max_delay = trace_replayer_config.get('MAX_DELAY')  # Maximum delay between requests (for testing)
+    arrival_process = trace_replayer_config.get('ARRIVAL_PROCESS', 'fixed')  # QPS mode inter-arrival distribution
+    block_size = trace_replayer_config.get('BLOCK_SIZE')  # Tokens per hash_id block (None = infer from trace)
     
     # Handle both SPEED_UP (new, intuitive) and TIME_SCALE (old, for backward compatibility)
     speed_up = trace_replayer_config.get('SPEED_UP')
@@ -1040,6 +1194,9 @@ def run_trace_replayer(trace_replayer_config: Dict[str, Any]) -> None:
         speed_up = 1.0
         print(f"Using default speed: 1.0x (real-time)")
     
+    if arrival_process not in ('fixed', 'poisson'):
+        raise ValueError(f"Unsupported ARRIVAL_PROCESS for TraceReplayer: {arrival_process} (expected 'fixed' or 'poisson')")
+
     if max_delay is not None:
         print(f"🕐 MAX_DELAY: Delays capped at {max_delay}s (useful for testing production traces)")
     
@@ -1078,6 +1235,8 @@ def run_trace_replayer(trace_replayer_config: Dict[str, Any]) -> None:
     cmd.extend([str(internal_time_scale)])  # Pass the internal time_scale value
     cmd.extend([str(api_type)])
     cmd.extend([str(max_delay) if max_delay is not None else 'None'])  # Pass MAX_DELAY parameter
+    cmd.extend([str(arrival_process)])
+    cmd.extend([str(block_size) if block_size is not None else 'None'])  # Pass BLOCK_SIZE parameter
     cmd.extend([str(qps) for qps in qps_values])
 
     # Ensure trace file is sorted chronologically (idempotent)
@@ -1131,6 +1290,8 @@ def run_agentic(agentic_config: Dict[str, Any]) -> None:
     SYSTEM_PROMPT = agentic_config.get('SYSTEM_PROMPT')
     CHAT_HISTORY = agentic_config.get('CHAT_HISTORY')
     ANSWER_LEN = agentic_config.get('ANSWER_LEN')
+    TRANSCRIPT_SAMPLE_RATE = agentic_config.get('TRANSCRIPT_SAMPLE_RATE')  # fraction of users with full transcripts
+    FANOUT = bool(agentic_config.get('FANOUT', False))  # send each round to all agents at once
 
     workload_exec_script_path = Path(__file__).parent / '3-workloads' / 'agentic' / 'run_agentic.sh'
     if not workload_exec_script_path.exists():
@@ -1152,6 +1313,8 @@ def run_agentic(agentic_config: Dict[str, Any]) -> None:
     cmd.extend([str(CURRENT_SERVING_INDEX)])
     cmd.extend([str(CURRENT_SPEC_FILE_PATH)]) # Pass the spec file path
     cmd.extend([str(LMBENCH_SESSION_ID)]) # Pass the session ID
+    cmd.extend([str(TRANSCRIPT_SAMPLE_RATE)]) # Pass the transcript sample rate ('None' for no transcripts)
+    cmd.extend([str(FANOUT)]) # Pass the fan-out mode ('True' or 'False')
     cmd.extend([str(interval) for interval in NEW_USER_INTERVALS])
 
     # Execute the workload
@@ -1175,6 +1338,7 @@ def run_random(random_config: Dict[str, Any]) -> None:
     NUM_ROUNDS = random_config.get('NUM_ROUNDS')
     PROMPT_LEN = random_config.get('PROMPT_LEN')
     ANSWER_LEN = random_config.get('ANSWER_LEN')
+    ARRIVAL = random_config.get('ARRIVAL')  # e.g. {type: gamma, burstiness: 0.5}; evenly spaced when unset
 
     workload_exec_script_path = Path(__file__).parent / '3-workloads' / 'random' / 'run-random.sh'
     if not workload_exec_script_path.exists():
@@ -1200,6 +1364,7 @@ def run_random(random_config: Dict[str, Any]) -> None:
     SERVING_INDEX=$9
     SPEC_FILE_PATH=${10}
     LMBENCH_SESSION_ID=${11}
+    ARRIVAL=${12}
     [qps_values...]
     """
     cmd.extend([str(NUM_USERS)])
@@ -1210,6 +1375,17 @@ def run_random(random_config: Dict[str, Any]) -> None:
     cmd.extend([str(CURRENT_SERVING_INDEX)])
     cmd.extend([str(CURRENT_SPEC_FILE_PATH)]) # Pass the spec file path
     cmd.extend([str(LMBENCH_SESSION_ID)]) # Pass the session ID
+    cmd.extend([json.dumps(ARRIVAL) if ARRIVAL is not None else 'None']) # Pass the arrival process spec
+
+    if is_qps_search(qps_values):
+        # Each probe runs the script with a single QPS value
+        def run_probe(qps: str) -> None:
+            print(f"Running Random workload with parameters: {' '.join(cmd + [qps])}")
+            subprocess.run(cmd + [qps], check=True)
+        search_max_sustainable_qps(qps_values, 'random', benchmark_name, run_probe)
+        print("Random QPS search completed successfully")
+        return
+
     cmd.extend([str(qps) for qps in qps_values])
 
     # Execute the workload